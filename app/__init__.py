@@ -1,7 +1,7 @@
 from flask import Flask
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy.exc import SQLAlchemyError
 
 from config import config
 from app.models.database_schema import db, User
@@ -13,7 +13,6 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Vui lòng đăng nhập để truy cập trang này.'
 login_manager.login_message_category = 'info'
 
-migrate = Migrate()
 csrf = CSRFProtect()
 
 def create_app(config_name='default'):
@@ -21,15 +20,39 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Tham số engine (pool kết nối, thời gian chờ) theo loại cơ sở dữ liệu;
+    # SQLALCHEMY_ENGINE_OPTIONS khai báo trong cấu hình được ưu tiên
+    from app.utils.db_engine import engine_options, init_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    
     # Khởi tạo các extension với app
     db.init_app(app)
+    init_engine(app)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
     csrf.init_app(app)
     
     # Khởi tạo hệ thống xác thực
     init_auth(app, login_manager)
     
+    # Cấu hình bộ băm mật khẩu
+    from app.utils.passwords import init_password_hasher
+    init_password_hasher(app)
+    
+    # Cấu hình bộ nhớ đệm phân quyền
+    from app.utils.rbac import init_rbac
+    init_rbac(app)
+    
+    # Cấu hình bộ nhớ đệm danh mục vai trò và quyền
+    from app.utils.role_catalog import init_role_catalog
+    init_role_catalog(app)
+    
+    # Cấu hình bộ nhớ đệm thống kê phòng ban
+    from app.utils.department_stats import init_department_stats
+    init_department_stats(app)
+    
     # Đăng ký các blueprint
     from app.auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
@@ -55,13 +78,36 @@ def create_app(config_name='default'):
     from app.controllers.audit import audit_routes as audit_blueprint
     app.register_blueprint(audit_blueprint, url_prefix='/audit')
     
+    # Khởi tạo bộ ghi nhật ký hệ thống
+    from app.utils.audit_logger import init_audit
+    init_audit(app)
+    
+    # Đăng ký bộ đếm truy vấn cho mỗi request
+    from app.utils.query_counter import init_query_counter
+    init_query_counter(app)
+    
     # Đăng ký hàm xử lý lỗi
     from app.utils.error_handlers import register_error_handlers
     register_error_handlers(app)
     
-    # Khởi tạo cơ sở dữ liệu với dữ liệu ban đầu
+    # Đăng ký các lệnh quản trị cho Flask CLI
+    from app.cli import register_commands
+    register_commands(app)
+    
     with app.app_context():
-        from app.models.init_db import init_db
-        init_db()
+        # Tạo bảng và dữ liệu ban đầu khi khởi động (môi trường phát triển/kiểm thử);
+        # môi trường sản xuất chạy `flask init-db` một lần thay vì ở mỗi tiến trình
+        if app.config['AUTO_INIT_DB']:
+            from app.models.init_db import init_db
+            init_db()
+        
+        # Tải sẵn danh mục vai trò và quyền; nếu cơ sở dữ liệu chưa được khởi tạo
+        # (ví dụ khi chạy `flask init-db`), danh mục được tải ở lần sử dụng đầu tiên
+        from app.utils.role_catalog import get_role_catalog
+        try:
+            get_role_catalog()
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.warning('Chưa tải được danh mục vai trò và quyền khi khởi động')
     
     return app
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
 from app.models.database_schema import User, db
 from app.utils.audit_logger import log_action
-from app.auth.auth_utils import authenticate_user, generate_token
+import jwt
+from app.auth.auth_utils import authenticate_user, bearer_token, decode_token, generate_token, revoke_token, revoke_user_tokens
+from app.utils.passwords import hash_password, verify_password
 
 auth = Blueprint('auth', __name__)
 
@@ -47,6 +48,15 @@ def logout():
     user_id = current_user.id
     username = current_user.username
     
+    # Thu hồi token dùng cho request này (nếu đăng xuất bằng JWT)
+    token = bearer_token(request)
+    if token:
+        try:
+            revoke_token(decode_token(token))
+        except jwt.InvalidTokenError:
+            pass
+        db.session.commit()
+    
     logout_user()
     log_action('LOGOUT', 'auth', user_id, f"Đăng xuất: {username}")
     
@@ -77,12 +87,12 @@ def change_password():
     new_password = data.get('new_password')
     
     # Kiểm tra mật khẩu hiện tại
-    if not check_password_hash(current_user.password_hash, current_password):
+    if not verify_password(current_user.password_hash, current_password)[0]:
         return jsonify({'error': 'Mật khẩu hiện tại không đúng'}), 400
     
-    # Cập nhật mật khẩu mới
-    from werkzeug.security import generate_password_hash
-    current_user.password_hash = generate_password_hash(new_password)
+    # Cập nhật mật khẩu mới; các token đã cấp trước khi đổi mật khẩu không còn hiệu lực
+    current_user.password_hash = hash_password(new_password)
+    revoke_user_tokens(current_user)
     db.session.commit()
     
     log_action('UPDATE', 'user', current_user.id, "Thay đổi mật khẩu")
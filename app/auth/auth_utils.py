@@ -1,11 +1,26 @@
-from flask import request, jsonify, current_app
-from flask_login import login_user, current_user
-from werkzeug.security import check_password_hash
+from flask import abort, request, jsonify, current_app
+from flask_login import UserMixin
 from functools import wraps
+import threading
+import time
+import uuid
 import jwt
 from datetime import datetime, timedelta
-from app.models.database_schema import User, db
-from app.utils.audit_logger import log_action
+from sqlalchemy.orm import Session
+from app.models.database_schema import RevokedToken, User, db
+from app.utils.cache_versions import bump_cache_version, read_cache_version
+from app.utils.passwords import verify_password
+from app.utils.rbac import discard_permission_snapshot, get_permission_snapshot, peek_permission_snapshot
+
+# Tên dòng phiên bản của dữ liệu thu hồi token trong bảng cache_versions
+REVOCATION_VERSION_NAME = 'token_revocations'
+
+# Dữ liệu thu hồi đã tải, dùng chung giữa các request của tiến trình:
+# (phiên bản, frozenset các jti bị thu hồi còn hạn)
+_revocations = None
+_checked_at = 0.0
+_check_interval = 5
+_revocation_lock = threading.Lock()
 
 def authenticate_user(username, password):
     """
@@ -19,30 +34,46 @@ def authenticate_user(username, password):
         User object nếu xác thực thành công, None nếu thất bại
     """
     user = User.query.filter_by(username=username).first()
+    if not user:
+        return None
     
-    if not user or not check_password_hash(user.password_hash, password):
+    valid, new_hash = verify_password(user.password_hash, password)
+    if not valid:
         return None
     
     if not user.is_active:
         return None
     
+    # Mật khẩu được băm bằng thuật toán hoặc tham số cũ: lưu lại mã băm mới
+    if new_hash:
+        user.password_hash = new_hash
+        db.session.commit()
+    
     return user
 
 def generate_token(user):
     """
     Tạo JWT token cho người dùng.
     
+    Ngoài vai trò, token chứa phạm vi nhân viên/phòng ban và mã phiên bản quyền (pv)
+    để các request sau xác thực mà không cần truy vấn cơ sở dữ liệu.
+    
     Args:
         user: User object
         
     Returns:
         JWT token
     """
+    snapshot = get_permission_snapshot(user)
     payload = {
         'user_id': user.id,
         'exp': datetime.utcnow() + timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']),
-        'iat': datetime.utcnow(),
-        'roles': [role.role_type.value for role in user.roles]
+        'iat': time.time(),  # có phần lẻ của giây để so sánh với thời điểm thu hồi
+        'jti': uuid.uuid4().hex,
+        'roles': sorted(role_type.value for role_type in snapshot.role_types),
+        'employee_id': snapshot.employee_id,
+        'department_id': snapshot.department_id,
+        'pv': snapshot.stamp
     }
     
     return jwt.encode(
@@ -51,44 +82,188 @@ def generate_token(user):
         algorithm='HS256'
     )
 
+def decode_token(token):
+    """
+    Giải mã và kiểm tra chữ ký JWT token.
+    
+    Raises:
+        jwt.ExpiredSignatureError: Token đã hết hạn
+        jwt.InvalidTokenError: Token không hợp lệ
+    """
+    return jwt.decode(
+        token,
+        current_app.config['JWT_SECRET_KEY'],
+        algorithms=['HS256']
+    )
+
+def revoke_token(payload):
+    """
+    Thu hồi một token (ví dụ khi đăng xuất). Thay đổi được ghi khi commit.
+    
+    Args:
+        payload: Nội dung token đã giải mã
+    """
+    if not payload.get('jti'):
+        return
+    
+    # Token quá hạn tự bị từ chối nên dòng thu hồi đã hết hạn không còn cần thiết
+    db.session.query(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()) \
+        .delete(synchronize_session=False)
+    db.session.merge(RevokedToken(
+        jti=payload['jti'],
+        user_id=payload['user_id'],
+        expires_at=datetime.utcfromtimestamp(payload['exp'])
+    ))
+
+def revoke_user_tokens(user):
+    """
+    Thu hồi mọi token của người dùng đã được cấp trước thời điểm hiện tại
+    (ví dụ khi đổi mật khẩu). Thay đổi được ghi khi commit.
+    
+    Args:
+        user: User object
+    """
+    user.tokens_revoked_at = datetime.utcnow()
+
+def sync_token_revocations():
+    """
+    Lấy danh sách jti bị thu hồi, đồng bộ với cơ sở dữ liệu.
+    
+    Phiên bản trong cơ sở dữ liệu được kiểm tra tối đa mỗi JWT_REVOCATION_CHECK_INTERVAL
+    giây (một truy vấn theo khóa chính). Khi phiên bản thay đổi, tức là khi một token bị
+    thu hồi hoặc một người dùng bị vô hiệu hóa, bị xóa hay thu hồi mọi token ở bất kỳ
+    tiến trình nào, danh sách được tải lại và các ảnh chụp quyền bị hủy để người dùng
+    được đọc lại từ cơ sở dữ liệu.
+    
+    Returns:
+        frozenset các jti bị thu hồi còn hạn
+    """
+    global _revocations, _checked_at
+    
+    now = time.monotonic()
+    with _revocation_lock:
+        revocations = _revocations
+        due = now - _checked_at >= _check_interval
+    
+    if revocations is not None and not due:
+        return revocations[1]
+    
+    # Phiên bản được đọc trước dữ liệu: thay đổi trong lúc tải sẽ được thấy ở lần kiểm tra sau
+    version = read_cache_version(REVOCATION_VERSION_NAME)
+    if revocations is not None and version == revocations[0]:
+        with _revocation_lock:
+            _checked_at = now
+        return revocations[1]
+    
+    jtis = frozenset(
+        jti for jti, in db.session.query(RevokedToken.jti).filter(RevokedToken.expires_at > datetime.utcnow())
+    )
+    with _revocation_lock:
+        _revocations, _checked_at = (version, jtis), now
+    
+    discard_permission_snapshot(None)
+    return jtis
+
+def is_token_revoked(payload):
+    """Kiểm tra token có nằm trong danh sách thu hồi hay không."""
+    return bool(payload.get('jti')) and payload['jti'] in sync_token_revocations()
+
+def resolve_token_user(payload):
+    """
+    Xác định người dùng của một token đã giải mã.
+    
+    Khi ảnh chụp quyền của người dùng có trong bộ nhớ đệm, các thông tin đã ký trong
+    token được tin cậy và không cần truy vấn cơ sở dữ liệu. Người dùng chỉ được tải lại
+    khi chưa có ảnh chụp quyền (kể cả khi ảnh chụp bị hủy vì dữ liệu thu hồi thay đổi),
+    hoặc khi token được cấp sau ảnh chụp nhưng mang mã phiên bản quyền khác (quyền đã
+    thay đổi ở tiến trình khác).
+    
+    Args:
+        payload: Nội dung token đã giải mã
+    
+    Returns:
+        (người dùng, None) nếu hợp lệ, (None, thông báo lỗi) nếu không
+    """
+    if is_token_revoked(payload):
+        return None, 'Token đã bị thu hồi'
+    
+    user_id = payload['user_id']
+    snapshot = peek_permission_snapshot(user_id)
+    if snapshot is not None and snapshot.stamp != payload.get('pv') \
+            and payload.get('iat', 0) >= snapshot.compiled_at:
+        discard_permission_snapshot(user_id)
+        snapshot = None
+    
+    user = None
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if not user:
+            return None, 'Người dùng không tồn tại'
+        snapshot = get_permission_snapshot(user)
+    
+    if not snapshot.is_active:
+        return None, 'Tài khoản đã bị vô hiệu hóa'
+    
+    # iat có phần lẻ của giây: token cấp lại ngay sau khi thu hồi vẫn hợp lệ
+    if snapshot.tokens_revoked_at is not None and payload.get('iat', 0) < snapshot.tokens_revoked_at:
+        return None, 'Token đã bị thu hồi'
+    
+    return (user if user is not None else TokenUser(payload)), None
+
+class TokenUser(UserMixin):
+    """
+    Người dùng xác thực bằng JWT, dựng từ các thông tin đã ký trong token.
+    
+    Bản ghi User chỉ được tải khi truy cập thuộc tính không có trong token; nếu người
+    dùng đã bị xóa, request bị từ chối với mã 401.
+    """
+    
+    def __init__(self, payload):
+        object.__setattr__(self, 'id', payload['user_id'])
+        object.__setattr__(self, 'claims', payload)
+        object.__setattr__(self, '_user', None)
+    
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+    
+    def _load(self):
+        if self._user is None:
+            user = db.session.get(User, self.id)
+            if user is None:
+                abort(401)
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+def bearer_token(request):
+    """Lấy token từ header Authorization (Bearer), None nếu không có."""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
 def token_required(f):
     """Decorator để kiểm tra JWT token."""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Lấy token từ header Authorization
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+        token = bearer_token(request)
         
         if not token:
             return jsonify({'error': 'Token không được cung cấp'}), 401
         
         try:
-            # Giải mã token
-            payload = jwt.decode(
-                token,
-                current_app.config['JWT_SECRET_KEY'],
-                algorithms=['HS256']
-            )
-            
-            # Lấy thông tin người dùng từ token
-            user_id = payload['user_id']
-            user = User.query.get(user_id)
-            
-            if not user:
-                return jsonify({'error': 'Người dùng không tồn tại'}), 401
-            
-            if not user.is_active:
-                return jsonify({'error': 'Tài khoản đã bị vô hiệu hóa'}), 401
-            
+            payload = decode_token(token)
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token đã hết hạn'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Token không hợp lệ'}), 401
         
+        user, error = resolve_token_user(payload)
+        if error:
+            return jsonify({'error': error}), 401
+        
         # Gán thông tin người dùng vào request
         request.user = user
         
@@ -98,49 +273,28 @@ def token_required(f):
 
 def load_user_from_request(request):
     """
-    Tải thông tin người dùng từ request cho Flask-Login.
+    Tải thông tin người dùng từ JWT token cho Flask-Login.
+    
+    Flask-Login chỉ gọi hàm này khi session không có người dùng, vì vậy không được
+    truy cập current_user ở đây (sẽ gọi lại chính hàm này).
     
     Args:
         request: Flask request object
         
     Returns:
-        User object nếu xác thực thành công, None nếu thất bại
+        User hoặc TokenUser nếu xác thực thành công, None nếu thất bại
     """
-    # Kiểm tra xác thực qua session (Flask-Login)
-    if current_user.is_authenticated:
-        return current_user
-    
-    # Kiểm tra xác thực qua JWT token
-    token = None
-    
-    # Lấy token từ header Authorization
-    if 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-    
+    token = bearer_token(request)
     if not token:
         return None
     
     try:
-        # Giải mã token
-        payload = jwt.decode(
-            token,
-            current_app.config['JWT_SECRET_KEY'],
-            algorithms=['HS256']
-        )
-        
-        # Lấy thông tin người dùng từ token
-        user_id = payload['user_id']
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_active:
-            return None
-        
-        return user
-        
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
         return None
+    
+    user, _ = resolve_token_user(payload)
+    return user
 
 def init_auth(app, login_manager):
     """
@@ -150,12 +304,65 @@ def init_auth(app, login_manager):
         app: Flask app
         login_manager: Flask-Login LoginManager
     """
+    global _revocations, _check_interval
+    
+    with _revocation_lock:
+        _revocations = None
+        _check_interval = app.config.get('JWT_REVOCATION_CHECK_INTERVAL', 5)
+    
     # Thiết lập user loader cho Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Vai trò và quyền được lấy qua ảnh chụp quyền, không tải cùng người dùng
+        return db.session.get(User, int(user_id))
     
     # Thiết lập request loader cho Flask-Login
     @login_manager.request_loader
     def load_user_from_request_loader(request):
         return load_user_from_request(request)
+
+def _invalidate_revocations():
+    """Hủy dữ liệu thu hồi đã tải trong tiến trình này; lần kiểm tra sau sẽ tải lại."""
+    global _revocations
+    
+    with _revocation_lock:
+        _revocations = None
+
+def _revocation_state_changed(user):
+    state = db.inspect(user)
+    return state.attrs.is_active.history.has_changes() or state.attrs.tokens_revoked_at.history.has_changes()
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_revocations(session, flush_context, instances):
+    if any(isinstance(instance, RevokedToken) for instance in session.new) \
+            or any(isinstance(instance, User) for instance in session.deleted) \
+            or any(isinstance(instance, User) and _revocation_state_changed(instance) for instance in session.dirty):
+        session.info['token_revocations_stale'] = True
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_revocations(orm_execute_state):
+    # Câu lệnh UPDATE/DELETE hàng loạt trên người dùng và INSERT hàng loạt token thu hồi không đi qua flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+            mapper.class_ is User for mapper in orm_execute_state.all_mappers) \
+            or orm_execute_state.is_insert and any(
+            mapper.class_ is RevokedToken for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['token_revocations_stale'] = True
+
+@db.event.listens_for(Session, 'before_commit')
+def _bump_revocations_before_commit(session):
+    # Chỉ tăng phiên bản khi commit giao dịch ngoài cùng (before_commit cũng chạy khi RELEASE SAVEPOINT)
+    if session.in_nested_transaction():
+        return
+    
+    session.flush()
+    if session.info.get('token_revocations_stale'):
+        bump_cache_version(session, REVOCATION_VERSION_NAME)
+
+@db.event.listens_for(Session, 'after_commit')
+def _invalidate_revocations_after_commit(session):
+    if session.info.pop('token_revocations_stale', False):
+        _invalidate_revocations()
+
+@db.event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_revocations(session, previous_transaction):
+    session.info.pop('token_revocations_stale', None)
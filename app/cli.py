@@ -0,0 +1,243 @@
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import click
+from flask import current_app
+from app.models.database_schema import AuditLog, ActionType, db
+from app.utils.audit_archive import archive_audit_logs, hot_cutoff
+from app.utils.audit_logger import filter_audit_logs
+from app.utils.audit_rollup import rebuild_audit_rollup
+from app.utils.passwords import get_password_hasher
+
+# Các tổ hợp bộ lọc mà danh sách nhật ký hỗ trợ
+_AUDIT_FILTER_CASES = (
+    ('không lọc', {}),
+    ('user_id', {'user_id': 1}),
+    ('action', {'action': ActionType.UPDATE}),
+    ('resource', {'resource': 'employee'}),
+    ('resource + resource_id', {'resource': 'employee', 'resource_id': 1}),
+    ('khoảng thời gian', {'start_date': datetime.datetime(2024, 1, 1), 'end_date': datetime.datetime(2024, 2, 1)}),
+    ('user_id + khoảng thời gian', {'user_id': 1, 'start_date': datetime.datetime(2024, 1, 1)}),
+    ('action + khoảng thời gian', {'action': ActionType.UPDATE, 'start_date': datetime.datetime(2024, 1, 1)}),
+    ('resource + khoảng thời gian', {'resource': 'employee', 'start_date': datetime.datetime(2024, 1, 1)}),
+)
+
+# Chương trình đo thời gian khởi động, chạy trong một tiến trình Python mới
+_STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[2]).status_code
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': finished - created, 'status': status}))
+"""
+
+def register_commands(app):
+    """
+    Đăng ký các lệnh quản trị cho Flask CLI.
+    
+    Args:
+        app: Flask app
+    """
+    app.cli.add_command(LazyMigrateGroup())
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(benchmark_startup)
+    app.cli.add_command(explain_audit_queries)
+    app.cli.add_command(rebuild_audit_rollup_command)
+    app.cli.add_command(archive_audit_logs_command)
+    app.cli.add_command(benchmark_password_hash)
+
+class LazyMigrateGroup(click.Group):
+    """
+    Nhóm lệnh `flask db` của Flask-Migrate, chỉ import Flask-Migrate và Alembic khi được gọi.
+    
+    Alembic chiếm khoảng một nửa thời gian import ứng dụng nhưng chỉ cần cho các lệnh migration.
+    """
+    
+    def __init__(self):
+        super().__init__('db', help='Quản lý migration cơ sở dữ liệu (Flask-Migrate).')
+    
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Nhóm thật phân tích tùy chọn (--directory, -x) và chạy lệnh con
+        return self._migrate_group().make_context(info_name, args, parent=parent, **extra)
+    
+    def list_commands(self, ctx):
+        return self._migrate_group().list_commands(ctx)
+    
+    def get_command(self, ctx, name):
+        return self._migrate_group().get_command(ctx, name)
+    
+    def _migrate_group(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli_group
+        
+        if 'migrate' not in current_app.extensions:
+            Migrate(current_app, db)
+        return db_cli_group
+
+@click.command('init-db')
+def init_db_command():
+    """Tạo các bảng, chỉ mục tìm kiếm và dữ liệu ban đầu (chạy một lần khi triển khai)."""
+    from app.models.init_db import init_db
+    
+    if init_db():
+        click.echo('Đã tạo các bảng và dữ liệu ban đầu')
+    else:
+        click.echo('Đã kiểm tra các bảng; cơ sở dữ liệu đã có dữ liệu nên không tạo dữ liệu ban đầu')
+
+@click.command('benchmark-startup')
+@click.option('--runs', type=int, default=3, help='Số lần khởi động để đo')
+@click.option('--path', default='/', help='Đường dẫn của request đầu tiên')
+@click.option('--config', 'config_name', default=None,
+              help='Tên cấu hình (mặc định theo FLASK_ENV, hoặc development)')
+def benchmark_startup(runs, path, config_name):
+    """Đo thời gian import, tạo ứng dụng và xử lý request đầu tiên của một tiến trình mới."""
+    config_name = config_name or os.environ.get('FLASK_ENV', 'development')
+    project_dir = os.path.dirname(current_app.root_path)
+    
+    results = []
+    for run in range(1, runs + 1):
+        started = time.perf_counter()
+        probe = subprocess.run([sys.executable, '-c', _STARTUP_PROBE, config_name, path],
+                               cwd=project_dir, capture_output=True, text=True)
+        total = time.perf_counter() - started
+        if probe.returncode != 0:
+            raise click.ClickException(f"Tiến trình đo bị lỗi:\n{probe.stderr[-2000:]}")
+        
+        # SQLALCHEMY_ECHO có thể ghi ra stdout: kết quả nằm ở dòng cuối
+        result = json.loads(probe.stdout.strip().splitlines()[-1])
+        result['total'] = total
+        results.append(result)
+        click.echo(f"Lần {run}: import {result['import'] * 1000:.0f} ms, create_app {result['create_app'] * 1000:.0f} ms, "
+                   f"request đầu tiên {result['first_request'] * 1000:.0f} ms (HTTP {result['status']}), "
+                   f"tổng cả khởi động Python {total * 1000:.0f} ms")
+    
+    click.echo(f"Trung vị: import {statistics.median(r['import'] for r in results) * 1000:.0f} ms, "
+               f"create_app {statistics.median(r['create_app'] for r in results) * 1000:.0f} ms, "
+               f"request đầu tiên {statistics.median(r['first_request'] for r in results) * 1000:.0f} ms, "
+               f"tổng {statistics.median(r['total'] for r in results) * 1000:.0f} ms")
+
+@click.command('archive-audit-logs')
+@click.option('--keep-months', type=int, default=None,
+              help='Số tháng gần nhất giữ trong bảng (mặc định AUDIT_HOT_MONTHS)')
+def archive_audit_logs_command(keep_months):
+    """Chuyển các tháng nhật ký cũ sang tệp JSONL nén gzip và xóa khỏi bảng audit_logs."""
+    segments = archive_audit_logs(hot_cutoff(hot_months=keep_months))
+    for segment in segments:
+        click.echo(f"{segment['file']}: {segment['rows']} bản ghi")
+    click.echo(f"Đã lưu trữ {sum(segment['rows'] for segment in segments)} bản ghi vào {len(segments)} tệp")
+
+@click.command('rebuild-audit-rollup')
+def rebuild_audit_rollup_command():
+    """Tính lại bảng thống kê nhật ký theo giờ từ audit_logs."""
+    rows = rebuild_audit_rollup()
+    click.echo(f"Đã tính lại bảng thống kê nhật ký: {rows} dòng")
+
+@click.command('explain-audit-queries')
+def explain_audit_queries():
+    """Kiểm tra bằng EXPLAIN rằng mỗi bộ lọc nhật ký đều dùng chỉ mục."""
+    failed = 0
+    for name, filters in _AUDIT_FILTER_CASES:
+        query = filter_audit_logs(db.session.query(AuditLog), filters)
+        query = query.order_by(AuditLog.timestamp.desc()).limit(20)
+        plan = _explain(query.statement)
+        
+        uses_index = _plan_uses_index(plan)
+        if not uses_index:
+            failed += 1
+        
+        click.echo(f"[{'OK' if uses_index else 'FAIL'}] {name}")
+        for line in plan:
+            click.echo(f"    {line}")
+    
+    if failed:
+        raise click.ClickException(f"{failed} bộ lọc không dùng chỉ mục")
+
+def _explain(statement):
+    """Lấy kế hoạch thực thi của câu lệnh dưới dạng danh sách dòng."""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'))
+        return [row[-1] for row in rows]
+    
+    # PostgreSQL chọn quét tuần tự với bảng nhỏ; tắt đi để kiểm tra chỉ mục có dùng được không
+    try:
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        return [row[0] for row in db.session.execute(db.text(f'EXPLAIN {sql}'))]
+    finally:
+        db.session.rollback()
+
+def _plan_uses_index(plan):
+    """
+    Kiểm tra kế hoạch thực thi dùng chỉ mục cho cả bộ lọc lẫn sắp xếp.
+    
+    Kế hoạch không đạt nếu có bước quét toàn bảng (SQLite: SCAN không kèm chỉ mục,
+    PostgreSQL: Seq Scan) hoặc bước sắp xếp riêng (SQLite: USE TEMP B-TREE, PostgreSQL: Sort).
+    """
+    for line in plan:
+        step = line.strip().lstrip('->').strip()
+        if 'TEMP B-TREE' in step or step.startswith(('Seq Scan', 'Sort', 'Incremental Sort')):
+            return False
+        if step.startswith('SCAN') and 'USING' not in step:
+            return False
+    
+    return any('USING INDEX' in line or 'USING COVERING INDEX' in line or 'Index' in line for line in plan)
+
+@click.command('benchmark-password-hash')
+@click.option('--seconds', type=float, default=3.0, help='Thời gian đo cho mỗi bước (giây)')
+@click.option('--concurrency', type=int, default=None,
+              help='Số đăng nhập đồng thời khi đo qua pool luồng (mặc định gấp đôi số luồng của pool)')
+def benchmark_password_hash(seconds, concurrency):
+    """Đo số lần kiểm tra mật khẩu (đăng nhập) mỗi giây trên một lõi và qua pool luồng."""
+    hasher = get_password_hasher()
+    password = 'benchmark-password'
+    password_hash = hasher.hash(password)
+    concurrency = concurrency or hasher.workers * 2
+    
+    click.echo(f"Thuật toán: {hasher.hasher.name} {_hasher_parameters(hasher.hasher)}, pool {hasher.workers} luồng")
+    
+    # Một luồng gọi trực tiếp tương ứng với một lõi CPU
+    per_core = _measure_rate(lambda: hasher.hasher.verify(password_hash, password), seconds, 1)
+    click.echo(f"Một lõi: {per_core:.1f} lần đăng nhập/giây ({1000 / per_core:.1f} ms mỗi lần)")
+    
+    total = _measure_rate(lambda: hasher.verify(password_hash, password), seconds, concurrency)
+    click.echo(f"Pool ({concurrency} đăng nhập đồng thời): {total:.1f} lần đăng nhập/giây, "
+               f"{total / hasher.workers:.1f} lần/giây mỗi luồng")
+
+def _hasher_parameters(hasher):
+    if hasattr(hasher, 'rounds'):
+        return f"(rounds={hasher.rounds})"
+    if hasattr(hasher, '_hasher'):
+        return (f"(time_cost={hasher._hasher.time_cost}, memory_cost={hasher._hasher.memory_cost}, "
+                f"parallelism={hasher._hasher.parallelism})")
+    return ''
+
+def _measure_rate(operation, seconds, threads):
+    """Chạy operation liên tục trên nhiều luồng trong khoảng thời gian cho trước, trả về số lần/giây."""
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+    
+    def worker(index):
+        while time.monotonic() < deadline:
+            operation()
+            counts[index] += 1
+    
+    started = time.monotonic()
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    
+    return sum(counts) / (time.monotonic() - started)
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
-from app.models.database_schema import AuditLog, ActionType, User, db
-from app.utils.audit_logger import get_audit_logs
+from app.models.database_schema import AuditLog, AuditLogRollup, ActionType, User, db
+from app.utils.audit_logger import (AUDIT_EXPORT_COLUMNS, get_audit_logs, get_audit_logs_after, get_audit_writer,
+                                    iter_audit_log_rows, log_action)
+from app.utils import audit_rollup
 from app.utils.rbac import admin_required
+from app.utils.streaming import gzip_stream, stream_csv, stream_ndjson
 
 audit_routes = Blueprint('audit', __name__)
 
@@ -10,45 +13,40 @@ audit_routes = Blueprint('audit', __name__)
 @login_required
 @admin_required
 def get_audit_log_entries():
-    """Lấy danh sách nhật ký hệ thống."""
+    """Lấy danh sách nhật ký hệ thống.
+    
+    Hỗ trợ phân trang theo con trỏ (?cursor=&per_page=<n>, tiếp tục bằng next_cursor),
+    tổng số bản ghi chỉ được đếm khi có ?include_total=1.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
     # Xây dựng bộ lọc từ tham số truy vấn
-    filters = {}
-    
-    if 'user_id' in request.args and request.args['user_id']:
-        filters['user_id'] = int(request.args['user_id'])
-    
-    if 'action' in request.args and request.args['action']:
-        filters['action'] = request.args['action']
-    
-    if 'resource' in request.args and request.args['resource']:
-        filters['resource'] = request.args['resource']
-    
-    if 'start_date' in request.args and request.args['start_date']:
-        from datetime import datetime
-        try:
-            filters['start_date'] = datetime.strptime(request.args['start_date'], '%Y-%m-%d')
-        except ValueError:
-            return jsonify({'error': 'Định dạng ngày bắt đầu không hợp lệ (YYYY-MM-DD)'}), 400
-    
-    if 'end_date' in request.args and request.args['end_date']:
-        from datetime import datetime
-        try:
-            filters['end_date'] = datetime.strptime(request.args['end_date'], '%Y-%m-%d')
-        except ValueError:
-            return jsonify({'error': 'Định dạng ngày kết thúc không hợp lệ (YYYY-MM-DD)'}), 400
+    try:
+        filters = _parse_audit_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Lấy danh sách nhật ký
-    logs, pagination = get_audit_logs(filters, page, per_page)
+    if 'cursor' in request.args:
+        if per_page < 1:
+            return jsonify({'error': 'Tham số per_page phải lớn hơn 0'}), 400
+        
+        include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+        per_page = min(per_page, current_app.config['AUDIT_PAGE_MAX_SIZE'])
+        try:
+            logs, pagination = get_audit_logs_after(filters, request.args['cursor'] or None, per_page, include_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        logs, pagination = get_audit_logs(filters, page, per_page)
     
     # Chuyển đổi kết quả thành JSON
     result = {
         'logs': [{
             'id': log.id,
             'user_id': log.user_id,
-            'username': User.query.get(log.user_id).username if log.user_id else None,
+            'username': log.username,
             'action': log.action.value,
             'resource': log.resource,
             'resource_id': log.resource_id,
@@ -61,6 +59,92 @@ def get_audit_log_entries():
     
     return jsonify(result)
 
+@audit_routes.route('/export', methods=['GET'])
+@login_required
+@admin_required
+def export_audit_logs():
+    """Xuất nhật ký hệ thống dạng CSV hoặc NDJSON theo luồng.
+    
+    Nhận cùng các bộ lọc như danh sách nhật ký, định dạng chọn bằng ?format=csv|ndjson,
+    thêm ?gzip=1 để nén (Content-Encoding: gzip).
+    """
+    try:
+        filters = _parse_audit_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Định dạng xuất không hợp lệ (csv hoặc ndjson)'}), 400
+    
+    log_action('READ', 'audit_log', None, f"Xuất nhật ký hệ thống ({export_format})")
+    
+    rows = (_export_row(row) for row in iter_audit_log_rows(filters, current_app.config['AUDIT_EXPORT_CHUNK_SIZE']))
+    if export_format == 'csv':
+        body, mimetype = stream_csv(rows, AUDIT_EXPORT_COLUMNS), 'text/csv'
+    else:
+        body, mimetype = stream_ndjson(rows), 'application/x-ndjson'
+    
+    headers = {'Content-Disposition': f'attachment; filename=audit_logs.{export_format}'}
+    if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+def _export_row(row):
+    """Chuyển một dòng nhật ký thành các giá trị có thể ghi ra CSV/JSON."""
+    return dict(row, action=row['action'].value, timestamp=row['timestamp'].isoformat())
+
+def _parse_audit_filters():
+    """
+    Xây dựng bộ lọc nhật ký từ tham số truy vấn.
+    
+    Returns:
+        Dict bộ lọc cho get_audit_logs
+    
+    Raises:
+        ValueError: Nếu tham số không hợp lệ
+    """
+    from datetime import datetime
+    
+    filters = {}
+    
+    for name in ('user_id', 'resource_id'):
+        if name in request.args and request.args[name]:
+            try:
+                filters[name] = int(request.args[name])
+            except ValueError:
+                raise ValueError(f'Tham số {name} không hợp lệ')
+    
+    if 'action' in request.args and request.args['action']:
+        filters['action'] = request.args['action']
+    
+    if 'resource' in request.args and request.args['resource']:
+        filters['resource'] = request.args['resource']
+    
+    if 'start_date' in request.args and request.args['start_date']:
+        try:
+            filters['start_date'] = datetime.strptime(request.args['start_date'], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Định dạng ngày bắt đầu không hợp lệ (YYYY-MM-DD)')
+    
+    if 'end_date' in request.args and request.args['end_date']:
+        try:
+            filters['end_date'] = datetime.strptime(request.args['end_date'], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Định dạng ngày kết thúc không hợp lệ (YYYY-MM-DD)')
+    
+    return filters
+
+@audit_routes.route('/writer-stats', methods=['GET'])
+@login_required
+@admin_required
+def get_audit_writer_stats():
+    """Lấy các chỉ số của bộ ghi nhật ký (độ sâu hàng đợi, số bản ghi đã ghi, ghi đồng bộ do hàng đợi đầy, ...)."""
+    return jsonify(get_audit_writer().stats())
+
 @audit_routes.route('/actions', methods=['GET'])
 @login_required
 @admin_required
@@ -74,8 +158,8 @@ def get_audit_actions():
 @admin_required
 def get_audit_resources():
     """Lấy danh sách các loại tài nguyên."""
-    # Lấy danh sách các loại tài nguyên duy nhất từ cơ sở dữ liệu
-    resources = db.session.query(AuditLog.resource).distinct().all()
+    # Lấy danh sách các loại tài nguyên duy nhất từ bảng thống kê (gồm cả nhật ký đã lưu trữ)
+    resources = db.session.query(AuditLogRollup.resource).distinct().all()
     return jsonify([resource[0] for resource in resources])
 
 @audit_routes.route('/users', methods=['GET'])
@@ -83,8 +167,8 @@ def get_audit_resources():
 @admin_required
 def get_audit_users():
     """Lấy danh sách người dùng có nhật ký."""
-    # Lấy danh sách user_id duy nhất từ cơ sở dữ liệu
-    user_ids = db.session.query(AuditLog.user_id).filter(AuditLog.user_id != None).distinct().all()
+    # Lấy danh sách user_id duy nhất từ bảng thống kê (gồm cả nhật ký đã lưu trữ)
+    user_ids = db.session.query(AuditLogRollup.user_id).distinct().all()
     user_ids = [user_id[0] for user_id in user_ids]
     
     # Lấy thông tin người dùng
@@ -100,47 +184,40 @@ def get_audit_users():
 @login_required
 @admin_required
 def get_audit_statistics():
-    """Lấy thống kê về nhật ký hệ thống."""
-    # Tổng số bản ghi
-    total_logs = AuditLog.query.count()
-    
-    # Số lượng bản ghi theo loại hành động
-    action_stats = db.session.query(
-        AuditLog.action, 
-        db.func.count(AuditLog.id)
-    ).group_by(AuditLog.action).all()
-    
-    # Số lượng bản ghi theo loại tài nguyên
-    resource_stats = db.session.query(
-        AuditLog.resource, 
-        db.func.count(AuditLog.id)
-    ).group_by(AuditLog.resource).all()
-    
-    # Số lượng bản ghi theo người dùng (top 10)
-    user_stats = db.session.query(
-        AuditLog.user_id, 
-        db.func.count(AuditLog.id)
-    ).filter(AuditLog.user_id != None).group_by(AuditLog.user_id).order_by(
-        db.func.count(AuditLog.id).desc()
-    ).limit(10).all()
+    """Lấy thống kê về nhật ký hệ thống.
+    
+    Đọc từ bảng thống kê theo giờ; có thể giới hạn khoảng thời gian bằng
+    ?start_date=&end_date= (YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM).
+    """
+    from datetime import datetime
+    
+    window = {}
+    for name in ('start_date', 'end_date'):
+        if request.args.get(name):
+            try:
+                window[name] = datetime.fromisoformat(request.args[name])
+            except ValueError:
+                return jsonify({'error': f'Định dạng {name} không hợp lệ (YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM)'}), 400
+    
+    statistics = audit_rollup.get_audit_statistics(**window)
     
     # Lấy thông tin người dùng
-    user_ids = [user_id for user_id, _ in user_stats]
+    user_ids = [user_id for user_id, _ in statistics['user_stats']]
     users = {user.id: user.username for user in User.query.filter(User.id.in_(user_ids)).all()}
     
     return jsonify({
-        'total_logs': total_logs,
+        'total_logs': statistics['total_logs'],
         'action_stats': [{
             'action': action.value,
             'count': count
-        } for action, count in action_stats],
+        } for action, count in statistics['action_stats']],
         'resource_stats': [{
             'resource': resource,
             'count': count
-        } for resource, count in resource_stats],
+        } for resource, count in statistics['resource_stats']],
         'user_stats': [{
             'user_id': user_id,
             'username': users.get(user_id, 'Unknown'),
             'count': count
-        } for user_id, count in user_stats]
+        } for user_id, count in statistics['user_stats']]
     })
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models.database_schema import Department, Employee, db
 from app.services.department_service import DepartmentService
-from app.utils.audit_logger import log_action
+from app.utils.audit_logger import commit_action
 from app.utils.rbac import has_permission, admin_required
 
 department_routes = Blueprint('department', __name__)
@@ -33,11 +33,11 @@ def get_department(department_id):
 def create_department():
     """Tạo phòng ban mới."""
     data = request.get_json()
-    result = department_service.create_department(data)
+    result = department_service.create_department(data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('CREATE', 'department', result['id'], f"Tạo phòng ban {result['name']}")
+    commit_action('CREATE', 'department', result['id'], f"Tạo phòng ban {result['name']}")
     return jsonify(result), 201
 
 @department_routes.route('/<int:department_id>', methods=['PUT'])
@@ -46,11 +46,11 @@ def create_department():
 def update_department(department_id):
     """Cập nhật thông tin phòng ban."""
     data = request.get_json()
-    result = department_service.update_department(department_id, data)
+    result = department_service.update_department(department_id, data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('UPDATE', 'department', department_id, f"Cập nhật phòng ban {result['name']}")
+    commit_action('UPDATE', 'department', department_id, f"Cập nhật phòng ban {result['name']}")
     return jsonify(result)
 
 @department_routes.route('/<int:department_id>', methods=['DELETE'])
@@ -58,11 +58,11 @@ def update_department(department_id):
 @admin_required
 def delete_department(department_id):
     """Xóa phòng ban."""
-    result = department_service.delete_department(department_id)
+    result = department_service.delete_department(department_id, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('DELETE', 'department', department_id, f"Xóa phòng ban {result['name']}")
+    commit_action('DELETE', 'department', department_id, f"Xóa phòng ban {result['name']}")
     return jsonify({'message': 'Xóa phòng ban thành công'})
 
 @department_routes.route('/<int:department_id>/manager', methods=['PUT'])
@@ -71,11 +71,11 @@ def delete_department(department_id):
 def set_department_manager(department_id):
     """Thiết lập trưởng phòng cho phòng ban."""
     data = request.get_json()
-    result = department_service.set_department_manager(department_id, data['employee_id'])
+    result = department_service.set_department_manager(department_id, data['employee_id'], commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('UPDATE', 'department', department_id, f"Thiết lập trưởng phòng {data['employee_id']} cho phòng ban {department_id}")
+    commit_action('UPDATE', 'department', department_id, f"Thiết lập trưởng phòng {data['employee_id']} cho phòng ban {department_id}")
     return jsonify(result)
 
 @department_routes.route('/<int:department_id>/employees', methods=['GET'])
@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify
+import csv
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
 from app.models.database_schema import Employee, Department, db
 from app.services.employee_service import EmployeeService
-from app.utils.audit_logger import log_action
-from app.utils.rbac import has_permission
+from app.utils.audit_logger import commit_action
+from app.utils.rbac import has_permission, has_permission_many
+from app.utils.streaming import iter_text_lines, read_csv, read_ndjson, stream_json_array
 
 employee_routes = Blueprint('employee', __name__)
 employee_service = EmployeeService()
@@ -11,8 +13,57 @@ employee_service = EmployeeService()
 @employee_routes.route('/', methods=['GET'])
 @login_required
 def get_employees():
-    """Lấy danh sách nhân viên dựa trên quyền của người dùng."""
-    employees = employee_service.get_employees_by_permission(current_user)
+    """Lấy danh sách nhân viên dựa trên quyền của người dùng.
+    
+    Hỗ trợ phân trang theo khóa (?after=<id>&limit=<n>) và chế độ streaming (?stream=1).
+    """
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+    
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'Tham số limit phải lớn hơn 0'}), 400
+    
+    # Chế độ streaming: trả về mảng JSON theo từng phần, bộ nhớ không phụ thuộc số lượng nhân viên
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        employees = employee_service.iter_employees_by_permission(
+            current_user, after, current_app.config['EMPLOYEE_STREAM_CHUNK_SIZE'])
+        return Response(stream_with_context(stream_json_array(employees)), mimetype='application/json')
+    
+    # Không có tham số phân trang: giữ nguyên định dạng danh sách như trước
+    if after is None and limit is None:
+        employees = employee_service.get_employees_by_permission(current_user)
+        return jsonify(employees)
+    
+    limit = min(limit or current_app.config['EMPLOYEE_PAGE_SIZE'], current_app.config['EMPLOYEE_PAGE_MAX_SIZE'])
+    
+    # Lấy thêm một bản ghi để biết còn trang tiếp theo hay không
+    employees = employee_service.get_employees_by_permission(current_user, after, limit + 1)
+    has_next = len(employees) > limit
+    employees = employees[:limit]
+    
+    return jsonify({
+        'employees': employees,
+        'pagination': {
+            'after': after,
+            'limit': limit,
+            'next_after': employees[-1]['id'] if has_next else None,
+            'has_next': has_next
+        }
+    })
+
+@employee_routes.route('/batch', methods=['GET'])
+@login_required
+def get_employees_batch():
+    """Lấy thông tin nhiều nhân viên theo danh sách ID (?ids=1,2,3), chỉ trả về nhân viên được phép xem."""
+    try:
+        employee_ids = [int(employee_id) for employee_id in request.args.get('ids', '').split(',') if employee_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'Danh sách ID nhân viên không hợp lệ'}), 400
+    
+    if len(employee_ids) > current_app.config['EMPLOYEE_PAGE_MAX_SIZE']:
+        return jsonify({'error': 'Số lượng ID vượt quá giới hạn cho phép'}), 400
+    
+    employees = employee_service.get_employees_by_ids(current_user, employee_ids)
     return jsonify(employees)
 
 @employee_routes.route('/<int:employee_id>', methods=['GET'])
@@ -36,13 +87,97 @@ def create_employee():
         return jsonify({'error': 'Không có quyền tạo nhân viên'}), 403
         
     data = request.get_json()
-    result = employee_service.create_employee(data)
+    result = employee_service.create_employee(data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('CREATE', 'employee', result['id'], f"Tạo nhân viên {result['full_name']}")
+    commit_action('CREATE', 'employee', result['id'], f"Tạo nhân viên {result['full_name']}")
     return jsonify(result), 201
 
+@employee_routes.route('/bulk', methods=['POST'])
+@login_required
+def import_employees():
+    """Nhập nhiều nhân viên từ CSV (text/csv) hoặc NDJSON (application/x-ndjson) gửi theo luồng.
+    
+    Các dòng không hợp lệ hoặc bị trùng được bỏ qua và liệt kê trong báo cáo lỗi.
+    """
+    if not has_permission(current_user, 'employee', 'create'):
+        return jsonify({'error': 'Không có quyền tạo nhân viên'}), 403
+    
+    if request.mimetype == 'text/csv':
+        records = read_csv(iter_text_lines(request.stream))
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = read_ndjson(iter_text_lines(request.stream))
+    else:
+        return jsonify({'error': 'Chỉ hỗ trợ dữ liệu CSV (text/csv) hoặc NDJSON (application/x-ndjson)'}), 415
+    
+    try:
+        report = employee_service.import_employees(
+            records,
+            chunk_size=current_app.config['EMPLOYEE_IMPORT_CHUNK_SIZE'],
+            max_errors=current_app.config['EMPLOYEE_IMPORT_MAX_ERRORS'],
+            commit=False
+        )
+    except (UnicodeDecodeError, csv.Error):
+        db.session.rollback()
+        return jsonify({'error': 'Dữ liệu nhập không đọc được (yêu cầu CSV/NDJSON mã hóa UTF-8)'}), 400
+    
+    commit_action('CREATE', 'employee', None,
+                  f"Nhập hàng loạt {report['created']} nhân viên ({report['failed']} dòng lỗi)")
+    return jsonify(report), 201 if report['created'] else 200
+
+@employee_routes.route('/bulk', methods=['PATCH'])
+@login_required
+def bulk_update_employees():
+    """Cập nhật hàng loạt nhân viên theo danh sách ID và/hoặc phòng ban.
+    
+    Body: {"ids": [...], "filter": {"department_id": ...}, "changes": {...}}, trong đó changes
+    gồm department_id, salary, salary_percent hoặc salary_expression (ví dụ "salary * 1.05 + 200").
+    """
+    if not has_permission(current_user, 'employee', 'update'):
+        return jsonify({'error': 'Không có quyền cập nhật nhân viên'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    employee_ids = data.get('ids')
+    department_ids = (data.get('filter') or {}).get('department_id')
+    
+    is_id_list = lambda value: isinstance(value, list) and all(
+        isinstance(item, int) and not isinstance(item, bool) for item in value)
+    
+    if employee_ids is not None and not is_id_list(employee_ids):
+        return jsonify({'error': 'Danh sách ID nhân viên không hợp lệ'}), 400
+    
+    if isinstance(department_ids, int) and not isinstance(department_ids, bool):
+        department_ids = [department_ids]
+    if department_ids is not None and not is_id_list(department_ids):
+        return jsonify({'error': 'Bộ lọc phòng ban không hợp lệ'}), 400
+    
+    if employee_ids is None and department_ids is None:
+        return jsonify({'error': 'Cần chỉ định ids hoặc filter'}), 400
+    
+    # Kiểm tra quyền cập nhật tất cả nhân viên trong một lần
+    targets = employee_service.get_employee_departments(employee_ids, department_ids)
+    can_update = has_permission_many(current_user, 'employee', 'update', list(targets), target_departments=targets)
+    denied_ids = sorted(employee_id for employee_id, allowed in can_update.items() if not allowed)
+    if denied_ids:
+        return jsonify({'error': 'Không có quyền cập nhật nhân viên', 'denied_ids': denied_ids}), 403
+    
+    result = employee_service.bulk_update_employees(
+        targets, data.get('changes'), current_app.config['EMPLOYEE_BULK_UPDATE_CHUNK_SIZE'], commit=False)
+    if 'error' in result:
+        return jsonify(result), 400
+    
+    if result['updated']:
+        commit_action('UPDATE', 'employee', None,
+                      f"Cập nhật hàng loạt {result['updated']} nhân viên: {', '.join(data['changes'])}")
+    
+    # Nhân viên bị loại bởi bộ lọc phòng ban vẫn tồn tại, không tính là không tìm thấy
+    existing_ids = targets.keys()
+    if department_ids is not None:
+        existing_ids = employee_service.get_existing_employee_ids(employee_ids)
+    result['not_found'] = sorted(set(employee_ids or ()) - existing_ids)
+    return jsonify(result)
+
 @employee_routes.route('/<int:employee_id>', methods=['PUT'])
 @login_required
 def update_employee(employee_id):
@@ -51,11 +186,11 @@ def update_employee(employee_id):
         return jsonify({'error': 'Không có quyền cập nhật nhân viên'}), 403
         
     data = request.get_json()
-    result = employee_service.update_employee(employee_id, data)
+    result = employee_service.update_employee(employee_id, data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('UPDATE', 'employee', employee_id, f"Cập nhật nhân viên {result['full_name']}")
+    commit_action('UPDATE', 'employee', employee_id, f"Cập nhật nhân viên {result['full_name']}")
     return jsonify(result)
 
 @employee_routes.route('/<int:employee_id>', methods=['DELETE'])
@@ -65,11 +200,11 @@ def delete_employee(employee_id):
     if not has_permission(current_user, 'employee', 'delete', employee_id):
         return jsonify({'error': 'Không có quyền xóa nhân viên'}), 403
         
-    result = employee_service.delete_employee(employee_id)
+    result = employee_service.delete_employee(employee_id, commit=False)
     if 'error' in result:
         return jsonify(result), 400
     
-    log_action('DELETE', 'employee', employee_id, f"Xóa nhân viên {result['full_name']}")
+    commit_action('DELETE', 'employee', employee_id, f"Xóa nhân viên {result['full_name']}")
     return jsonify({'message': 'Xóa nhân viên thành công'})
 
 @employee_routes.route('/department/<int:department_id>', methods=['GET'])
@@ -87,13 +222,26 @@ def get_employees_by_department(department_id):
 def search_employees():
     """Tìm kiếm nhân viên theo các tiêu chí."""
     query = request.args.get('query', '')
-    department_id = request.args.get('department_id')
     
-    if department_id and department_id.isdigit():
-        department_id = int(department_id)
-        if not has_permission(current_user, 'department', 'read', department_id):
+    # Có thể lọc theo nhiều phòng ban (?department_id=1&department_id=2)
+    department_ids = [int(department_id) for department_id in request.args.getlist('department_id')
+                      if department_id.isdigit()]
+    
+    # Kiểm tra quyền truy cập tất cả phòng ban trong một lần
+    if department_ids:
+        can_read = has_permission_many(current_user, 'department', 'read', department_ids)
+        if not all(can_read.values()):
             return jsonify({'error': 'Không có quyền truy cập phòng ban này'}), 403
     
+    department_id = department_ids[0] if len(department_ids) == 1 else department_ids or None
+    
+    # Giới hạn số kết quả khi tìm theo từ khóa (kết quả đã được xếp hạng theo mức độ liên quan)
+    limit = request.args.get('limit', type=int)
+    if query and not limit:
+        limit = current_app.config['EMPLOYEE_SEARCH_LIMIT']
+    if limit:
+        limit = min(limit, current_app.config['EMPLOYEE_PAGE_MAX_SIZE'])
+    
     # Gọi service để tìm kiếm nhân viên
-    employees = employee_service.search_employees(current_user, query, department_id)
+    employees = employee_service.search_employees(current_user, query, department_id, limit)
     return jsonify(employees)
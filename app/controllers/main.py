@@ -1,7 +1,17 @@
-from flask import Blueprint
+from flask import Blueprint, jsonify
+from flask_login import login_required
+from app.utils.db_engine import pool_stats
+from app.utils.rbac import admin_required
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
 def index():
     return {'message': 'Chào mừng đến với Hệ thống Quản lý Nhân viên'}
+
+@main.route('/db-pool-stats')
+@login_required
+@admin_required
+def get_db_pool_stats():
+    """Lấy các chỉ số của pool kết nối cơ sở dữ liệu (số kết nối đang dùng, số lần tạo kết nối, ...)."""
+    return jsonify(pool_stats())
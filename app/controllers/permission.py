@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from app.models.database_schema import User, Role, Permission, db
-from app.utils.audit_logger import log_action
-from app.utils.rbac import admin_required
+from app.utils.audit_logger import commit_action
+from app.utils.rbac import admin_required, invalidate_permission_snapshot
+from app.utils.role_catalog import get_role_catalog
 
 permission_routes = Blueprint('permission', __name__)
 
@@ -11,7 +12,7 @@ permission_routes = Blueprint('permission', __name__)
 @admin_required
 def get_permissions():
     """Lấy danh sách tất cả quyền."""
-    permissions = Permission.query.all()
+    permissions = get_role_catalog().permissions.values()
     return jsonify([{
         'id': permission.id,
         'name': permission.name,
@@ -25,7 +26,7 @@ def get_permissions():
 @admin_required
 def get_permission(permission_id):
     """Lấy thông tin của một quyền cụ thể."""
-    permission = Permission.query.get(permission_id)
+    permission = get_role_catalog().permissions.get(permission_id)
     if not permission:
         return jsonify({'error': 'Không tìm thấy quyền'}), 404
     
@@ -57,9 +58,9 @@ def create_permission():
     )
     
     db.session.add(permission)
-    db.session.commit()
+    db.session.flush()
     
-    log_action('CREATE', 'permission', permission.id, f"Tạo quyền {permission.name}")
+    commit_action('CREATE', 'permission', permission.id, f"Tạo quyền {permission.name}")
     
     return jsonify({
         'id': permission.id,
@@ -96,9 +97,8 @@ def update_permission(permission_id):
     if 'action' in data:
         permission.action = data['action']
     
-    db.session.commit()
-    
-    log_action('UPDATE', 'permission', permission.id, f"Cập nhật quyền {permission.name}")
+    commit_action('UPDATE', 'permission', permission.id, f"Cập nhật quyền {permission.name}")
+    invalidate_permission_snapshot()
     
     return jsonify({
         'id': permission.id,
@@ -124,9 +124,7 @@ def delete_permission(permission_id):
     
     permission_name = permission.name
     db.session.delete(permission)
-    db.session.commit()
-    
-    log_action('DELETE', 'permission', permission_id, f"Xóa quyền {permission_name}")
+    commit_action('DELETE', 'permission', permission_id, f"Xóa quyền {permission_name}")
     
     return jsonify({'message': 'Xóa quyền thành công'})
 
@@ -135,9 +133,9 @@ def delete_permission(permission_id):
 @admin_required
 def get_permission_roles(permission_id):
     """Lấy danh sách vai trò có quyền này."""
-    permission = Permission.query.get(permission_id)
+    catalog = get_role_catalog()
     
-    if not permission:
+    if permission_id not in catalog.permissions:
         return jsonify({'error': 'Không tìm thấy quyền'}), 404
     
     return jsonify([{
@@ -145,4 +143,4 @@ def get_permission_roles(permission_id):
         'name': role.name,
         'description': role.description,
         'role_type': role.role_type.value
-    } for role in permission.roles])
+    } for role in catalog.roles.values() if permission_id in role.permission_ids])
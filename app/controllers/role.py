@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from app.models.database_schema import Role, Permission, db
-from app.utils.audit_logger import log_action
-from app.utils.rbac import admin_required
+from app.utils.audit_logger import commit_action
+from app.utils.rbac import admin_required, invalidate_permission_snapshot
+from app.utils.role_catalog import get_role_catalog
 
 role_routes = Blueprint('role', __name__)
 
@@ -11,7 +12,7 @@ role_routes = Blueprint('role', __name__)
 @admin_required
 def get_roles():
     """Lấy danh sách tất cả vai trò."""
-    roles = Role.query.all()
+    catalog = get_role_catalog()
     return jsonify([{
         'id': role.id,
         'name': role.name,
@@ -22,15 +23,16 @@ def get_roles():
             'name': permission.name,
             'resource': permission.resource,
             'action': permission.action
-        } for permission in role.permissions]
-    } for role in roles])
+        } for permission in (catalog.permissions[permission_id] for permission_id in role.permission_ids)]
+    } for role in catalog.roles.values()])
 
 @role_routes.route('/<int:role_id>', methods=['GET'])
 @login_required
 @admin_required
 def get_role(role_id):
     """Lấy thông tin của một vai trò cụ thể."""
-    role = Role.query.get(role_id)
+    catalog = get_role_catalog()
+    role = catalog.roles.get(role_id)
     if not role:
         return jsonify({'error': 'Không tìm thấy vai trò'}), 404
     
@@ -44,7 +46,7 @@ def get_role(role_id):
             'name': permission.name,
             'resource': permission.resource,
             'action': permission.action
-        } for permission in role.permissions]
+        } for permission in (catalog.permissions[permission_id] for permission_id in role.permission_ids)]
     })
 
 @role_routes.route('/', methods=['POST'])
@@ -80,9 +82,9 @@ def create_role():
                 role.permissions.append(permission)
     
     db.session.add(role)
-    db.session.commit()
+    db.session.flush()
     
-    log_action('CREATE', 'role', role.id, f"Tạo vai trò {role.name}")
+    commit_action('CREATE', 'role', role.id, f"Tạo vai trò {role.name}")
     
     return jsonify({
         'id': role.id,
@@ -137,9 +139,8 @@ def update_role(role_id):
             if permission:
                 role.permissions.append(permission)
     
-    db.session.commit()
-    
-    log_action('UPDATE', 'role', role.id, f"Cập nhật vai trò {role.name}")
+    commit_action('UPDATE', 'role', role.id, f"Cập nhật vai trò {role.name}")
+    invalidate_permission_snapshot()
     
     return jsonify({
         'id': role.id,
@@ -170,9 +171,8 @@ def delete_role(role_id):
     
     role_name = role.name
     db.session.delete(role)
-    db.session.commit()
-    
-    log_action('DELETE', 'role', role_id, f"Xóa vai trò {role_name}")
+    commit_action('DELETE', 'role', role_id, f"Xóa vai trò {role_name}")
+    invalidate_permission_snapshot()
     
     return jsonify({'message': 'Xóa vai trò thành công'})
 
@@ -181,7 +181,8 @@ def delete_role(role_id):
 @admin_required
 def get_role_permissions(role_id):
     """Lấy danh sách quyền của vai trò."""
-    role = Role.query.get(role_id)
+    catalog = get_role_catalog()
+    role = catalog.roles.get(role_id)
     
     if not role:
         return jsonify({'error': 'Không tìm thấy vai trò'}), 404
@@ -191,14 +192,14 @@ def get_role_permissions(role_id):
         'name': permission.name,
         'resource': permission.resource,
         'action': permission.action
-    } for permission in role.permissions])
+    } for permission in (catalog.permissions[permission_id] for permission_id in role.permission_ids)])
 
 @role_routes.route('/permissions', methods=['GET'])
 @login_required
 @admin_required
 def get_all_permissions():
     """Lấy danh sách tất cả quyền."""
-    permissions = Permission.query.all()
+    permissions = get_role_catalog().permissions.values()
     
     return jsonify([{
         'id': permission.id,
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from app.models.database_schema import User, Role, db
 from app.services.user_service import UserService
-from app.utils.audit_logger import log_action
+from app.utils.audit_logger import commit_action
 from app.utils.rbac import admin_required
 
 user_routes = Blueprint('user', __name__)
@@ -32,10 +32,10 @@ def get_user(user_id):
 def create_user():
     """Tạo người dùng mới."""
     data = request.get_json()
-    result = user_service.create_user(data)
+    result = user_service.create_user(data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
-    log_action('CREATE', 'user', result['id'], f"Tạo người dùng {result['username']}")
+    commit_action('CREATE', 'user', result['id'], f"Tạo người dùng {result['username']}")
     return jsonify(result), 201
 
 @user_routes.route('/<int:user_id>', methods=['PUT'])
@@ -44,10 +44,10 @@ def create_user():
 def update_user(user_id):
     """Cập nhật thông tin người dùng."""
     data = request.get_json()
-    result = user_service.update_user(user_id, data)
+    result = user_service.update_user(user_id, data, commit=False)
     if 'error' in result:
         return jsonify(result), 400
-    log_action('UPDATE', 'user', user_id, f"Cập nhật người dùng {result['username']}")
+    commit_action('UPDATE', 'user', user_id, f"Cập nhật người dùng {result['username']}")
     return jsonify(result)
 
 @user_routes.route('/<int:user_id>', methods=['DELETE'])
@@ -55,10 +55,10 @@ def update_user(user_id):
 @admin_required
 def delete_user(user_id):
     """Xóa người dùng."""
-    result = user_service.delete_user(user_id)
+    result = user_service.delete_user(user_id, commit=False)
     if 'error' in result:
         return jsonify(result), 400
-    log_action('DELETE', 'user', user_id, f"Xóa người dùng {result['username']}")
+    commit_action('DELETE', 'user', user_id, f"Xóa người dùng {result['username']}")
     return jsonify({'message': 'Xóa người dùng thành công'})
 
 @user_routes.route('/<int:user_id>/roles', methods=['GET'])
@@ -75,10 +75,10 @@ def get_user_roles(user_id):
 def assign_role(user_id):
     """Gán vai trò cho người dùng."""
     data = request.get_json()
-    result = user_service.assign_role(user_id, data['role_id'])
+    result = user_service.assign_role(user_id, data['role_id'], commit=False)
     if 'error' in result:
         return jsonify(result), 400
-    log_action('UPDATE', 'user_role', user_id, f"Gán vai trò {data['role_id']} cho người dùng {user_id}")
+    commit_action('UPDATE', 'user_role', user_id, f"Gán vai trò {data['role_id']} cho người dùng {user_id}")
     return jsonify(result)
 
 @user_routes.route('/<int:user_id>/roles/<int:role_id>', methods=['DELETE'])
@@ -86,8 +86,8 @@ def assign_role(user_id):
 @admin_required
 def revoke_role(user_id, role_id):
     """Thu hồi vai trò từ người dùng."""
-    result = user_service.revoke_role(user_id, role_id)
+    result = user_service.revoke_role(user_id, role_id, commit=False)
     if 'error' in result:
         return jsonify(result), 400
-    log_action('UPDATE', 'user_role', user_id, f"Thu hồi vai trò {role_id} từ người dùng {user_id}")
+    commit_action('UPDATE', 'user_role', user_id, f"Thu hồi vai trò {role_id} từ người dùng {user_id}")
     return jsonify({'message': 'Thu hồi vai trò thành công'})
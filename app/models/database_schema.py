@@ -47,13 +47,14 @@ class User(db.Model, UserMixin):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    tokens_revoked_at = db.Column(db.DateTime, nullable=True)  # token cấp trước thời điểm này không còn hiệu lực
     
     # Quan hệ với Employee (1-1)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=True)
     employee = db.relationship('Employee', backref=db.backref('user', uselist=False))
     
     # Quan hệ với Role (nhiều-nhiều)
-    roles = db.relationship('Role', secondary=user_roles, lazy='subquery',
+    roles = db.relationship('Role', secondary=user_roles, lazy=True,
                            backref=db.backref('users', lazy=True))
     
     # Quan hệ với AuditLog (1-nhiều)
@@ -74,7 +75,7 @@ class Role(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Quan hệ với Permission (nhiều-nhiều)
-    permissions = db.relationship('Permission', secondary=role_permissions, lazy='subquery',
+    permissions = db.relationship('Permission', secondary=role_permissions, lazy=True,
                                  backref=db.backref('roles', lazy=True))
     
     def __repr__(self):
@@ -131,7 +132,7 @@ class Employee(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Quan hệ với Department (nhiều-1)
-    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False, index=True)
     
     # Quan hệ với các phòng ban mà nhân viên là trưởng phòng (1-nhiều)
     managed_departments = db.relationship('Department', 
@@ -155,5 +156,53 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Chỉ mục cho các bộ lọc của danh sách nhật ký, luôn sắp xếp theo thời gian giảm dần
+    __table_args__ = (
+        db.Index('ix_audit_logs_timestamp', 'timestamp'),
+        db.Index('ix_audit_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_audit_logs_action_timestamp', 'action', 'timestamp'),
+        db.Index('ix_audit_logs_resource_timestamp', 'resource', 'timestamp'),
+        db.Index('ix_audit_logs_resource_resource_id_timestamp', 'resource', 'resource_id', 'timestamp'),
+    )
+    
+    @property
+    def username(self):
+        return self.user.username if self.user else None
+    
     def __repr__(self):
         return f'<AuditLog {self.id}>'
+
+# Bảng thống kê nhật ký theo giờ, được cập nhật cùng lúc với việc ghi nhật ký
+class AuditLogRollup(db.Model):
+    __tablename__ = 'audit_log_rollups'
+    
+    bucket = db.Column(db.DateTime, primary_key=True)  # đầu giờ (phút, giây = 0)
+    action = db.Column(db.Enum(ActionType), primary_key=True)
+    resource = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AuditLogRollup {self.bucket} {self.action} {self.resource} {self.user_id}>'
+
+# Phiên bản của dữ liệu được các tiến trình lưu trong bộ nhớ (ví dụ danh mục vai trò và quyền),
+# tăng lên trong cùng giao dịch với thay đổi để các tiến trình khác biết cần tải lại
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CacheVersion {self.name} {self.version}>'
+
+# Token JWT bị thu hồi trước khi hết hạn (ví dụ khi đăng xuất); dòng đã hết hạn có thể xóa
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
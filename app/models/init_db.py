@@ -1,15 +1,34 @@
 from app.models.database_schema import db, User, Role, Permission, Employee, Department, AuditLog, RoleType, ActionType
-from werkzeug.security import generate_password_hash
+from app.utils.passwords import hash_password
 from datetime import datetime, date
 import os
 
 def init_db():
-    """Khởi tạo cơ sở dữ liệu và tạo các bảng."""
+    """
+    Khởi tạo cơ sở dữ liệu và tạo các bảng.
+    
+    Returns:
+        True nếu cơ sở dữ liệu còn trống và dữ liệu ban đầu vừa được tạo
+    """
     db.create_all()
     
+    # Tạo chỉ mục toàn văn cho tìm kiếm nhân viên
+    from app.utils.search_index import ensure_search_index
+    ensure_search_index()
+    
+    # Tính lại bảng thống kê nhật ký nếu thiếu so với audit_logs (ví dụ bảng vừa được tạo)
+    from app.utils.audit_rollup import ensure_audit_rollup
+    ensure_audit_rollup()
+    
+    # Dòng phiên bản của danh mục vai trò và quyền
+    from app.utils.role_catalog import ensure_catalog_version
+    ensure_catalog_version()
+    
     # Kiểm tra xem đã có dữ liệu trong cơ sở dữ liệu chưa
     if User.query.first() is None:
         create_initial_data()
+        return True
+    return False
 
 def create_initial_data():
     """Tạo dữ liệu ban đầu cho cơ sở dữ liệu."""
@@ -291,7 +310,7 @@ def create_users(employees, roles):
     admin_user = User(
         username='admin',
         email='admin@company.com',
-        password_hash=generate_password_hash('admin123'),
+        password_hash=hash_password('admin123'),
         is_active=True
     )
     admin_user.roles.append(roles['admin'])
@@ -301,7 +320,7 @@ def create_users(employees, roles):
     hr_manager_user = User(
         username='hr_manager',
         email=employees['hr_manager'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['hr_manager']
     )
@@ -311,7 +330,7 @@ def create_users(employees, roles):
     hr_employee1_user = User(
         username='hr_employee1',
         email=employees['hr_employee1'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['hr_employee1']
     )
@@ -321,7 +340,7 @@ def create_users(employees, roles):
     hr_employee2_user = User(
         username='hr_employee2',
         email=employees['hr_employee2'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['hr_employee2']
     )
@@ -332,7 +351,7 @@ def create_users(employees, roles):
     accounting_manager_user = User(
         username='accounting_manager',
         email=employees['accounting_manager'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['accounting_manager']
     )
@@ -343,7 +362,7 @@ def create_users(employees, roles):
     accounting_employee1_user = User(
         username='accounting_employee1',
         email=employees['accounting_employee1'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['accounting_employee1']
     )
@@ -354,7 +373,7 @@ def create_users(employees, roles):
     it_manager_user = User(
         username='it_manager',
         email=employees['it_manager'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['it_manager']
     )
@@ -364,7 +383,7 @@ def create_users(employees, roles):
     it_employee1_user = User(
         username='it_employee1',
         email=employees['it_employee1'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['it_employee1']
     )
@@ -374,7 +393,7 @@ def create_users(employees, roles):
     it_employee2_user = User(
         username='it_employee2',
         email=employees['it_employee2'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['it_employee2']
     )
@@ -385,7 +404,7 @@ def create_users(employees, roles):
     sales_manager_user = User(
         username='sales_manager',
         email=employees['sales_manager'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['sales_manager']
     )
@@ -395,7 +414,7 @@ def create_users(employees, roles):
     sales_employee1_user = User(
         username='sales_employee1',
         email=employees['sales_employee1'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['sales_employee1']
     )
@@ -406,7 +425,7 @@ def create_users(employees, roles):
     marketing_manager_user = User(
         username='marketing_manager',
         email=employees['marketing_manager'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['marketing_manager']
     )
@@ -416,7 +435,7 @@ def create_users(employees, roles):
     marketing_employee1_user = User(
         username='marketing_employee1',
         email=employees['marketing_employee1'].email,
-        password_hash=generate_password_hash('password'),
+        password_hash=hash_password('password'),
         is_active=True,
         employee=employees['marketing_employee1']
     )
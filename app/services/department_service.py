@@ -1,13 +1,28 @@
 from app.models.database_schema import Department, Employee, db
+from app.utils.department_stats import get_department_statistics
+from app.utils.rbac import invalidate_permission_snapshot
+from app.utils.uniqueness import check_unique, commit_unique
 from flask_login import current_user
 
 class DepartmentService:
-    """Service class for department management operations."""
+    """Service class for department management operations.
+    
+    Write methods accept ``commit=False`` to flush without committing.
+    """
+    
+    # Các trường duy nhất và thông báo lỗi khi bị trùng
+    UNIQUE_FIELDS = (
+        ('name', 'Tên phòng ban đã tồn tại'),
+    )
     
     def get_all_departments(self):
-        """Get all departments."""
-        departments = Department.query.all()
-        return [self._serialize_department(dept) for dept in departments]
+        """Get all departments, counting employees with one grouped query."""
+        counts = self._employee_counts()
+        departments = db.session.query(Department, db.func.coalesce(counts.c.employee_count, 0)) \
+            .outerjoin(counts, counts.c.department_id == Department.id) \
+            .options(db.joinedload(Department.manager)) \
+            .order_by(Department.id)
+        return [self._serialize_department(dept, employee_count) for dept, employee_count in departments]
     
     def get_department_by_id(self, department_id):
         """Get department by ID."""
@@ -16,11 +31,12 @@ class DepartmentService:
             return None
         return self._serialize_department(department)
     
-    def create_department(self, data):
+    def create_department(self, data, commit=True):
         """Create a new department."""
         # Check if department name already exists
-        if Department.query.filter_by(name=data.get('name')).first():
-            return {'error': 'Tên phòng ban đã tồn tại'}
+        conflict = check_unique(Department, self.UNIQUE_FIELDS, data)
+        if conflict:
+            return conflict
         
         # Create new department
         department = Department(
@@ -36,11 +52,16 @@ class DepartmentService:
             department.manager_id = data['manager_id']
         
         db.session.add(department)
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
+        
+        # Tên phòng ban và trưởng phòng quyết định phạm vi quyền của người dùng
+        invalidate_permission_snapshot()
         
         return self._serialize_department(department)
     
-    def update_department(self, department_id, data):
+    def update_department(self, department_id, data, commit=True):
         """Update department information."""
         department = Department.query.get(department_id)
         if not department:
@@ -48,8 +69,9 @@ class DepartmentService:
         
         # Update name if provided and not already taken
         if 'name' in data and data['name'] != department.name:
-            if Department.query.filter_by(name=data['name']).first():
-                return {'error': 'Tên phòng ban đã tồn tại'}
+            conflict = check_unique(Department, self.UNIQUE_FIELDS, {'name': data['name']}, exclude_id=department_id)
+            if conflict:
+                return conflict
             department.name = data['name']
         
         # Update description if provided
@@ -71,29 +93,36 @@ class DepartmentService:
                 
                 department.manager_id = data['manager_id']
         
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
+        invalidate_permission_snapshot()
         
         return self._serialize_department(department)
     
-    def delete_department(self, department_id):
+    def delete_department(self, department_id, commit=True):
         """Delete a department."""
         department = Department.query.get(department_id)
         if not department:
             return {'error': 'Không tìm thấy phòng ban'}
         
         # Check if department has employees
-        if department.employees:
+        if self._count_employees(department_id):
             return {'error': 'Không thể xóa phòng ban có nhân viên. Vui lòng chuyển nhân viên sang phòng ban khác trước.'}
         
         # Store department info for return
         department_info = self._serialize_department(department)
         
         db.session.delete(department)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        invalidate_permission_snapshot()
         
         return department_info
     
-    def set_department_manager(self, department_id, employee_id):
+    def set_department_manager(self, department_id, employee_id, commit=True):
         """Set department manager."""
         department = Department.query.get(department_id)
         if not department:
@@ -102,7 +131,11 @@ class DepartmentService:
         if employee_id is None:
             # Xóa trưởng phòng
             department.manager_id = None
-            db.session.commit()
+            if commit:
+                db.session.commit()
+            else:
+                db.session.flush()
+            invalidate_permission_snapshot()
             return self._serialize_department(department)
         
         employee = Employee.query.get(employee_id)
@@ -114,7 +147,11 @@ class DepartmentService:
             return {'error': 'Nhân viên phải thuộc phòng ban để có thể trở thành trưởng phòng'}
         
         department.manager_id = employee_id
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        invalidate_permission_snapshot()
         
         return self._serialize_department(department)
     
@@ -126,40 +163,32 @@ class DepartmentService:
         return employee_service.get_employees_by_department(department_id, current_user)
     
     def get_department_statistics(self):
-        """Get statistics about departments."""
-        departments = Department.query.all()
-        
-        statistics = []
-        for dept in departments:
-            # Tính số lượng nhân viên
-            employee_count = len(dept.employees)
-            
-            # Tính tổng lương
-            total_salary = sum(emp.salary for emp in dept.employees) if dept.employees else 0
-            
-            # Tính lương trung bình
-            avg_salary = total_salary / employee_count if employee_count > 0 else 0
-            
-            statistics.append({
-                'id': dept.id,
-                'name': dept.name,
-                'manager_name': dept.manager.full_name if dept.manager else None,
-                'employee_count': employee_count,
-                'total_salary': total_salary,
-                'average_salary': avg_salary
-            })
-        
-        return statistics
+        """Get salary statistics about departments (cached until employees or departments change)."""
+        return get_department_statistics()
+    
+    def _employee_counts(self):
+        """Subquery with the number of employees of each department."""
+        return db.session.query(
+            Employee.department_id,
+            db.func.count(Employee.id).label('employee_count')
+        ).group_by(Employee.department_id).subquery()
     
-    def _serialize_department(self, department):
+    def _count_employees(self, department_id):
+        """Count the employees of a department without loading them."""
+        return db.session.query(db.func.count(Employee.id)).filter(Employee.department_id == department_id).scalar()
+    
+    def _serialize_department(self, department, employee_count=None):
         """Convert department object to dictionary."""
+        if employee_count is None:
+            employee_count = self._count_employees(department.id)
+        
         return {
             'id': department.id,
             'name': department.name,
             'description': department.description,
             'manager_id': department.manager_id,
             'manager_name': department.manager.full_name if department.manager else None,
-            'employee_count': len(department.employees),
+            'employee_count': employee_count,
             'created_at': department.created_at.isoformat() if department.created_at else None,
             'updated_at': department.updated_at.isoformat() if department.updated_at else None
         }
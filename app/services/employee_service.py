@@ -1,61 +1,119 @@
-from app.models.database_schema import Employee, Department, db
+from app.models.database_schema import Employee, Department, RoleType, db
+from app.utils.db_engine import begin_write_transaction
+from app.utils.rbac import get_permission_snapshot, has_permission_many, invalidate_permission_snapshot
+from app.utils.salary_expression import compile_salary_expression
+from app.utils.search_index import match_subquery, search_terms
+from app.utils.uniqueness import check_unique, commit_unique
 from flask_login import current_user
+from sqlalchemy.exc import DataError, IntegrityError
 import datetime
+import itertools
+import math
 
 class EmployeeService:
-    """Service class for employee management operations."""
+    """Service class for employee management operations.
     
-    def get_employees_by_permission(self, user):
-        """Get employees based on user's permissions."""
-        # Nếu không có nhân viên liên kết với người dùng, trả về danh sách trống
-        if not user.employee:
+    Write methods commit by default. With ``commit=False`` they only flush, so
+    the caller can commit the change together with its audit record.
+    """
+    
+    # Các trường bắt buộc khi nhập nhân viên hàng loạt
+    IMPORT_REQUIRED_FIELDS = ('employee_code', 'full_name', 'birth_date', 'email', 'salary', 'tax_code', 'department_id')
+    
+    # Các trường duy nhất và thông báo lỗi khi bị trùng
+    UNIQUE_FIELDS = (
+        ('employee_code', 'Mã nhân viên đã tồn tại'),
+        ('email', 'Email đã tồn tại'),
+        ('tax_code', 'Mã số thuế đã tồn tại')
+    )
+    
+    # Các thay đổi được phép khi cập nhật hàng loạt
+    BULK_UPDATE_FIELDS = ('department_id', 'salary', 'salary_percent', 'salary_expression')
+    
+    def get_employees_by_permission(self, user, after=None, limit=None):
+        """Get employees based on user's permissions, ordered by id.
+        
+        ``after`` is a keyset cursor (the last id already seen) and ``limit``
+        caps the number of rows returned.
+        """
+        listing = self._listing_for_user(user)
+        if listing is None:
             return []
         
-        current_employee = user.employee
+        query, serialize = listing
+        query = self._apply_keyset(query, after)
+        if limit:
+            query = query.limit(limit)
+        
+        return [serialize(emp) for emp in query]
+    
+    def iter_employees_by_permission(self, user, after=None, chunk_size=500):
+        """Return a generator of serialized employees, fetching rows in chunks.
+        
+        Permissions are resolved immediately so the generator can be consumed
+        later by a streaming response.
+        """
+        listing = self._listing_for_user(user)
+        if listing is None:
+            return iter(())
+        
+        query, serialize = listing
+        query = self._apply_keyset(query, after)
+        return (serialize(emp) for emp in query.yield_per(chunk_size))
+    
+    def _listing_for_user(self, user):
+        """Resolve the employee query and serializer allowed for the user."""
+        snapshot = get_permission_snapshot(user)
+        
+        # Nếu không có nhân viên liên kết với người dùng, không được xem danh sách
+        if snapshot.employee_id is None:
+            return None
         
         # Kiểm tra vai trò của người dùng
-        is_hr = any(role.role_type.value in ['hr_employee', 'hr_manager'] for role in user.roles)
-        is_hr_manager = any(role.role_type.value == 'hr_manager' for role in user.roles)
-        is_manager = any(role.role_type.value == 'manager' for role in user.roles)
-        is_accounting = any(role.role_type.value == 'accounting' for role in user.roles)
-        is_admin = any(role.role_type.value == 'admin' for role in user.roles)
+        is_hr = bool(snapshot.role_types & {RoleType.HR_EMPLOYEE, RoleType.HR_MANAGER})
+        is_hr_manager = RoleType.HR_MANAGER in snapshot.role_types
+        is_manager = RoleType.MANAGER in snapshot.role_types
+        is_accounting = RoleType.ACCOUNTING in snapshot.role_types
+        is_admin = snapshot.is_admin
+        
+        with_salary = lambda emp: self._serialize_employee(emp, include_salary=True)
+        without_salary = lambda emp: self._serialize_employee(emp, include_salary=False)
         
         # Admin có thể xem tất cả nhân viên
         if is_admin:
-            employees = Employee.query.all()
-            return [self._serialize_employee(emp, include_salary=True) for emp in employees]
+            return self._employee_query(), with_salary
         
         # Trưởng phòng nhân sự có thể xem tất cả nhân viên với đầy đủ thông tin
-        if is_hr_manager and current_employee.department.name == 'HR':
-            employees = Employee.query.all()
-            return [self._serialize_employee(emp, include_salary=True) for emp in employees]
-        
-        # Nhân viên phòng nhân sự có thể xem tất cả nhân viên trừ nhân viên cùng phòng
-        if is_hr and current_employee.department.name == 'HR':
-            # Lấy tất cả nhân viên không thuộc phòng HR
-            employees_other_dept = Employee.query.filter(Employee.department_id != current_employee.department_id).all()
-            # Lấy nhân viên cùng phòng HR (không bao gồm lương)
-            employees_same_dept = Employee.query.filter_by(department_id=current_employee.department_id).all()
-            
-            result = [self._serialize_employee(emp, include_salary=True) for emp in employees_other_dept]
-            result.extend([self._serialize_employee(emp, include_salary=False) for emp in employees_same_dept])
-            return result
+        if is_hr_manager and snapshot.department_name == 'HR':
+            return self._employee_query(), with_salary
+        
+        # Nhân viên phòng nhân sự có thể xem tất cả nhân viên, nhưng không xem lương nhân viên cùng phòng
+        if is_hr and snapshot.department_name == 'HR':
+            own_department_id = snapshot.department_id
+            return self._employee_query(), lambda emp: self._serialize_employee(
+                emp, include_salary=emp.department_id != own_department_id)
         
         # Nhân viên phòng kế toán có thể xem mã số, lương và mã số thuế của tất cả nhân viên
-        if is_accounting and current_employee.department.name == 'Accounting':
-            employees = Employee.query.all()
-            return [self._serialize_employee_for_accounting(emp) for emp in employees]
+        if is_accounting and snapshot.department_name == 'Accounting':
+            return self._employee_query(), self._serialize_employee_for_accounting
         
         # Trưởng phòng có thể xem tất cả nhân viên trong phòng mình, bao gồm lương
-        if is_manager:
-            managed_dept_ids = [dept.id for dept in current_employee.managed_departments]
-            if managed_dept_ids:
-                employees = Employee.query.filter(Employee.department_id.in_(managed_dept_ids)).all()
-                return [self._serialize_employee(emp, include_salary=True) for emp in employees]
+        if is_manager and snapshot.managed_department_ids:
+            return self._employee_query().filter(
+                Employee.department_id.in_(snapshot.managed_department_ids)), with_salary
         
         # Nhân viên thông thường chỉ có thể xem nhân viên cùng phòng, không bao gồm lương
-        employees = Employee.query.filter_by(department_id=current_employee.department_id).all()
-        return [self._serialize_employee(emp, include_salary=False) for emp in employees]
+        return self._employee_query().filter_by(department_id=snapshot.department_id), without_salary
+    
+    def _employee_query(self):
+        """Base query for employee listings, loading departments in the same SELECT."""
+        return Employee.query.options(db.joinedload(Employee.department))
+    
+    def _apply_keyset(self, query, after=None):
+        """Order by id and skip rows up to the ``after`` cursor."""
+        if after is not None:
+            query = query.filter(Employee.id > after)
+        return query.order_by(Employee.id)
     
     def get_employee_by_id(self, employee_id):
         """Get employee by ID."""
@@ -68,80 +126,97 @@ class EmployeeService:
         
         return self._serialize_employee(employee, include_salary)
     
+    def get_employees_by_ids(self, user, employee_ids):
+        """Get the employees among ``employee_ids`` that the user may read."""
+        employees = self._employee_query().filter(Employee.id.in_(employee_ids)).order_by(Employee.id).all()
+        
+        # Kiểm tra quyền xem của tất cả nhân viên trong một lần
+        can_read = has_permission_many(user, 'employee', 'read', [emp.id for emp in employees],
+                                       target_departments={emp.id: emp.department_id for emp in employees})
+        scope = self._visibility_scope(user)
+        
+        return [self._serialize_employee(emp, self._salary_visible(scope, emp))
+                for emp in employees if can_read[emp.id]]
+    
     def get_employees_by_department(self, department_id, user):
         """Get employees by department ID."""
-        employees = Employee.query.filter_by(department_id=department_id).all()
+        snapshot = get_permission_snapshot(user)
         
         # Kiểm tra quyền xem lương
-        if not user.employee:
+        if snapshot.employee_id is None:
             return []
         
-        current_employee = user.employee
-        is_hr_manager = any(role.role_type.value == 'hr_manager' for role in user.roles)
-        is_manager = any(role.role_type.value == 'manager' for role in user.roles)
-        is_accounting = any(role.role_type.value == 'accounting' for role in user.roles)
-        is_admin = any(role.role_type.value == 'admin' for role in user.roles)
-        
         # Xác định có được xem lương không
         include_salary = False
-        if is_admin:
+        if snapshot.is_admin:
             include_salary = True
-        elif is_hr_manager and current_employee.department.name == 'HR':
+        elif RoleType.HR_MANAGER in snapshot.role_types and snapshot.department_name == 'HR':
             include_salary = True
-        elif is_accounting and current_employee.department.name == 'Accounting':
+        elif RoleType.ACCOUNTING in snapshot.role_types and snapshot.department_name == 'Accounting':
             include_salary = True
-        elif is_manager:
+        elif RoleType.MANAGER in snapshot.role_types:
             # Trưởng phòng chỉ xem được lương nhân viên trong phòng mình quản lý
-            managed_dept_ids = [dept.id for dept in current_employee.managed_departments]
-            include_salary = department_id in managed_dept_ids
+            include_salary = department_id in snapshot.managed_department_ids
+        
+        employees = self._employee_query().filter_by(department_id=department_id).all()
         
         return [self._serialize_employee(emp, include_salary) for emp in employees]
     
-    def search_employees(self, user, query='', department_id=None):
-        """Search employees by query and department."""
+    def search_employees(self, user, query='', department_id=None, limit=None):
+        """Search employees by query and department.
+        
+        When the database has a full-text index the query is matched by word
+        prefix, ignoring Vietnamese diacritics, and results are ranked by
+        relevance; otherwise it falls back to substring matching.
+        """
+        # Xác định phạm vi truy cập của người dùng một lần duy nhất
+        scope = self._visibility_scope(user)
+        if scope is None:
+            return []
+        
         # Bắt đầu với truy vấn cơ bản
-        employee_query = Employee.query
+        employee_query = self._employee_query()
+        order_by = [Employee.id]
         
-        # Lọc theo phòng ban nếu được cung cấp
-        if department_id:
+        # Lọc theo phòng ban (một ID hoặc danh sách ID) nếu được cung cấp
+        if isinstance(department_id, (list, tuple, set)):
+            employee_query = employee_query.filter(Employee.department_id.in_(department_id))
+        elif department_id:
             employee_query = employee_query.filter_by(department_id=department_id)
         
-        # Lọc theo từ khóa tìm kiếm
+        # Lọc theo từ khóa tìm kiếm, ưu tiên chỉ mục toàn văn
         if query:
-            search = f"%{query}%"
-            employee_query = employee_query.filter(
-                db.or_(
-                    Employee.full_name.ilike(search),
-                    Employee.employee_code.ilike(search),
-                    Employee.email.ilike(search)
+            matches = match_subquery(search_terms(query))
+            if matches is not None:
+                employee_query = employee_query.join(matches, matches.c.employee_id == Employee.id)
+                order_by = [matches.c.rank, Employee.id]
+            else:
+                search = f"%{query}%"
+                employee_query = employee_query.filter(
+                    db.or_(
+                        Employee.full_name.ilike(search),
+                        Employee.employee_code.ilike(search),
+                        Employee.email.ilike(search)
+                    )
                 )
-            )
         
-        # Lấy kết quả
-        employees = employee_query.all()
+        # Áp dụng phạm vi được xem và quyền xem lương ngay trong câu truy vấn
+        employee_query = self._apply_visibility(employee_query, scope)
+        employee_query = employee_query.add_columns(self._salary_visibility(scope))
+        employee_query = employee_query.order_by(*order_by)
         
-        # Áp dụng kiểm tra quyền truy cập
-        result = []
-        for emp in employees:
-            # Kiểm tra quyền xem nhân viên
-            if self._can_view_employee(user, emp):
-                # Kiểm tra quyền xem lương
-                include_salary = self._can_view_salary(emp)
-                result.append(self._serialize_employee(emp, include_salary))
+        if limit:
+            employee_query = employee_query.limit(limit)
         
-        return result
+        return [self._serialize_employee(emp, bool(include_salary))
+                for emp, include_salary in employee_query]
     
-    def create_employee(self, data):
+    def create_employee(self, data, commit=True):
         """Create a new employee."""
-        # Kiểm tra mã nhân viên và email đã tồn tại chưa
-        if Employee.query.filter_by(employee_code=data.get('employee_code')).first():
-            return {'error': 'Mã nhân viên đã tồn tại'}
-        
-        if Employee.query.filter_by(email=data.get('email')).first():
-            return {'error': 'Email đã tồn tại'}
-        
-        if Employee.query.filter_by(tax_code=data.get('tax_code')).first():
-            return {'error': 'Mã số thuế đã tồn tại'}
+        # Kiểm tra mã nhân viên, email và mã số thuế đã tồn tại chưa
+        conflict = check_unique(Employee, self.UNIQUE_FIELDS, data)
+        if conflict:
+            return conflict
         
         # Kiểm tra phòng ban có tồn tại không
         department = Department.query.get(data.get('department_id'))
@@ -166,33 +241,160 @@ class EmployeeService:
         )
         
         db.session.add(employee)
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
         
         return self._serialize_employee(employee, include_salary=True)
     
-    def update_employee(self, employee_id, data):
+    def import_employees(self, records, chunk_size=1000, max_errors=1000, commit=True):
+        """Create employees from an iterable of dicts in set-based chunks.
+        
+        Each chunk is checked for duplicates with one query and inserted with
+        one executemany. Invalid rows are skipped and reported instead of
+        aborting the load. Returns ``created``/``failed`` counts and the first
+        ``max_errors`` errors, each with the 1-based ``row`` of the record.
+        """
+        # Mọi lô nằm trong cùng một giao dịch, kể cả trên SQLite
+        begin_write_transaction(db.session)
+        
+        department_ids = {department_id for department_id, in db.session.query(Department.id)}
+        seen = {field: set() for field, _ in self.UNIQUE_FIELDS}
+        report = {'created': 0, 'failed': 0, 'errors': []}
+        
+        def fail(row_number, message):
+            report['failed'] += 1
+            if len(report['errors']) < max_errors:
+                report['errors'].append({'row': row_number, 'error': message})
+        
+        numbered = enumerate(records, 1)
+        while True:
+            chunk = list(itertools.islice(numbered, chunk_size))
+            if not chunk:
+                break
+            
+            # Kiểm tra từng dòng, chưa cần truy vấn cơ sở dữ liệu
+            candidates = []
+            for row_number, data in chunk:
+                try:
+                    candidates.append((row_number, self._parse_import_row(data, department_ids)))
+                except ValueError as e:
+                    fail(row_number, str(e))
+            
+            # Kiểm tra trùng lặp với cơ sở dữ liệu và với các dòng trước đó trong cùng lần nhập
+            existing = self._existing_unique_values([row for _, row in candidates])
+            rows = []
+            for row_number, row in candidates:
+                collision = next((message for field, message in self.UNIQUE_FIELDS
+                                  if row[field] in existing[field] or row[field] in seen[field]), None)
+                if collision:
+                    fail(row_number, collision)
+                    continue
+                
+                for field, _ in self.UNIQUE_FIELDS:
+                    seen[field].add(row[field])
+                rows.append((row_number, row))
+            
+            failed_rows = self._insert_import_rows(rows)
+            for row_number in failed_rows:
+                fail(row_number, 'Dữ liệu trùng với nhân viên đã tồn tại')
+            report['created'] += len(rows) - len(failed_rows)
+        
+        report['errors'].sort(key=lambda error: error['row'])
+        
+        if commit:
+            db.session.commit()
+        
+        return report
+    
+    def _parse_import_row(self, data, department_ids):
+        """Validate one import record and convert it to column values.
+        
+        Raises ValueError with the message reported for the row.
+        """
+        if not isinstance(data, dict):
+            raise ValueError('Dữ liệu không hợp lệ')
+        
+        missing = [field for field in self.IMPORT_REQUIRED_FIELDS if data.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"Thiếu trường bắt buộc: {', '.join(missing)}")
+        
+        try:
+            birth_date = datetime.datetime.strptime(str(data['birth_date']), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Định dạng ngày sinh không hợp lệ (YYYY-MM-DD)')
+        
+        try:
+            salary = float(data['salary'])
+        except (TypeError, ValueError):
+            salary = None
+        if salary is None or not math.isfinite(salary):
+            raise ValueError('Lương không hợp lệ')
+        
+        try:
+            department_id = int(data['department_id'])
+        except (TypeError, ValueError):
+            department_id = None
+        if department_id not in department_ids:
+            raise ValueError('Phòng ban không tồn tại')
+        
+        return {
+            'employee_code': str(data['employee_code']),
+            'full_name': str(data['full_name']),
+            'birth_date': birth_date,
+            'email': str(data['email']),
+            'salary': salary,
+            'tax_code': str(data['tax_code']),
+            'department_id': department_id
+        }
+    
+    def _existing_unique_values(self, rows):
+        """Find which unique values of ``rows`` are already taken, with one query."""
+        values = {field: {row[field] for row in rows} for field, _ in self.UNIQUE_FIELDS}
+        existing = {field: set() for field in values}
+        if not rows:
+            return existing
+        
+        matches = db.session.query(*(getattr(Employee, field) for field in values)).filter(
+            db.or_(*(getattr(Employee, field).in_(field_values) for field, field_values in values.items())))
+        for match in matches:
+            for field in values:
+                existing[field].add(getattr(match, field))
+        return existing
+    
+    def _insert_import_rows(self, rows):
+        """Insert ``(row_number, row)`` pairs with one executemany.
+        
+        If a concurrent write makes the batch violate a unique constraint, the
+        rows are retried one by one. Returns the row numbers that were not inserted.
+        """
+        if not rows:
+            return []
+        
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Employee), [row for _, row in rows])
+            return []
+        except IntegrityError:
+            if len(rows) == 1:
+                return [rows[0][0]]
+            return [row_number for row in rows for row_number in self._insert_import_rows([row])]
+    
+    def update_employee(self, employee_id, data, commit=True):
         """Update employee information."""
         employee = Employee.query.get(employee_id)
         if not employee:
             return {'error': 'Không tìm thấy nhân viên'}
         
-        # Kiểm tra mã nhân viên nếu được cập nhật
-        if 'employee_code' in data and data['employee_code'] != employee.employee_code:
-            if Employee.query.filter_by(employee_code=data['employee_code']).first():
-                return {'error': 'Mã nhân viên đã tồn tại'}
-            employee.employee_code = data['employee_code']
-        
-        # Kiểm tra email nếu được cập nhật
-        if 'email' in data and data['email'] != employee.email:
-            if Employee.query.filter_by(email=data['email']).first():
-                return {'error': 'Email đã tồn tại'}
-            employee.email = data['email']
+        # Kiểm tra mã nhân viên, email và mã số thuế mới (nếu có) chưa được dùng
+        unique_changes = {field: data[field] for field, _ in self.UNIQUE_FIELDS
+                          if field in data and data[field] != getattr(employee, field)}
+        conflict = check_unique(Employee, self.UNIQUE_FIELDS, unique_changes, exclude_id=employee_id)
+        if conflict:
+            return conflict
         
-        # Kiểm tra mã số thuế nếu được cập nhật
-        if 'tax_code' in data and data['tax_code'] != employee.tax_code:
-            if Employee.query.filter_by(tax_code=data['tax_code']).first():
-                return {'error': 'Mã số thuế đã tồn tại'}
-            employee.tax_code = data['tax_code']
+        for field, value in unique_changes.items():
+            setattr(employee, field, value)
         
         # Cập nhật các thông tin khác
         if 'full_name' in data:
@@ -208,17 +410,123 @@ class EmployeeService:
         if 'salary' in data:
             employee.salary = data['salary']
         
+        department_changed = False
         if 'department_id' in data:
             department = Department.query.get(data['department_id'])
             if not department:
                 return {'error': 'Phòng ban không tồn tại'}
+            department_changed = employee.department_id != data['department_id']
             employee.department_id = data['department_id']
         
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
+        
+        # Phòng ban của nhân viên thay đổi thì phạm vi quyền của người dùng liên quan cũng thay đổi
+        if department_changed:
+            invalidate_permission_snapshot()
         
         return self._serialize_employee(employee, include_salary=True)
     
-    def delete_employee(self, employee_id):
+    def get_employee_departments(self, employee_ids=None, department_ids=None):
+        """Map employee id to department id for the given ids and/or departments."""
+        query = db.session.query(Employee.id, Employee.department_id)
+        if employee_ids is not None:
+            query = query.filter(Employee.id.in_(employee_ids))
+        if department_ids is not None:
+            query = query.filter(Employee.department_id.in_(department_ids))
+        return dict(query)
+    
+    def get_existing_employee_ids(self, employee_ids):
+        """Return the subset of ``employee_ids`` that exist, with one id-only query."""
+        if not employee_ids:
+            return set()
+        return {employee_id for employee_id, in db.session.query(Employee.id).filter(Employee.id.in_(employee_ids))}
+    
+    def bulk_update_employees(self, employee_ids, changes, chunk_size=1000, commit=True):
+        """Apply the same changes to many employees with set-based UPDATEs.
+        
+        ``changes`` may set ``department_id`` and ``salary`` directly, or adjust
+        the salary with ``salary_percent`` or ``salary_expression`` (for
+        example ``salary * 1.05 + 200``). Returns the number of updated rows.
+        """
+        values = self._bulk_update_values(changes)
+        if 'error' in values:
+            return values
+        
+        employee_ids = list(employee_ids)
+        updated = 0
+        try:
+            for start in range(0, len(employee_ids), chunk_size):
+                chunk = Employee.query.filter(Employee.id.in_(employee_ids[start:start + chunk_size]))
+                updated += chunk.update(values, synchronize_session=False)
+                
+                # Lương tính theo biểu thức chỉ biết được sau khi cập nhật
+                if 'salary' in values and not self._valid_salaries(chunk):
+                    db.session.rollback()
+                    return {'error': 'Lương sau khi cập nhật phải là số không âm và hữu hạn'}
+        except (IntegrityError, DataError):
+            # DataError: ví dụ chia cho 0 hoặc tràn số trên PostgreSQL
+            db.session.rollback()
+            return {'error': 'Giá trị sau khi cập nhật không hợp lệ'}
+        
+        if commit:
+            db.session.commit()
+        
+        # Phòng ban của nhân viên thay đổi thì phạm vi quyền của người dùng liên quan cũng thay đổi
+        if 'department_id' in values:
+            invalidate_permission_snapshot()
+        
+        return {'updated': updated}
+    
+    def _valid_salaries(self, query):
+        """Check that every salary matched by ``query`` is finite and not negative."""
+        lowest, highest = query.with_entities(db.func.min(Employee.salary), db.func.max(Employee.salary)).one()
+        if lowest is None:
+            return True
+        return lowest >= 0 and math.isfinite(highest)
+    
+    def _bulk_update_values(self, changes):
+        """Validate bulk update changes and build the UPDATE values."""
+        if not isinstance(changes, dict) or not changes:
+            return {'error': 'Cần chỉ định thay đổi cần cập nhật'}
+        
+        unknown = [field for field in changes if field not in self.BULK_UPDATE_FIELDS]
+        if unknown:
+            return {'error': f"Không hỗ trợ cập nhật hàng loạt trường: {', '.join(unknown)}"}
+        
+        if sum(field in changes for field in ('salary', 'salary_percent', 'salary_expression')) > 1:
+            return {'error': 'Chỉ được dùng một trong salary, salary_percent, salary_expression'}
+        
+        values = {}
+        if 'department_id' in changes:
+            department_id = changes['department_id']
+            if not isinstance(department_id, int) or isinstance(department_id, bool) \
+                    or not Department.query.get(department_id):
+                return {'error': 'Phòng ban không tồn tại'}
+            values['department_id'] = changes['department_id']
+        
+        number = lambda value: isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+        
+        if 'salary' in changes:
+            if not number(changes['salary']) or changes['salary'] < 0:
+                return {'error': 'Lương không hợp lệ'}
+            values['salary'] = changes['salary']
+        
+        if 'salary_percent' in changes:
+            if not number(changes['salary_percent']):
+                return {'error': 'Tỷ lệ điều chỉnh lương không hợp lệ'}
+            values['salary'] = Employee.salary * (100 + changes['salary_percent']) / 100
+        
+        if 'salary_expression' in changes:
+            try:
+                values['salary'] = compile_salary_expression(changes['salary_expression'], Employee.salary)
+            except ValueError as e:
+                return {'error': str(e)}
+        
+        return values
+    
+    def delete_employee(self, employee_id, commit=True):
         """Delete an employee."""
         employee = Employee.query.get(employee_id)
         if not employee:
@@ -234,69 +542,96 @@ class EmployeeService:
         
         # Xóa nhân viên
         db.session.delete(employee)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        
+        invalidate_permission_snapshot()
         
         return employee_info
     
+    def _visibility_scope(self, user):
+        """Resolve which departments the user can see and whose salaries.
+        
+        Returns None when the user cannot see any employee. Otherwise ``view``
+        is 'all' or 'departments' (limited to ``view_department_ids``) and
+        ``salary`` is 'all', 'none', 'departments' (only
+        ``salary_department_ids``) or 'other_departments' (all but them).
+        """
+        if not user.is_authenticated:
+            return None
+        
+        snapshot = get_permission_snapshot(user)
+        if snapshot.employee_id is None:
+            return None
+        
+        role_types = snapshot.role_types
+        department_name = snapshot.department_name
+        
+        # Admin, trưởng phòng nhân sự và nhân viên kế toán có thể xem tất cả, kể cả lương
+        if (snapshot.is_admin
+                or (RoleType.HR_MANAGER in role_types and department_name == 'HR')
+                or (RoleType.ACCOUNTING in role_types and department_name == 'Accounting')):
+            return {'view': 'all', 'view_department_ids': set(),
+                    'salary': 'all', 'salary_department_ids': set()}
+        
+        # Nhân viên phòng nhân sự có thể xem tất cả, nhưng chỉ xem lương của nhân viên khác phòng
+        if RoleType.HR_EMPLOYEE in role_types and department_name == 'HR':
+            return {'view': 'all', 'view_department_ids': set(),
+                    'salary': 'other_departments', 'salary_department_ids': {snapshot.department_id}}
+        
+        # Trưởng phòng có thể xem nhân viên và lương trong các phòng mình quản lý
+        if RoleType.MANAGER in role_types:
+            managed_dept_ids = set(snapshot.managed_department_ids)
+            return {'view': 'departments', 'view_department_ids': managed_dept_ids,
+                    'salary': 'departments', 'salary_department_ids': managed_dept_ids}
+        
+        # Nhân viên thông thường chỉ có thể xem nhân viên cùng phòng, không xem lương
+        return {'view': 'departments', 'view_department_ids': {snapshot.department_id},
+                'salary': 'none', 'salary_department_ids': set()}
+    
+    def _apply_visibility(self, query, scope):
+        """Restrict an employee query to the departments visible in the scope."""
+        if scope['view'] == 'departments':
+            query = query.filter(Employee.department_id.in_(scope['view_department_ids']))
+        return query
+    
+    def _salary_visibility(self, scope):
+        """SQL expression telling whether the salary of each row is visible."""
+        if scope['salary'] == 'all':
+            return db.literal(True).label('include_salary')
+        if scope['salary'] == 'departments':
+            return db.case((Employee.department_id.in_(scope['salary_department_ids']), True),
+                           else_=False).label('include_salary')
+        if scope['salary'] == 'other_departments':
+            return db.case((Employee.department_id.in_(scope['salary_department_ids']), False),
+                           else_=True).label('include_salary')
+        return db.literal(False).label('include_salary')
+    
     def _can_view_employee(self, user, employee):
         """Kiểm tra xem người dùng có quyền xem thông tin nhân viên không."""
-        if not user.is_authenticated or not user.employee:
+        scope = self._visibility_scope(user)
+        if scope is None:
             return False
         
-        current_employee = user.employee
-        
-        # Admin có thể xem tất cả
-        if any(role.role_type.value == 'admin' for role in user.roles):
-            return True
-        
-        # Trưởng phòng nhân sự có thể xem tất cả
-        if any(role.role_type.value == 'hr_manager' for role in user.roles) and current_employee.department.name == 'HR':
-            return True
-        
-        # Nhân viên phòng nhân sự có thể xem tất cả nhân viên
-        if any(role.role_type.value == 'hr_employee' for role in user.roles) and current_employee.department.name == 'HR':
-            return True
-        
-        # Nhân viên phòng kế toán có thể xem tất cả nhân viên (chỉ một số thông tin)
-        if any(role.role_type.value == 'accounting' for role in user.roles) and current_employee.department.name == 'Accounting':
-            return True
-        
-        # Trưởng phòng có thể xem nhân viên trong phòng mình
-        if any(role.role_type.value == 'manager' for role in user.roles):
-            managed_dept_ids = [dept.id for dept in current_employee.managed_departments]
-            return employee.department_id in managed_dept_ids
-        
-        # Nhân viên thông thường chỉ có thể xem nhân viên cùng phòng
-        return employee.department_id == current_employee.department_id
+        return scope['view'] == 'all' or employee.department_id in scope['view_department_ids']
     
     def _can_view_salary(self, employee):
         """Kiểm tra xem người dùng hiện tại có quyền xem lương của nhân viên không."""
-        if not current_user.is_authenticated or not current_user.employee:
+        return self._salary_visible(self._visibility_scope(current_user), employee)
+    
+    def _salary_visible(self, scope, employee):
+        """Evaluate the salary rule of a resolved scope for one employee."""
+        if scope is None:
             return False
         
-        current_employee = current_user.employee
-        
-        # Admin có thể xem tất cả
-        if any(role.role_type.value == 'admin' for role in current_user.roles):
-            return True
-        
-        # Trưởng phòng nhân sự có thể xem tất cả
-        if any(role.role_type.value == 'hr_manager' for role in current_user.roles) and current_employee.department.name == 'HR':
+        if scope['salary'] == 'all':
             return True
-        
-        # Nhân viên phòng nhân sự có thể xem lương của nhân viên khác phòng
-        if any(role.role_type.value == 'hr_employee' for role in current_user.roles) and current_employee.department.name == 'HR':
-            return employee.department_id != current_employee.department_id
-        
-        # Nhân viên phòng kế toán có thể xem lương của tất cả nhân viên
-        if any(role.role_type.value == 'accounting' for role in current_user.roles) and current_employee.department.name == 'Accounting':
-            return True
-        
-        # Trưởng phòng có thể xem lương của nhân viên trong phòng mình
-        if any(role.role_type.value == 'manager' for role in current_user.roles):
-            managed_dept_ids = [dept.id for dept in current_employee.managed_departments]
-            return employee.department_id in managed_dept_ids
-        
+        if scope['salary'] == 'departments':
+            return employee.department_id in scope['salary_department_ids']
+        if scope['salary'] == 'other_departments':
+            return employee.department_id not in scope['salary_department_ids']
         return False
     
     def _serialize_employee(self, employee, include_salary=False):
@@ -1,11 +1,24 @@
+from app.auth.auth_utils import revoke_user_tokens
 from app.models.database_schema import User, db
+from app.utils.passwords import hash_password
+from app.utils.rbac import invalidate_permission_snapshot
+from app.utils.uniqueness import check_unique, commit_unique
 
 class UserService:
-    """Service class for user management operations."""
+    """Service class for user management operations.
+    
+    Pass ``commit=False`` to a write method to leave the transaction open.
+    """
+    
+    # Các trường duy nhất và thông báo lỗi khi bị trùng
+    UNIQUE_FIELDS = (
+        ('username', 'Tên đăng nhập đã tồn tại'),
+        ('email', 'Email đã tồn tại')
+    )
     
     def get_all_users(self):
         """Get all users."""
-        users = User.query.all()
+        users = User.query.options(db.selectinload(User.roles)).all()
         return [self._serialize_user(user) for user in users]
     
     def get_user_by_id(self, user_id):
@@ -22,22 +35,18 @@ class UserService:
             return None
         return self._serialize_user(user)
     
-    def create_user(self, data):
+    def create_user(self, data, commit=True):
         """Create a new user."""
         # Check if username or email already exists
-        if User.query.filter_by(username=data.get('username')).first():
-            return {'error': 'Tên đăng nhập đã tồn tại'}
-        
-        if User.query.filter_by(email=data.get('email')).first():
-            return {'error': 'Email đã tồn tại'}
+        conflict = check_unique(User, self.UNIQUE_FIELDS, data)
+        if conflict:
+            return conflict
         
         # Create new user
-        from werkzeug.security import generate_password_hash
-        
         user = User(
             username=data.get('username'),
             email=data.get('email'),
-            password_hash=generate_password_hash(data.get('password')),
+            password_hash=hash_password(data.get('password')),
             is_active=data.get('is_active', True)
         )
         
@@ -49,32 +58,32 @@ class UserService:
                 user.employee = employee
         
         db.session.add(user)
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
         
         return self._serialize_user(user)
     
-    def update_user(self, user_id, data):
+    def update_user(self, user_id, data, commit=True):
         """Update user information."""
         user = User.query.get(user_id)
         if not user:
             return {'error': 'Không tìm thấy người dùng'}
         
-        # Update username if provided and not already taken
-        if 'username' in data and data['username'] != user.username:
-            if User.query.filter_by(username=data['username']).first():
-                return {'error': 'Tên đăng nhập đã tồn tại'}
-            user.username = data['username']
+        # Update username and email if provided and not already taken
+        unique_changes = {field: data[field] for field, _ in self.UNIQUE_FIELDS
+                          if field in data and data[field] != getattr(user, field)}
+        conflict = check_unique(User, self.UNIQUE_FIELDS, unique_changes, exclude_id=user_id)
+        if conflict:
+            return conflict
         
-        # Update email if provided and not already taken
-        if 'email' in data and data['email'] != user.email:
-            if User.query.filter_by(email=data['email']).first():
-                return {'error': 'Email đã tồn tại'}
-            user.email = data['email']
+        for field, value in unique_changes.items():
+            setattr(user, field, value)
         
-        # Update password if provided
+        # Update password if provided; tokens issued before the reset stop working
         if 'password' in data and data['password']:
-            from werkzeug.security import generate_password_hash
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = hash_password(data['password'])
+            revoke_user_tokens(user)
         
         # Update active status if provided
         if 'is_active' in data:
@@ -89,11 +98,14 @@ class UserService:
             elif data['employee_id'] is None:
                 user.employee = None
         
-        db.session.commit()
+        error = commit_unique(self.UNIQUE_FIELDS, commit)
+        if error:
+            return error
+        invalidate_permission_snapshot(user.id)
         
         return self._serialize_user(user)
     
-    def delete_user(self, user_id):
+    def delete_user(self, user_id, commit=True):
         """Delete a user."""
         user = User.query.get(user_id)
         if not user:
@@ -103,7 +115,11 @@ class UserService:
         user_info = self._serialize_user(user)
         
         db.session.delete(user)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        invalidate_permission_snapshot(user_id)
         
         return user_info
     
@@ -115,7 +131,7 @@ class UserService:
         
         return [{'id': role.id, 'name': role.name, 'role_type': role.role_type.value} for role in user.roles]
     
-    def assign_role(self, user_id, role_id):
+    def assign_role(self, user_id, role_id, commit=True):
         """Assign a role to a user."""
         from app.models.database_schema import Role
         
@@ -132,11 +148,15 @@ class UserService:
             return {'error': 'Vai trò đã được gán cho người dùng này'}
         
         user.roles.append(role)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        invalidate_permission_snapshot(user.id)
         
         return {'message': f'Đã gán vai trò {role.name} cho người dùng {user.username}'}
     
-    def revoke_role(self, user_id, role_id):
+    def revoke_role(self, user_id, role_id, commit=True):
         """Revoke a role from a user."""
         from app.models.database_schema import Role
         
@@ -153,7 +173,11 @@ class UserService:
             return {'error': 'Người dùng không có vai trò này'}
         
         user.roles.remove(role)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        invalidate_permission_snapshot(user.id)
         
         return {'message': f'Đã thu hồi vai trò {role.name} từ người dùng {user.username}'}
     
@@ -0,0 +1,320 @@
+import copy
+import datetime
+import gzip
+import heapq
+import json
+import os
+from collections import namedtuple
+from flask import current_app
+from app.models.database_schema import AuditLog, ActionType, User, db
+
+# Bản ghi nhật ký đọc từ tệp lưu trữ, có cùng các thuộc tính mà API sử dụng như AuditLog
+ArchivedAuditLog = namedtuple('ArchivedAuditLog', [
+    'id',
+    'user_id',
+    'username',
+    'action',
+    'resource',
+    'resource_id',
+    'details',
+    'ip_address',
+    'timestamp'
+])
+
+MANIFEST_NAME = 'manifest.json'
+
+# Manifest đã đọc, theo (đường dẫn, thời điểm sửa đổi)
+_manifest_cache = {}
+
+def _archive_dir():
+    return current_app.config['AUDIT_ARCHIVE_DIR']
+
+def _month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+def _next_month(value):
+    return datetime.datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def hot_cutoff(now=None, hot_months=None):
+    """
+    Mốc thời gian của dữ liệu nóng: các tháng trước mốc này được lưu trữ.
+    
+    Args:
+        now: Thời điểm hiện tại (mặc định utcnow)
+        hot_months: Số tháng giữ trong bảng audit_logs (mặc định AUDIT_HOT_MONTHS)
+    
+    Returns:
+        datetime: Ngày đầu tiên của tháng cũ nhất còn được giữ lại
+    """
+    if hot_months is None:
+        hot_months = current_app.config['AUDIT_HOT_MONTHS']
+    
+    cutoff = _month_start(now or datetime.datetime.utcnow())
+    for _ in range(hot_months):
+        cutoff = _month_start(cutoff - datetime.timedelta(days=1))
+    return cutoff
+
+def load_manifest():
+    """
+    Đọc manifest của thư mục lưu trữ.
+    
+    Returns:
+        Dict gồm archived_before (ISO hoặc None) và danh sách segments
+    """
+    path = os.path.join(_archive_dir(), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {'archived_before': None, 'segments': []}
+    
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+def _write_manifest(manifest):
+    # Ghi ra tệp tạm rồi đổi tên để người đọc không bao giờ thấy manifest ghi dở
+    path = os.path.join(_archive_dir(), MANIFEST_NAME)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def archive_audit_logs(before=None):
+    """
+    Chuyển các tháng nhật ký trước mốc `before` sang tệp JSONL nén gzip, mỗi tháng một đoạn.
+    
+    Mỗi đoạn được ghi và đưa vào manifest trước khi các dòng tương ứng bị xóa khỏi
+    audit_logs, nên dừng giữa chừng không làm mất dữ liệu; các dòng còn sót được xóa
+    ở lần chạy sau. Bảng thống kê theo giờ không thay đổi.
+    
+    Args:
+        before: Mốc thời gian (mặc định hot_cutoff()); được làm tròn xuống đầu tháng
+    
+    Returns:
+        Danh sách các đoạn vừa được tạo
+    """
+    before = _month_start(before or hot_cutoff())
+    os.makedirs(_archive_dir(), exist_ok=True)
+    manifest = copy.deepcopy(load_manifest())
+    
+    # Xóa các dòng đã có trong tệp lưu trữ nhưng chưa bị xóa khỏi bảng (lần chạy trước bị dừng)
+    for segment in manifest['segments']:
+        _delete_archived_rows(segment)
+    db.session.commit()
+    
+    created = []
+    oldest = db.session.query(db.func.min(AuditLog.timestamp)).filter(AuditLog.timestamp < before).scalar()
+    month = _month_start(oldest) if oldest else before
+    
+    while month < before:
+        segment = _export_month(month, manifest)
+        if segment is not None:
+            manifest['segments'].append(segment)
+            manifest['archived_before'] = max(manifest['archived_before'] or '', _next_month(month).isoformat())
+            _write_manifest(manifest)
+            
+            _delete_archived_rows(segment)
+            db.session.commit()
+            created.append(segment)
+        month = _next_month(month)
+    
+    return created
+
+def _export_month(month, manifest):
+    """Ghi các nhật ký của một tháng ra một đoạn mới; trả về None nếu tháng không có nhật ký."""
+    query = db.session.query(AuditLog, User.username).outerjoin(User, AuditLog.user_id == User.id).filter(
+        AuditLog.timestamp >= month,
+        AuditLog.timestamp < _next_month(month)
+    ).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).yield_per(1000)
+    
+    # Tháng đã từng được lưu trữ thì ghi thêm một phần mới
+    parts = sum(1 for segment in manifest['segments'] if segment['month'] == month.strftime('%Y-%m'))
+    name = f"audit-{month:%Y-%m}" + (f"-part{parts + 1}" if parts else '') + '.jsonl.gz'
+    path = os.path.join(_archive_dir(), name)
+    
+    segment = {
+        'file': name,
+        'month': month.strftime('%Y-%m'),
+        'start': month.isoformat(),
+        'end': _next_month(month).isoformat(),
+        'order': 'desc',  # (timestamp, id) giảm dần để đọc tuần tự mới nhất trước
+        'rows': 0,
+        'min_id': None,
+        'max_id': None,
+        'user_ids': set(),
+        'actions': set(),
+        'resources': set()
+    }
+    
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        for log, username in query:
+            f.write(json.dumps({
+                'id': log.id,
+                'user_id': log.user_id,
+                'username': username,
+                'action': log.action.name,
+                'resource': log.resource,
+                'resource_id': log.resource_id,
+                'details': log.details,
+                'ip_address': log.ip_address,
+                'timestamp': log.timestamp.isoformat()
+            }, ensure_ascii=False) + '\n')
+            
+            segment['rows'] += 1
+            segment['min_id'] = log.id if segment['min_id'] is None else min(segment['min_id'], log.id)
+            segment['max_id'] = log.id if segment['max_id'] is None else max(segment['max_id'], log.id)
+            segment['user_ids'].add(log.user_id)
+            segment['actions'].add(log.action.name)
+            segment['resources'].add(log.resource)
+    
+    if not segment['rows']:
+        os.remove(path + '.tmp')
+        return None
+    
+    os.replace(path + '.tmp', path)
+    
+    # Tập giá trị để bỏ qua các đoạn không thể khớp bộ lọc khi đọc
+    for key in ('user_ids', 'actions', 'resources'):
+        segment[key] = sorted(segment[key], key=str)
+    return segment
+
+def _delete_archived_rows(segment):
+    # Các dòng có id <= max_id trong tháng đều đã tồn tại khi xuất nên đã nằm trong đoạn
+    AuditLog.query.filter(
+        AuditLog.timestamp >= datetime.datetime.fromisoformat(segment['start']),
+        AuditLog.timestamp < datetime.datetime.fromisoformat(segment['end']),
+        AuditLog.id <= segment['max_id']
+    ).delete(synchronize_session=False)
+
+def includes_archived(filters=None):
+    """
+    Kiểm tra khoảng thời gian của bộ lọc có chạm tới dữ liệu đã lưu trữ không.
+    
+    Chỉ các truy vấn có start_date hoặc end_date trước mốc lưu trữ mới đọc tệp lưu trữ.
+    """
+    filters = filters or {}
+    archived_before = load_manifest()['archived_before']
+    if archived_before is None:
+        return False
+    
+    archived_before = datetime.datetime.fromisoformat(archived_before)
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    return (start_date is not None and start_date < archived_before) or \
+        (end_date is not None and end_date < archived_before)
+
+def _action_filter(filters):
+    action = filters.get('action')
+    if isinstance(action, str):
+        # Giống filter_audit_logs: hành động không hợp lệ thì bỏ qua bộ lọc
+        return action if action in ActionType.__members__ else None
+    return action.name if action else None
+
+def _segment_may_match(segment, filters):
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    if start_date is not None and datetime.datetime.fromisoformat(segment['end']) <= start_date:
+        return False
+    if end_date is not None and datetime.datetime.fromisoformat(segment['start']) > end_date:
+        return False
+    if filters.get('user_id') and filters['user_id'] not in segment['user_ids']:
+        return False
+    if filters.get('resource') and filters['resource'] not in segment['resources']:
+        return False
+    action = _action_filter(filters)
+    return not action or action in segment['actions']
+
+def _row_matches(row, filters, action):
+    if filters.get('user_id') and row['user_id'] != filters['user_id']:
+        return False
+    if action and row['action'] != action:
+        return False
+    if filters.get('resource') and row['resource'] != filters['resource']:
+        return False
+    if filters.get('resource_id') is not None and row['resource_id'] != filters['resource_id']:
+        return False
+    return True
+
+def _read_segment(segment, filters, action, before=None):
+    """Đọc các bản ghi khớp bộ lọc trong một đoạn lưu trữ."""
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    
+    with gzip.open(os.path.join(_archive_dir(), segment['file']), 'rt', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            if not _row_matches(row, filters, action):
+                continue
+            
+            timestamp = datetime.datetime.fromisoformat(row['timestamp'])
+            if start_date is not None and timestamp < start_date:
+                continue
+            if end_date is not None and timestamp > end_date:
+                continue
+            if before is not None and (timestamp, row['id']) >= before:
+                continue
+            
+            yield ArchivedAuditLog(**dict(row, action=ActionType[row['action']], timestamp=timestamp))
+
+def iter_archived_logs(filters=None, before=None):
+    """
+    Duyệt các nhật ký đã lưu trữ khớp bộ lọc, mới nhất trước.
+    
+    Args:
+        filters: Dict bộ lọc giống get_audit_logs
+        before: Chỉ lấy các bản ghi có (timestamp, id) nhỏ hơn giá trị này (tùy chọn)
+    
+    Yields:
+        ArchivedAuditLog
+    """
+    filters = filters or {}
+    action = _action_filter(filters)
+    
+    # Gom các phần của cùng một tháng để trộn chung; các tháng không chồng lên nhau
+    months = {}
+    for segment in load_manifest()['segments']:
+        if _segment_may_match(segment, filters):
+            months.setdefault(segment['month'], []).append(segment)
+    
+    for month in sorted(months, reverse=True):
+        # Mỗi đoạn đã theo thứ tự giảm dần nên chỉ cần trộn, không phải đọc cả tháng vào bộ nhớ
+        yield from heapq.merge(
+            *(_read_segment_newest_first(segment, filters, action, before) for segment in months[month]),
+            key=_log_order,
+            reverse=True
+        )
+
+def _log_order(log):
+    return log.timestamp, log.id
+
+def _read_segment_newest_first(segment, filters, action, before=None):
+    logs = _read_segment(segment, filters, action, before)
+    if segment.get('order') == 'desc':
+        return logs
+    
+    # Đoạn tạo bởi phiên bản cũ được ghi theo thứ tự tăng dần
+    return iter(sorted(logs, key=_log_order, reverse=True))
+
+def count_archived_logs(filters=None):
+    """Đếm số nhật ký đã lưu trữ khớp bộ lọc; dùng số dòng trong manifest khi không cần đọc tệp."""
+    filters = filters or {}
+    action = _action_filter(filters)
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    only_dates = not (filters.get('user_id') or action or filters.get('resource')) \
+        and filters.get('resource_id') is None
+    
+    total = 0
+    for segment in load_manifest()['segments']:
+        if not _segment_may_match(segment, filters):
+            continue
+        
+        # Đoạn nằm trọn trong khoảng thời gian và không lọc theo cột khác: dùng số dòng đã ghi
+        if only_dates \
+                and (start_date is None or datetime.datetime.fromisoformat(segment['start']) >= start_date) \
+                and (end_date is None or datetime.datetime.fromisoformat(segment['end']) <= end_date):
+            total += segment['rows']
+        else:
+            total += sum(1 for _ in _read_segment(segment, filters, action))
+    return total
@@ -1,13 +1,246 @@
-from flask import request, g
+from flask import request, g, current_app
 from flask_login import current_user
-from app.models.database_schema import AuditLog, ActionType, db
+from app.models.database_schema import AuditLog, ActionType, User, db
+from app.utils.audit_archive import count_archived_logs, includes_archived, iter_archived_logs
+from app.utils.audit_rollup import increment_audit_rollup
+import atexit
+import base64
 import datetime
+import itertools
+import json
+import math
+import os
+import queue
 import socket
+import threading
+import time
+
+# Các chế độ ghi nhật ký:
+# - sync: ghi và commit ngay trong request
+# - async: đưa vào hàng đợi, luồng nền ghi theo lô; khi tắt ứng dụng chờ ghi tối đa AUDIT_SHUTDOWN_TIMEOUT giây
+# - async_fsync: như async nhưng khi tắt ứng dụng chờ ghi hết hàng đợi và đẩy WAL của SQLite xuống đĩa
+AUDIT_WRITE_MODES = ('sync', 'async', 'async_fsync')
+
+class AuditWriter:
+    """Ghi nhật ký hệ thống theo lô bằng một luồng nền với hàng đợi giới hạn."""
+    
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config.get('AUDIT_WRITE_MODE', 'sync')
+        if self.mode not in AUDIT_WRITE_MODES:
+            raise ValueError(f"AUDIT_WRITE_MODE không hợp lệ: {self.mode}")
+        
+        self.queue_size = app.config.get('AUDIT_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL_MS', 200) / 1000.0
+        self.put_timeout = app.config.get('AUDIT_QUEUE_PUT_TIMEOUT_MS', 50) / 1000.0
+        self.shutdown_timeout = app.config.get('AUDIT_SHUTDOWN_TIMEOUT', 10)
+        
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'sync_fallbacks': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0
+        }
+        
+        if self.mode != 'sync':
+            atexit.register(self.shutdown)
+    
+    @property
+    def is_async(self):
+        return self.mode != 'sync'
+    
+    def write(self, row):
+        """
+        Ghi một bản ghi nhật ký theo chế độ đã cấu hình.
+        
+        Khi hàng đợi đầy quá AUDIT_QUEUE_PUT_TIMEOUT_MS, bản ghi được ghi đồng bộ
+        để không làm mất nhật ký.
+        """
+        if not self.is_async:
+            self._write_batch([row])
+            return
+        
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['sync_fallbacks'] += 1
+            self._write_batch([row])
+            return
+        
+        with self._lock:
+            self._stats['enqueued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+    
+    def stats(self):
+        """Lấy các chỉ số của bộ ghi nhật ký (độ sâu hàng đợi, số bản ghi đã ghi, ...)."""
+        with self._lock:
+            result = dict(self._stats)
+        result['mode'] = self.mode
+        result['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        result['queue_size'] = self.queue_size
+        return result
+    
+    def flush(self, timeout=None):
+        """Chờ đến khi tất cả bản ghi trong hàng đợi đã được ghi."""
+        if self._queue is None:
+            return True
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    
+    def shutdown(self):
+        """Dừng luồng nền sau khi ghi các bản ghi còn trong hàng đợi."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        
+        timeout = None if self.mode == 'async_fsync' else self.shutdown_timeout
+        self._stopping.set()
+        self._thread.join(timeout)
+        
+        if self.mode == 'async_fsync':
+            self._sync_to_disk()
+        self._thread = None
+    
+    def _ensure_started(self):
+        # Khởi động lại luồng nền sau khi tiến trình được fork (ví dụ worker của gunicorn)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                with self.app.app_context():
+                    self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _collect_batch(self):
+        """Lấy tối đa AUDIT_BATCH_SIZE bản ghi, chờ tối đa AUDIT_FLUSH_INTERVAL_MS kể từ bản ghi đầu tiên."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_batch(self, rows):
+        """Ghi một lô bản ghi bằng một câu lệnh INSERT nhiều dòng và cập nhật bảng thống kê trong cùng giao dịch."""
+        started = time.perf_counter()
+        try:
+            db.session.execute(AuditLog.__table__.insert(), rows)
+            increment_audit_rollup(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            
+            # Ghi lại từng bản ghi để một bản ghi lỗi không làm mất cả lô
+            if len(rows) > 1:
+                return all([self._write_batch([row]) for row in rows])
+            
+            self.app.logger.error(f"Lỗi khi ghi nhật ký: {str(e)}")
+            with self._lock:
+                self._stats['failed'] += len(rows)
+            return False
+        
+        with self._lock:
+            self._stats['written'] += len(rows)
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(rows)
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return True
+    
+    def _sync_to_disk(self):
+        """Đẩy dữ liệu đã commit xuống đĩa (checkpoint WAL với SQLite)."""
+        try:
+            with self.app.app_context():
+                if db.engine.dialect.name == 'sqlite':
+                    db.session.execute(db.text('PRAGMA wal_checkpoint(FULL)'))
+        except Exception as e:
+            self.app.logger.error(f"Lỗi khi đồng bộ nhật ký xuống đĩa: {str(e)}")
+
+def init_audit(app):
+    """
+    Khởi tạo bộ ghi nhật ký hệ thống.
+    
+    Args:
+        app: Flask app
+    """
+    app.extensions['audit_writer'] = AuditWriter(app)
+
+def get_audit_writer():
+    """Lấy bộ ghi nhật ký của ứng dụng hiện tại."""
+    return current_app.extensions['audit_writer']
+
+def _build_audit_row(action, resource, resource_id=None, details=None):
+    """Tạo dữ liệu của một bản ghi nhật ký từ request hiện tại."""
+    # Chuyển đổi action thành enum
+    if isinstance(action, str):
+        action_enum = ActionType[action]
+    else:
+        action_enum = action
+    
+    # Lấy thông tin người dùng
+    user_id = current_user.id if current_user.is_authenticated else None
+    
+    # Lấy địa chỉ IP
+    ip_address = request.remote_addr
+    
+    return {
+        'user_id': user_id,
+        'action': action_enum,
+        'resource': resource,
+        'resource_id': resource_id,
+        'details': details,
+        'ip_address': ip_address,
+        'timestamp': datetime.datetime.utcnow()
+    }
 
 def log_action(action, resource, resource_id=None, details=None):
     """
     Ghi nhật ký hành động của người dùng.
     
+    Tùy theo AUDIT_WRITE_MODE, bản ghi được ghi ngay hoặc đưa vào hàng đợi
+    để luồng nền ghi theo lô. Với các thao tác thay đổi dữ liệu, dùng
+    commit_action để bản ghi được commit cùng thay đổi.
+    
     Args:
         action: Loại hành động (LOGIN, LOGOUT, CREATE, READ, UPDATE, DELETE, FAILED_LOGIN)
         resource: Loại tài nguyên (user, employee, department, etc.)
@@ -15,55 +248,51 @@ def log_action(action, resource, resource_id=None, details=None):
         details: Chi tiết bổ sung về hành động
     """
     try:
-        # Chuyển đổi action thành enum
-        if isinstance(action, str):
-            action_enum = ActionType[action]
-        else:
-            action_enum = action
-        
-        # Lấy thông tin người dùng
-        user_id = current_user.id if current_user.is_authenticated else None
-        
-        # Lấy địa chỉ IP
-        ip_address = request.remote_addr
-        
         # Tạo bản ghi nhật ký
-        audit_log = AuditLog(
-            user_id=user_id,
-            action=action_enum,
-            resource=resource,
-            resource_id=resource_id,
-            details=details,
-            ip_address=ip_address,
-            timestamp=datetime.datetime.utcnow()
-        )
+        audit_log = _build_audit_row(action, resource, resource_id, details)
         
-        # Lưu vào cơ sở dữ liệu
-        db.session.add(audit_log)
-        db.session.commit()
+        # Ghi ngay hoặc đưa vào hàng đợi
+        get_audit_writer().write(audit_log)
         
         return True
     except Exception as e:
         # Ghi lại lỗi nhưng không làm gián đoạn luồng chính
         print(f"Lỗi khi ghi nhật ký: {str(e)}")
-        db.session.rollback()
         return False
 
-def get_audit_logs(filters=None, page=1, per_page=20):
+def commit_action(action, resource, resource_id=None, details=None):
     """
-    Lấy danh sách nhật ký hệ thống với bộ lọc.
+    Thêm bản ghi nhật ký vào phiên hiện tại và commit cùng các thay đổi đang chờ.
+    
+    Thay đổi nghiệp vụ và bản ghi nhật ký nằm trong cùng một giao dịch:
+    hoặc cả hai được lưu, hoặc không có gì được lưu.
     
     Args:
-        filters: Dict chứa các bộ lọc (user_id, action, resource, start_date, end_date)
-        page: Số trang
-        per_page: Số bản ghi trên mỗi trang
-        
-    Returns:
-        Danh sách các bản ghi nhật ký và thông tin phân trang
+        action: Loại hành động (CREATE, UPDATE, DELETE, ...)
+        resource: Loại tài nguyên (user, employee, department, etc.)
+        resource_id: ID của tài nguyên (nếu có)
+        details: Chi tiết bổ sung về hành động
     """
-    query = AuditLog.query
+    try:
+        audit_log = _build_audit_row(action, resource, resource_id, details)
+        db.session.add(AuditLog(**audit_log))
+        increment_audit_rollup([audit_log])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def filter_audit_logs(query, filters=None):
+    """
+    Áp dụng bộ lọc nhật ký lên truy vấn.
     
-    # Áp dụng bộ lọc
+    Args:
+        query: Truy vấn trên AuditLog
+        filters: Dict chứa các bộ lọc (user_id, action, resource, resource_id, start_date, end_date)
+    
+    Returns:
+        Truy vấn đã lọc
+    """
     if filters:
         if 'user_id' in filters and filters['user_id']:
             query = query.filter(AuditLog.user_id == filters['user_id'])
@@ -81,23 +310,174 @@ def get_audit_logs(filters=None, page=1, per_page=20):
         if 'resource' in filters and filters['resource']:
             query = query.filter(AuditLog.resource == filters['resource'])
             
+        if 'resource_id' in filters and filters['resource_id'] is not None:
+            query = query.filter(AuditLog.resource_id == filters['resource_id'])
+            
         if 'start_date' in filters and filters['start_date']:
             query = query.filter(AuditLog.timestamp >= filters['start_date'])
             
         if 'end_date' in filters and filters['end_date']:
             query = query.filter(AuditLog.timestamp <= filters['end_date'])
     
+    return query
+
+def _audit_log_query(filters=None):
+    # Tải kèm người dùng bằng JOIN để không phải truy vấn riêng cho từng bản ghi
+    query = AuditLog.query.options(
+        db.joinedload(AuditLog.user).options(db.load_only(User.username), db.lazyload(User.roles))
+    )
+    return filter_audit_logs(query, filters)
+
+def get_audit_logs(filters=None, page=1, per_page=20):
+    """
+    Lấy danh sách nhật ký hệ thống với bộ lọc.
+    
+    Nếu start_date/end_date trước mốc lưu trữ, kết quả gồm cả nhật ký đã lưu trữ.
+    
+    Args:
+        filters: Dict chứa các bộ lọc (user_id, action, resource, resource_id, start_date, end_date)
+        page: Số trang
+        per_page: Số bản ghi trên mỗi trang
+        
+    Returns:
+        Danh sách các bản ghi nhật ký và thông tin phân trang
+    """
+    # Áp dụng bộ lọc
+    query = _audit_log_query(filters)
+    
     # Sắp xếp theo thời gian giảm dần (mới nhất trước)
     query = query.order_by(AuditLog.timestamp.desc())
     
     # Phân trang
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    return pagination.items, {
-        'total': pagination.total,
-        'pages': pagination.pages,
+    if not includes_archived(filters):
+        return pagination.items, {
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'current_page': page,
+            'per_page': per_page,
+            'has_next': pagination.has_next,
+            'has_prev': pagination.has_prev
+        }
+    
+    # Nhật ký đã lưu trữ đều cũ hơn nhật ký trong bảng nên nối tiếp sau các trang của bảng
+    logs = pagination.items
+    if len(logs) < pagination.per_page:
+        skip = max(0, (pagination.page - 1) * pagination.per_page - pagination.total)
+        logs = logs + list(itertools.islice(iter_archived_logs(filters), skip, skip + pagination.per_page - len(logs)))
+    
+    total = pagination.total + count_archived_logs(filters)
+    pages = math.ceil(total / pagination.per_page) if total else 0
+    
+    return logs, {
+        'total': total,
+        'pages': pages,
         'current_page': page,
         'per_page': per_page,
-        'has_next': pagination.has_next,
-        'has_prev': pagination.has_prev
+        'has_next': pagination.page < pages,
+        'has_prev': pagination.page > 1
+    }
+
+def get_audit_logs_after(filters=None, cursor=None, per_page=20, include_total=False):
+    """
+    Lấy danh sách nhật ký theo con trỏ (timestamp, id) thay vì OFFSET.
+    
+    Thời gian lấy một trang không phụ thuộc vào vị trí của trang. Khi khoảng thời gian
+    của bộ lọc chạm tới dữ liệu đã lưu trữ, các trang tiếp tục đọc từ tệp lưu trữ.
+    
+    Args:
+        filters: Dict chứa các bộ lọc (user_id, action, resource, resource_id, start_date, end_date)
+        cursor: Con trỏ next_cursor của trang trước; None để lấy trang đầu tiên
+        per_page: Số bản ghi trên mỗi trang
+        include_total: Đếm tổng số bản ghi khớp bộ lọc (tốn một truy vấn COUNT)
+    
+    Returns:
+        Danh sách các bản ghi nhật ký và thông tin phân trang
+    
+    Raises:
+        ValueError: Nếu con trỏ không hợp lệ
+    """
+    query = _audit_log_query(filters)
+    position = decode_audit_cursor(cursor) if cursor else None
+    
+    if position:
+        query = query.filter(db.tuple_(AuditLog.timestamp, AuditLog.id) < position)
+    
+    # Lấy thêm một bản ghi để biết còn trang tiếp theo hay không
+    logs = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(per_page + 1).all()
+    
+    # Hết nhật ký trong bảng thì đọc tiếp từ tệp lưu trữ
+    archived = includes_archived(filters)
+    if archived and len(logs) <= per_page:
+        logs += list(itertools.islice(iter_archived_logs(filters, position), per_page + 1 - len(logs)))
+    
+    has_next = len(logs) > per_page
+    logs = logs[:per_page]
+    
+    pagination = {
+        'per_page': per_page,
+        'cursor': cursor,
+        'next_cursor': encode_audit_cursor(logs[-1]) if has_next else None,
+        'has_next': has_next
     }
+    
+    if include_total:
+        pagination['total'] = filter_audit_logs(db.session.query(db.func.count(AuditLog.id)), filters).scalar()
+        if archived:
+            pagination['total'] += count_archived_logs(filters)
+    
+    return logs, pagination
+
+def encode_audit_cursor(log):
+    """Mã hóa vị trí (timestamp, id) của bản ghi nhật ký thành con trỏ dạng chuỗi."""
+    payload = json.dumps([log.timestamp.isoformat(), log.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_audit_cursor(cursor):
+    """
+    Giải mã con trỏ thành (timestamp, id).
+    
+    Raises:
+        ValueError: Nếu con trỏ không hợp lệ
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, log_id = json.loads(payload)
+        return datetime.datetime.fromisoformat(timestamp), int(log_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+
+# Các cột khi xuất nhật ký
+AUDIT_EXPORT_COLUMNS = ('id', 'timestamp', 'user_id', 'username', 'action', 'resource',
+                        'resource_id', 'details', 'ip_address')
+
+def iter_audit_log_rows(filters=None, chunk_size=1000):
+    """
+    Duyệt tất cả nhật ký khớp bộ lọc, mới nhất trước, dưới dạng dict.
+    
+    Kết quả được đọc theo từng lô chunk_size bằng con trỏ phía máy chủ nên bộ nhớ
+    không phụ thuộc số lượng bản ghi; nhật ký đã lưu trữ được đọc tiếp sau nếu
+    khoảng thời gian của bộ lọc chạm tới.
+    
+    Args:
+        filters: Dict chứa các bộ lọc (user_id, action, resource, resource_id, start_date, end_date)
+        chunk_size: Số dòng đọc mỗi lần từ cơ sở dữ liệu
+    
+    Yields:
+        Dict với các khóa trong AUDIT_EXPORT_COLUMNS
+    """
+    statement = db.select(
+        AuditLog.id, AuditLog.timestamp, AuditLog.user_id, User.username, AuditLog.action,
+        AuditLog.resource, AuditLog.resource_id, AuditLog.details, AuditLog.ip_address
+    ).outerjoin(User, AuditLog.user_id == User.id)
+    statement = filter_audit_logs(statement, filters).order_by(
+        AuditLog.timestamp.desc(), AuditLog.id.desc()
+    ).execution_options(yield_per=chunk_size)
+    
+    for row in db.session.execute(statement):
+        yield row._asdict()
+    
+    if includes_archived(filters):
+        for log in iter_archived_logs(filters):
+            yield log._asdict()
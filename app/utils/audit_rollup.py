@@ -0,0 +1,143 @@
+import itertools
+from collections import Counter
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.database_schema import AuditLog, AuditLogRollup, db
+from app.utils.audit_archive import iter_archived_logs
+
+_ROLLUP_KEYS = ('bucket', 'action', 'resource', 'user_id')
+
+def hour_bucket(timestamp):
+    """Làm tròn thời điểm xuống đầu giờ."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def increment_audit_rollup(rows):
+    """
+    Cộng dồn các bản ghi nhật ký vào bảng thống kê theo giờ trong phiên hiện tại.
+    
+    Không commit: được gọi trong cùng giao dịch với câu lệnh ghi nhật ký để
+    bảng thống kê luôn khớp với audit_logs.
+    
+    Args:
+        rows: Danh sách dict bản ghi nhật ký (user_id, action, resource, timestamp, ...)
+    """
+    counts = Counter(
+        (hour_bucket(row['timestamp']), row['action'], row['resource'], row['user_id'])
+        for row in rows if row['user_id'] is not None
+    )
+    if not counts:
+        return
+    
+    values = [dict(zip(_ROLLUP_KEYS, key), count=count) for key, count in counts.items()]
+    table = AuditLogRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        statement = insert.on_conflict_do_update(
+            index_elements=list(_ROLLUP_KEYS),
+            set_={'count': table.c.count + insert.excluded.count}
+        )
+        db.session.execute(statement, values)
+        return
+    
+    # Các cơ sở dữ liệu khác: cập nhật, nếu chưa có dòng thì thêm mới
+    for value in values:
+        updated = db.session.execute(
+            table.update()
+            .where(*(table.c[key] == value[key] for key in _ROLLUP_KEYS))
+            .values(count=table.c.count + value['count'])
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert(), value)
+
+def rebuild_audit_rollup():
+    """
+    Tính lại toàn bộ bảng thống kê từ audit_logs bằng một câu lệnh INSERT ... SELECT,
+    cộng thêm các nhật ký đã lưu trữ.
+    
+    Returns:
+        Số dòng thống kê sau khi tính lại
+    """
+    table = AuditLogRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect == 'sqlite':
+        # Cùng định dạng lưu DateTime của SQLAlchemy để khóa chính khớp với các dòng được cộng dồn
+        bucket = db.func.strftime('%Y-%m-%d %H:00:00.000000', AuditLog.timestamp)
+    else:
+        bucket = db.func.date_trunc('hour', AuditLog.timestamp)
+    
+    # Chặn cộng dồn đồng thời cho đến khi commit để không đếm trùng hoặc bỏ sót
+    if dialect == 'postgresql':
+        db.session.execute(db.text('LOCK TABLE audit_log_rollups IN EXCLUSIVE MODE'))
+    
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        list(_ROLLUP_KEYS) + ['count'],
+        db.select(bucket, AuditLog.action, AuditLog.resource, AuditLog.user_id, db.func.count(AuditLog.id))
+        .where(AuditLog.user_id.isnot(None))
+        .group_by(bucket, AuditLog.action, AuditLog.resource, AuditLog.user_id)
+    ))
+    
+    # Cộng thêm các nhật ký đã chuyển sang tệp lưu trữ
+    archived = iter_archived_logs()
+    while True:
+        rows = [log._asdict() for log in itertools.islice(archived, 10000)]
+        if not rows:
+            break
+        increment_audit_rollup(rows)
+    
+    db.session.commit()
+    
+    return db.session.query(db.func.count()).select_from(table).scalar()
+
+def ensure_audit_rollup():
+    """
+    Tính lại bảng thống kê nếu thiếu nhật ký so với audit_logs (ví dụ bảng vừa được tạo
+    hoặc nhật ký được thêm trực tiếp trong cơ sở dữ liệu).
+    
+    Bảng thống kê còn chứa các nhật ký đã lưu trữ nên tổng của nó chỉ có thể lớn hơn
+    hoặc bằng số nhật ký trong audit_logs.
+    
+    Returns:
+        True nếu bảng thống kê vừa được tính lại
+    """
+    counted = db.session.query(db.func.coalesce(db.func.sum(AuditLogRollup.count), 0)).scalar()
+    logged = db.session.query(db.func.count(AuditLog.id)).filter(AuditLog.user_id.isnot(None)).scalar()
+    if counted >= logged:
+        return False
+    
+    rebuild_audit_rollup()
+    return True
+
+def get_audit_statistics(start_date=None, end_date=None):
+    """
+    Lấy thống kê nhật ký từ bảng thống kê theo giờ.
+    
+    Args:
+        start_date: Thời điểm bắt đầu (làm tròn xuống đầu giờ)
+        end_date: Thời điểm kết thúc (tính cả giờ chứa thời điểm này)
+    
+    Returns:
+        Dict gồm total_logs, action_stats, resource_stats và user_stats (top 10)
+    """
+    total = db.func.sum(AuditLogRollup.count)
+    
+    def windowed(query):
+        if start_date is not None:
+            query = query.filter(AuditLogRollup.bucket >= hour_bucket(start_date))
+        if end_date is not None:
+            query = query.filter(AuditLogRollup.bucket <= end_date)
+        return query
+    
+    return {
+        'total_logs': windowed(db.session.query(total)).scalar() or 0,
+        'action_stats': windowed(db.session.query(AuditLogRollup.action, total))
+            .group_by(AuditLogRollup.action).all(),
+        'resource_stats': windowed(db.session.query(AuditLogRollup.resource, total))
+            .group_by(AuditLogRollup.resource).all(),
+        'user_stats': windowed(db.session.query(AuditLogRollup.user_id, total))
+            .group_by(AuditLogRollup.user_id)
+            .order_by(total.desc(), AuditLogRollup.user_id)
+            .limit(10).all()
+    }
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """Bộ nhớ đệm LRU có thời gian sống (TTL), an toàn khi dùng đa luồng."""
+    
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def configure(self, maxsize=None, ttl=None):
+        """Thay đổi kích thước tối đa và thời gian sống của bộ nhớ đệm."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+    
+    def get(self, key, default=None):
+        """Lấy giá trị còn hạn theo khóa, trả về default nếu không có hoặc đã hết hạn."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Lưu giá trị, loại bỏ các khóa ít dùng nhất khi vượt quá kích thước."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            self._evict()
+    
+    def pop(self, key):
+        """Xóa một khóa khỏi bộ nhớ đệm."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """Xóa toàn bộ bộ nhớ đệm."""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
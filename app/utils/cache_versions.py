@@ -0,0 +1,53 @@
+from sqlalchemy.exc import IntegrityError
+from app.models.database_schema import CacheVersion, db
+
+def read_cache_version(name):
+    """
+    Đọc phiên bản hiện tại của một dòng trong bảng cache_versions.
+    
+    Args:
+        name: Tên dòng phiên bản
+    
+    Returns:
+        Phiên bản (0 nếu chưa có)
+    """
+    table = CacheVersion.__table__
+    version = db.session.execute(
+        db.select(table.c.version).where(table.c.name == name)
+    ).scalar()
+    return version or 0
+
+def ensure_cache_version(name):
+    """
+    Tạo dòng phiên bản nếu chưa có (ví dụ cơ sở dữ liệu tạo bằng create_all).
+    
+    Args:
+        name: Tên dòng phiên bản
+    """
+    if db.session.get(CacheVersion, name) is None:
+        db.session.add(CacheVersion(name=name, version=1))
+        db.session.commit()
+
+def bump_cache_version(session, name):
+    """
+    Tăng phiên bản trong giao dịch hiện tại của session, thêm dòng nếu chưa có.
+    
+    Args:
+        session: Session SQLAlchemy đang trong giao dịch
+        name: Tên dòng phiên bản
+    """
+    table = CacheVersion.__table__
+    result = session.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount:
+        return
+    
+    # Chưa có dòng phiên bản: tiến trình khác có thể thêm cùng lúc, khi đó cập nhật lại
+    try:
+        with session.begin_nested():
+            session.execute(table.insert().values(name=name, version=1))
+    except IntegrityError:
+        session.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        )
@@ -0,0 +1,138 @@
+import threading
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app.models.database_schema import db
+
+# Bộ đếm sự kiện của pool kết nối, theo engine
+_pool_counters = weakref.WeakKeyDictionary()
+_pool_lock = threading.Lock()
+
+def engine_options(config):
+    """
+    Tạo SQLALCHEMY_ENGINE_OPTIONS từ các cấu hình DB_* theo loại cơ sở dữ liệu.
+    
+    Args:
+        config: Cấu hình của Flask app
+    
+    Returns:
+        Dict tham số cho create_engine
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    
+    if url.get_backend_name() == 'sqlite':
+        # Thời gian chờ khi cơ sở dữ liệu đang bị khóa ghi, thay vì báo lỗi ngay
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+        if _is_memory_database(url):
+            # Cơ sở dữ liệu trong bộ nhớ dùng một kết nối duy nhất (StaticPool)
+            return options
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT']
+        )
+        return options
+    
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE']
+    )
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+def init_engine(app):
+    """
+    Áp dụng PRAGMA cho SQLite trên mỗi kết nối mới và đăng ký bộ đếm của pool kết nối.
+    
+    Args:
+        app: Flask app (đã gọi db.init_app)
+    """
+    with app.app_context():
+        engine = db.engine
+    
+    if engine.dialect.name == 'sqlite':
+        pragmas = sqlite_pragmas(app.config, _is_memory_database(engine.url))
+        
+        @event.listens_for(engine, 'connect')
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+    
+    counters = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidated': 0}
+    with _pool_lock:
+        _pool_counters[engine] = counters
+    
+    def increment(name):
+        with _pool_lock:
+            counters[name] += 1
+    
+    event.listen(engine.pool, 'connect', lambda *args: increment('connects'))
+    event.listen(engine.pool, 'checkin', lambda *args: increment('checkins'))
+    event.listen(engine.pool, 'invalidate', lambda *args: increment('invalidated'))
+    event.listen(engine.pool, 'checkout', lambda *args: increment('checkouts'))
+
+def begin_write_transaction(session):
+    """
+    Mở giao dịch ghi thật trên kết nối SQLite của session nếu chưa có.
+    
+    pysqlite chỉ tự mở giao dịch trước câu lệnh ghi đầu tiên, nên SAVEPOINT mở trước
+    đó (begin_nested) trở thành giao dịch ngoài cùng và RELEASE sẽ commit luôn.
+    BEGIN IMMEDIATE lấy khóa ghi ngay từ đầu, nên tiến trình khác đang ghi chỉ làm
+    câu lệnh này chờ theo busy_timeout thay vì báo "database is locked" giữa chừng.
+    Các cơ sở dữ liệu khác đã mở giao dịch từ câu lệnh đầu tiên nên không cần làm gì.
+    
+    Args:
+        session: Session SQLAlchemy sắp ghi dữ liệu
+    """
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def sqlite_pragmas(config, memory=False):
+    """
+    Danh sách PRAGMA áp dụng cho mỗi kết nối SQLite.
+    
+    WAL cho phép đọc đồng thời trong khi ghi; synchronous=NORMAL là đủ an toàn với WAL
+    và giảm số lần fsync; mmap_size cho phép đọc tệp cơ sở dữ liệu qua bộ nhớ ánh xạ.
+    """
+    pragmas = []
+    if not memory and config['SQLITE_JOURNAL_MODE']:
+        pragmas.append(('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    if config['SQLITE_SYNCHRONOUS']:
+        pragmas.append(('synchronous', config['SQLITE_SYNCHRONOUS']))
+    if not memory and config['SQLITE_MMAP_SIZE']:
+        pragmas.append(('mmap_size', int(config['SQLITE_MMAP_SIZE'])))
+    return pragmas
+
+def pool_stats():
+    """
+    Lấy các chỉ số của pool kết nối của engine hiện tại.
+    
+    Returns:
+        Dict gồm loại pool, trạng thái (kích thước, số kết nối đang dùng, ...) và các bộ đếm sự kiện
+    """
+    engine = db.engine
+    pool = engine.pool
+    result = {'dialect': engine.dialect.name, 'pool': type(pool).__name__, 'status': pool.status()}
+    
+    # Chỉ QueuePool có các chỉ số kích thước
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            result[name] = method()
+    
+    with _pool_lock:
+        result.update(_pool_counters.get(engine, {}))
+    return result
+
+def _is_memory_database(url):
+    return url.database in (None, '', ':memory:') or 'mode=memory' in str(url)
@@ -0,0 +1,178 @@
+import threading
+import time
+from sqlalchemy.orm import Session
+from app.models.database_schema import Department, Employee, db
+from app.utils.cache import TTLCache
+from app.utils.cache_versions import bump_cache_version, read_cache_version
+
+# Thống kê phòng ban đã tính, dùng chung giữa các request
+_statistics_cache = TTLCache(maxsize=1)
+
+# Dòng trong bảng cache_versions, tăng mỗi khi dữ liệu của thống kê thay đổi
+STATISTICS_VERSION_NAME = 'department_statistics'
+
+# Phiên bản mà thống kê trong bộ nhớ đệm của tiến trình này ứng với
+_statistics_version = None
+_statistics_checked_at = 0.0
+_statistics_check_interval = 5
+_statistics_lock = threading.Lock()
+
+# Các cột của nhân viên ảnh hưởng tới thống kê phòng ban
+_TRACKED_EMPLOYEE_COLUMNS = ('salary', 'department_id', 'full_name')
+
+def init_department_stats(app):
+    """
+    Cấu hình bộ nhớ đệm thống kê phòng ban.
+    
+    Args:
+        app: Flask app
+    """
+    global _statistics_version, _statistics_check_interval
+    
+    _statistics_cache.configure(ttl=app.config.get('DEPARTMENT_STATS_TTL', 300))
+    _statistics_cache.clear()
+    with _statistics_lock:
+        _statistics_version = None
+        _statistics_check_interval = app.config.get('DEPARTMENT_STATS_CHECK_INTERVAL', 5)
+
+def compute_department_statistics():
+    """
+    Tính thống kê lương của từng phòng ban bằng một câu truy vấn gom nhóm.
+    
+    Trung vị được tính bằng hàm cửa sổ: trong mỗi phòng ban, các mức lương được đánh số
+    theo thứ tự tăng dần và trung vị là trung bình của một hoặc hai giá trị ở giữa.
+    
+    Returns:
+        Danh sách dict thống kê theo phòng ban, sắp xếp theo ID
+    """
+    ranked = db.select(
+        Employee.department_id,
+        Employee.salary,
+        db.func.row_number().over(partition_by=Employee.department_id, order_by=Employee.salary).label('position'),
+        db.func.count().over(partition_by=Employee.department_id).label('size')
+    ).subquery()
+    
+    middle = ranked.c.position.between(ranked.c.size / 2.0, ranked.c.size / 2.0 + 1)
+    aggregates = db.select(
+        ranked.c.department_id,
+        db.func.count().label('employee_count'),
+        db.func.sum(ranked.c.salary).label('total_salary'),
+        db.func.avg(ranked.c.salary).label('average_salary'),
+        db.func.min(ranked.c.salary).label('min_salary'),
+        db.func.max(ranked.c.salary).label('max_salary'),
+        db.func.avg(db.case((middle, ranked.c.salary))).label('median_salary')
+    ).group_by(ranked.c.department_id).subquery()
+    
+    manager = db.aliased(Employee)
+    rows = db.session.query(
+        Department.id,
+        Department.name,
+        manager.full_name,
+        aggregates
+    ).outerjoin(manager, Department.manager_id == manager.id) \
+        .outerjoin(aggregates, aggregates.c.department_id == Department.id) \
+        .order_by(Department.id)
+    
+    return [{
+        'id': row.id,
+        'name': row.name,
+        'manager_name': row.full_name,
+        'employee_count': row.employee_count or 0,
+        'total_salary': row.total_salary or 0,
+        'average_salary': row.average_salary or 0,
+        'min_salary': row.min_salary,
+        'max_salary': row.max_salary,
+        'median_salary': row.median_salary
+    } for row in rows]
+
+def get_department_statistics():
+    """
+    Lấy thống kê phòng ban từ bộ nhớ đệm, tính lại nếu chưa có hoặc đã hết hạn.
+    
+    Bộ nhớ đệm được hủy sau mỗi giao dịch thay đổi nhân viên hoặc phòng ban; thay đổi
+    từ tiến trình khác được phát hiện qua phiên bản trong bảng cache_versions.
+    
+    Returns:
+        Danh sách dict thống kê theo phòng ban
+    """
+    _check_statistics_version()
+    statistics = _statistics_cache.get('all')
+    if statistics is None:
+        statistics = compute_department_statistics()
+        _statistics_cache.set('all', statistics)
+    return statistics
+
+def invalidate_department_statistics():
+    """Hủy thống kê phòng ban trong bộ nhớ đệm."""
+    _statistics_cache.clear()
+
+def _check_statistics_version():
+    """
+    Hủy thống kê trong bộ nhớ đệm nếu tiến trình khác đã thay đổi nhân viên hoặc phòng ban.
+    
+    Phiên bản trong cơ sở dữ liệu được kiểm tra tối đa mỗi DEPARTMENT_STATS_CHECK_INTERVAL
+    giây (một truy vấn theo khóa chính).
+    """
+    global _statistics_version, _statistics_checked_at
+    
+    now = time.monotonic()
+    with _statistics_lock:
+        if _statistics_version is not None and now - _statistics_checked_at < _statistics_check_interval:
+            return
+    
+    version = read_cache_version(STATISTICS_VERSION_NAME)
+    with _statistics_lock:
+        changed = version != _statistics_version
+        _statistics_version, _statistics_checked_at = version, now
+    
+    if changed:
+        invalidate_department_statistics()
+
+def _affects_statistics(instance):
+    if isinstance(instance, Department):
+        return True
+    if not isinstance(instance, Employee):
+        return False
+    
+    state = db.inspect(instance)
+    return any(state.attrs[key].history.has_changes() for key in _TRACKED_EMPLOYEE_COLUMNS)
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_changes(session, flush_context, instances):
+    # Ghi nhận trước khi flush vì lịch sử thay đổi của thuộc tính bị xóa sau khi flush
+    changed = any(isinstance(instance, (Department, Employee)) for instance in session.new) \
+        or any(isinstance(instance, (Department, Employee)) for instance in session.deleted) \
+        or any(_affects_statistics(instance) for instance in session.dirty)
+    if changed:
+        session.info['department_statistics_stale'] = True
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_changes(orm_execute_state):
+    # Câu lệnh INSERT/UPDATE/DELETE hàng loạt không đi qua flush
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+            mapper.class_ in (Department, Employee) for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['department_statistics_stale'] = True
+
+@db.event.listens_for(Session, 'before_commit')
+def _bump_version_before_commit(session):
+    # Chỉ tăng phiên bản khi commit giao dịch ngoài cùng (before_commit cũng chạy khi RELEASE SAVEPOINT)
+    if session.in_nested_transaction():
+        return
+    
+    session.flush()
+    if session.info.get('department_statistics_stale'):
+        bump_cache_version(session, STATISTICS_VERSION_NAME)
+
+@db.event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    global _statistics_version
+    
+    if session.info.pop('department_statistics_stale', False):
+        invalidate_department_statistics()
+        # Đọc lại phiên bản vừa tăng ở lần lấy thống kê tiếp theo
+        with _statistics_lock:
+            _statistics_version = None
+
+@db.event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_changes(session, previous_transaction):
+    session.info.pop('department_statistics_stale', None)
@@ -0,0 +1,194 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from werkzeug.security import check_password_hash
+
+# bcrypt chỉ dùng 72 byte đầu của mật khẩu; bcrypt >= 5 báo lỗi thay vì tự cắt
+_BCRYPT_MAX_BYTES = 72
+
+class BcryptHasher:
+    """Băm mật khẩu bằng bcrypt với số vòng BCRYPT_LOG_ROUNDS."""
+    
+    name = 'bcrypt'
+    
+    def __init__(self, rounds=12):
+        self.rounds = rounds
+    
+    def identify(self, password_hash):
+        return password_hash.startswith(('$2a$', '$2b$', '$2y$'))
+    
+    def hash(self, password):
+        return bcrypt.hashpw(self._encode(password), bcrypt.gensalt(self.rounds)).decode('ascii')
+    
+    def verify(self, password_hash, password):
+        try:
+            return bcrypt.checkpw(self._encode(password), password_hash.encode('ascii'))
+        except ValueError:
+            return False
+    
+    def needs_rehash(self, password_hash):
+        # Định dạng: $2b$<số vòng>$<salt+hash>
+        return int(password_hash.split('$')[2]) != self.rounds
+    
+    def _encode(self, password):
+        return password.encode('utf-8')[:_BCRYPT_MAX_BYTES]
+
+class Argon2Hasher:
+    """Băm mật khẩu bằng Argon2id (cần gói argon2-cffi)."""
+    
+    name = 'argon2'
+    
+    def __init__(self, time_cost=3, memory_cost=65536, parallelism=1):
+        try:
+            from argon2 import PasswordHasher
+        except ImportError:
+            raise RuntimeError('PASSWORD_HASHER=argon2 yêu cầu cài đặt gói argon2-cffi')
+        
+        self._hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    
+    def identify(self, password_hash):
+        return password_hash.startswith('$argon2')
+    
+    def hash(self, password):
+        return self._hasher.hash(password)
+    
+    def verify(self, password_hash, password):
+        from argon2.exceptions import InvalidHashError, VerificationError
+        try:
+            return self._hasher.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    def needs_rehash(self, password_hash):
+        return self._hasher.check_needs_rehash(password_hash)
+
+class WerkzeugHasher:
+    """Chỉ kiểm tra các mật khẩu cũ tạo bằng werkzeug.security (scrypt, pbkdf2)."""
+    
+    name = 'werkzeug'
+    
+    def identify(self, password_hash):
+        return password_hash.startswith(('scrypt:', 'pbkdf2:'))
+    
+    def verify(self, password_hash, password):
+        return check_password_hash(password_hash, password)
+
+class PasswordHasher:
+    """
+    Băm và kiểm tra mật khẩu trong một pool luồng có giới hạn.
+    
+    bcrypt và argon2 nhả GIL khi băm nên các luồng trong pool chạy song song trên
+    nhiều lõi, còn số luồng giới hạn lượng CPU mà một đợt đăng nhập có thể chiếm.
+    """
+    
+    def __init__(self, hasher, workers=None):
+        self.hasher = hasher
+        self.workers = workers or os.cpu_count() or 1
+        self._legacy = [WerkzeugHasher()]
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+    
+    def hash(self, password):
+        """Băm mật khẩu bằng thuật toán hiện tại."""
+        return self._executor.submit(self.hasher.hash, password).result()
+    
+    def verify(self, password_hash, password):
+        """
+        Kiểm tra mật khẩu.
+        
+        Returns:
+            (hợp lệ, mã băm mới) - mã băm mới khác None khi mật khẩu đúng nhưng được băm
+            bằng thuật toán hoặc tham số cũ, cần lưu lại thay cho mã băm hiện tại
+        """
+        if not password_hash or password is None:
+            return False, None
+        
+        hasher = self._hasher_for(password_hash)
+        if hasher is None:
+            return False, None
+        
+        if not self._executor.submit(hasher.verify, password_hash, password).result():
+            return False, None
+        
+        if hasher is not self.hasher or self.hasher.needs_rehash(password_hash):
+            return True, self.hash(password)
+        return True, None
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+    
+    def _hasher_for(self, password_hash):
+        for hasher in [self.hasher, BcryptHasher()] + self._legacy:
+            if hasher.identify(password_hash):
+                return hasher
+        return None
+
+_password_hasher = None
+_hasher_lock = threading.Lock()
+
+def create_hasher(config):
+    """
+    Tạo bộ băm mật khẩu theo PASSWORD_HASHER (bcrypt hoặc argon2).
+    
+    Args:
+        config: Cấu hình của Flask app
+    """
+    name = config.get('PASSWORD_HASHER', 'bcrypt')
+    if name == 'bcrypt':
+        return BcryptHasher(config.get('BCRYPT_LOG_ROUNDS', 12))
+    if name == 'argon2':
+        return Argon2Hasher(
+            time_cost=config.get('ARGON2_TIME_COST', 3),
+            memory_cost=config.get('ARGON2_MEMORY_COST', 65536),
+            parallelism=config.get('ARGON2_PARALLELISM', 1)
+        )
+    raise ValueError(f'PASSWORD_HASHER không hợp lệ: {name}')
+
+def init_password_hasher(app):
+    """
+    Cấu hình bộ băm mật khẩu dùng chung.
+    
+    Args:
+        app: Flask app
+    """
+    global _password_hasher
+    
+    hasher = PasswordHasher(create_hasher(app.config), app.config.get('PASSWORD_HASH_WORKERS'))
+    with _hasher_lock:
+        previous, _password_hasher = _password_hasher, hasher
+    if previous is not None:
+        previous.shutdown()
+
+def get_password_hasher():
+    """Lấy bộ băm mật khẩu dùng chung (mặc định bcrypt 12 vòng nếu chưa cấu hình)."""
+    global _password_hasher
+    
+    with _hasher_lock:
+        if _password_hasher is None:
+            _password_hasher = PasswordHasher(BcryptHasher())
+        return _password_hasher
+
+def hash_password(password):
+    """
+    Băm mật khẩu bằng thuật toán và tham số đang được cấu hình.
+    
+    Args:
+        password: Mật khẩu dạng văn bản
+    
+    Returns:
+        Chuỗi mã băm
+    """
+    return get_password_hasher().hash(password)
+
+def verify_password(password_hash, password):
+    """
+    Kiểm tra mật khẩu với mã băm đã lưu.
+    
+    Args:
+        password_hash: Mã băm đã lưu
+        password: Mật khẩu cần kiểm tra
+    
+    Returns:
+        (hợp lệ, mã băm mới hoặc None) - xem PasswordHasher.verify
+    """
+    return get_password_hasher().verify(password_hash, password)
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from flask import g, has_app_context
+from sqlalchemy import event
+from app.models.database_schema import db
+
+def init_query_counter(app):
+    """
+    Đăng ký bộ đếm số truy vấn SQL cho mỗi request.
+    
+    Args:
+        app: Flask app
+    """
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+    
+    # Trả số truy vấn của request trong header để kiểm thử/giám sát
+    if app.config.get('QUERY_COUNT_HEADER'):
+        @app.after_request
+        def add_query_count_header(response):
+            response.headers['X-Query-Count'] = str(get_query_count())
+            return response
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    """Tăng bộ đếm truy vấn của app context hiện tại."""
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+def get_query_count():
+    """Lấy số truy vấn SQL đã thực thi trong request hiện tại."""
+    return g.get('query_count', 0) if has_app_context() else 0
+
+@contextmanager
+def count_queries():
+    """
+    Đếm số truy vấn SQL thực thi trong một khối lệnh.
+    
+    Ví dụ:
+        with count_queries() as counter:
+            employee_service.get_employees_by_permission(user)
+        assert counter['count'] == 1
+    """
+    counter = {'count': 0}
+    
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+    
+    event.listen(db.engine, 'before_cursor_execute', _listener)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _listener)
@@ -1,14 +1,253 @@
+import hashlib
+import threading
+import time
+from datetime import timezone
 from flask import request, session
 from flask_login import current_user
 from functools import wraps
-from app.models.database_schema import User, Role, Permission, Employee, Department, RoleType
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from app.models.database_schema import User, Role, Permission, Employee, Department, RoleType, db
+from app.utils.cache import TTLCache
+from app.utils.cache_versions import bump_cache_version, read_cache_version
+from app.utils.role_catalog import get_role_catalog, get_user_roles, on_role_catalog_change
+
+# Ảnh chụp quyền đã biên dịch của một người dùng:
+# - roles: tuple các (role_type, frozenset các cặp (resource, action)) theo thứ tự vai trò
+# - permissions: frozenset tất cả các cặp (resource, action) của người dùng
+# - các thông tin phòng ban dùng cho chính sách truy cập
+# - stamp: mã phiên bản của các thông tin trên, được ghi vào JWT để so sánh
+# - tokens_revoked_at: thời điểm thu hồi mọi token của người dùng (giây, như time.time()) hoặc None
+# - compiled_at: thời điểm biên dịch (time.time())
+PermissionSnapshot = namedtuple('PermissionSnapshot', [
+    'user_id',
+    'is_active',
+    'is_admin',
+    'role_types',
+    'roles',
+    'permissions',
+    'employee_id',
+    'department_id',
+    'department_name',
+    'managed_department_ids',
+    'stamp',
+    'tokens_revoked_at',
+    'compiled_at'
+])
+
+# Bộ nhớ đệm ảnh chụp quyền theo user_id, dùng chung giữa các request
+_snapshot_cache = TTLCache()
+
+# Ảnh chụp quyền được biên dịch từ danh mục vai trò và quyền nên bị hủy khi danh mục thay đổi
+on_role_catalog_change(_snapshot_cache.clear)
+
+# Tên dòng phiên bản của dữ liệu trong ảnh chụp quyền (vai trò được gán, trạng thái, phòng ban)
+# trong bảng cache_versions; mọi ảnh chụp của tiến trình bị hủy khi phiên bản thay đổi
+SNAPSHOT_VERSION_NAME = 'permission_snapshots'
+
+_snapshot_version = None
+_snapshot_checked_at = 0.0
+_snapshot_check_interval = 5
+_snapshot_lock = threading.Lock()
+
+def init_rbac(app):
+    """
+    Cấu hình bộ nhớ đệm phân quyền.
+    
+    Args:
+        app: Flask app
+    """
+    global _snapshot_version, _snapshot_check_interval
+    
+    _snapshot_cache.configure(
+        maxsize=app.config.get('RBAC_SNAPSHOT_CACHE_SIZE', 1024),
+        ttl=app.config.get('RBAC_SNAPSHOT_TTL', 60)
+    )
+    _snapshot_cache.clear()
+    
+    with _snapshot_lock:
+        _snapshot_version = None
+        _snapshot_check_interval = app.config.get('RBAC_SNAPSHOT_CHECK_INTERVAL', 5)
+
+def compile_permission_snapshot(user):
+    """
+    Biên dịch vai trò, quyền và phạm vi phòng ban của người dùng thành ảnh chụp bất biến.
+    
+    Args:
+        user: Đối tượng User
+    
+    Returns:
+        PermissionSnapshot
+    """
+    # Vai trò và quyền lấy từ danh mục dùng chung, chỉ truy vấn bảng user_roles
+    roles = tuple((role.role_type, role.permissions) for role in get_user_roles(user.id))
+    
+    employee = user.employee
+    scope = dict(
+        employee_id=employee.id if employee else None,
+        department_id=employee.department_id if employee else None,
+        department_name=employee.department.name if employee and employee.department else None,
+        managed_department_ids=frozenset(dept.id for dept in employee.managed_departments) if employee else frozenset()
+    )
+    
+    return PermissionSnapshot(
+        user_id=user.id,
+        is_active=bool(user.is_active),
+        is_admin=any(role_type == RoleType.ADMIN for role_type, _ in roles),
+        role_types=frozenset(role_type for role_type, _ in roles),
+        roles=roles,
+        permissions=frozenset().union(*(permissions for _, permissions in roles)),
+        stamp=_permission_stamp(user.is_active, roles, scope),
+        tokens_revoked_at=user.tokens_revoked_at.replace(tzinfo=timezone.utc).timestamp() if user.tokens_revoked_at else None,
+        compiled_at=time.time(),
+        **scope
+    )
+
+def _permission_stamp(is_active, roles, scope):
+    """Mã phiên bản của quyền, giống nhau ở mọi tiến trình khi dữ liệu giống nhau."""
+    canonical = repr((
+        bool(is_active),
+        sorted((role_type.value, sorted(permissions)) for role_type, permissions in roles),
+        scope['employee_id'],
+        scope['department_id'],
+        scope['department_name'],
+        sorted(scope['managed_department_ids'])
+    ))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+def get_permission_snapshot(user):
+    """
+    Lấy ảnh chụp quyền của người dùng từ bộ nhớ đệm, biên dịch lại nếu chưa có hoặc đã hết hạn.
+    
+    Args:
+        user: Đối tượng User
+    
+    Returns:
+        PermissionSnapshot
+    """
+    # Kiểm tra phiên bản danh mục và dữ liệu người dùng trước: thay đổi sẽ hủy các ảnh chụp cũ
+    get_role_catalog()
+    _check_snapshot_version()
+    snapshot = _snapshot_cache.get(user.id)
+    if snapshot is None:
+        snapshot = compile_permission_snapshot(user)
+        _snapshot_cache.set(user.id, snapshot)
+    return snapshot
+
+def peek_permission_snapshot(user_id):
+    """Lấy ảnh chụp quyền còn hạn trong bộ nhớ đệm mà không biên dịch, None nếu chưa có."""
+    get_role_catalog()
+    _check_snapshot_version()
+    return _snapshot_cache.get(user_id)
+
+def _check_snapshot_version():
+    """
+    Hủy mọi ảnh chụp quyền nếu tiến trình khác đã thay đổi dữ liệu của chúng.
+    
+    Phiên bản trong cơ sở dữ liệu được kiểm tra tối đa mỗi RBAC_SNAPSHOT_CHECK_INTERVAL
+    giây (một truy vấn theo khóa chính).
+    """
+    global _snapshot_version, _snapshot_checked_at
+    
+    now = time.monotonic()
+    with _snapshot_lock:
+        if _snapshot_version is not None and now - _snapshot_checked_at < _snapshot_check_interval:
+            return
+    
+    version = read_cache_version(SNAPSHOT_VERSION_NAME)
+    with _snapshot_lock:
+        changed = version != _snapshot_version
+        _snapshot_version, _snapshot_checked_at = version, now
+    
+    if changed:
+        _snapshot_cache.clear()
+
+def discard_permission_snapshot(user_id):
+    """Bỏ ảnh chụp quyền của một người dùng (None: tất cả) khỏi bộ nhớ đệm để lần sau biên dịch lại."""
+    _invalidate_snapshot(user_id)
+
+def invalidate_permission_snapshot(user_id=None):
+    """
+    Hủy ảnh chụp quyền trong bộ nhớ đệm.
+    
+    Gọi sau khi thay đổi vai trò, quyền của vai trò, trưởng phòng hoặc phòng ban của nhân viên.
+    Nếu giao dịch hiện tại chưa commit, ảnh chụp được hủy thêm một lần nữa sau khi commit
+    để không giữ lại ảnh chụp biên dịch từ dữ liệu cũ trong lúc chờ commit.
+    
+    Args:
+        user_id: ID người dùng cần hủy; None để hủy tất cả
+    """
+    _invalidate_snapshot(user_id)
+    
+    session = db.session()
+    if session.in_transaction():
+        session.info.setdefault('pending_snapshot_invalidations', set()).add(user_id)
+
+def _invalidate_snapshot(user_id):
+    if user_id is None:
+        _snapshot_cache.clear()
+    else:
+        _snapshot_cache.pop(user_id)
+
+def _snapshot_data_changed(instance):
+    state = db.inspect(instance)
+    if isinstance(instance, User):
+        attributes = ('roles', 'employee', 'employee_id', 'is_active')
+    elif isinstance(instance, Employee):
+        attributes = ('department_id', 'department', 'managed_departments')
+    elif isinstance(instance, Department):
+        attributes = ('name', 'manager_id', 'manager', 'department_manager')
+    else:
+        return False
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_snapshot_changes(session, flush_context, instances):
+    if any(isinstance(instance, Department) for instance in session.new) \
+            or any(isinstance(instance, (User, Employee, Department)) for instance in session.deleted) \
+            or any(_snapshot_data_changed(instance) for instance in session.dirty):
+        session.info['permission_snapshots_stale'] = True
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_snapshot_changes(orm_execute_state):
+    # Câu lệnh UPDATE/DELETE hàng loạt không đi qua flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+            mapper.class_ in (User, Employee, Department) for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['permission_snapshots_stale'] = True
+
+@db.event.listens_for(Session, 'before_commit')
+def _bump_snapshot_version_before_commit(session):
+    # Chỉ tăng phiên bản khi commit giao dịch ngoài cùng (before_commit cũng chạy khi RELEASE SAVEPOINT)
+    if session.in_nested_transaction():
+        return
+    
+    session.flush()
+    if session.info.get('permission_snapshots_stale'):
+        bump_cache_version(session, SNAPSHOT_VERSION_NAME)
+
+@db.event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    global _snapshot_version
+    
+    for user_id in session.info.pop('pending_snapshot_invalidations', ()):
+        _invalidate_snapshot(user_id)
+    
+    # Lần kiểm tra sau đọc lại phiên bản và hủy các ảnh chụp của tiến trình này
+    if session.info.pop('permission_snapshots_stale', False):
+        with _snapshot_lock:
+            _snapshot_version = None
+
+@db.event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_invalidations(session, previous_transaction):
+    session.info.pop('pending_snapshot_invalidations', None)
+    session.info.pop('permission_snapshots_stale', None)
 
 def admin_required(f):
     """Decorator để kiểm tra quyền quản trị viên."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Kiểm tra xem người dùng hiện tại có vai trò admin không
-        if not any(role.role_type == RoleType.ADMIN for role in current_user.roles):
+        if not get_permission_snapshot(current_user).is_admin:
             return {'error': 'Yêu cầu quyền quản trị viên'}, 403
         return f(*args, **kwargs)
     return decorated_function
@@ -22,159 +261,165 @@ def has_permission(user, resource, action, resource_id=None):
         resource: Loại tài nguyên (employee, department, etc.)
         action: Hành động (create, read, update, delete)
         resource_id: ID của tài nguyên cụ thể (nếu có)
-        
+    
     Returns:
         bool: True nếu có quyền, False nếu không
     """
+    if resource_id is None:
+        snapshot = get_permission_snapshot(user)
+        return snapshot.is_admin or (resource, action) in snapshot.permissions
+    
+    return has_permission_many(user, resource, action, [resource_id])[resource_id]
+
+def has_permission_many(user, resource, action, resource_ids, target_departments=None):
+    """
+    Kiểm tra quyền của người dùng trên nhiều tài nguyên cùng lúc.
+    
+    Thông tin của các tài nguyên được lấy bằng tối đa một truy vấn.
+    
+    Args:
+        user: Đối tượng User hiện tại
+        resource: Loại tài nguyên (employee, employee_salary, department, etc.)
+        action: Hành động (create, read, update, delete)
+        resource_ids: Danh sách ID tài nguyên cần kiểm tra
+        target_departments: Dict employee_id -> department_id đã có sẵn (tùy chọn),
+            dùng để bỏ qua truy vấn với tài nguyên employee/employee_salary
+    
+    Returns:
+        dict: resource_id -> True/False
+    """
+    resource_ids = list(dict.fromkeys(resource_ids))
+    if not resource_ids:
+        return {}
+    
+    snapshot = get_permission_snapshot(user)
+    
     # Quản trị viên có tất cả quyền
-    if any(role.role_type == RoleType.ADMIN for role in user.roles):
-        return True
+    if snapshot.is_admin:
+        return {resource_id: True for resource_id in resource_ids}
     
-    # Kiểm tra quyền dựa trên vai trò
-    for role in user.roles:
-        for permission in role.permissions:
-            if permission.resource == resource and permission.action == action:
-                # Nếu không có resource_id, hoặc permission áp dụng cho tất cả tài nguyên
-                if resource_id is None:
-                    return True
-                
-                # Xử lý các trường hợp đặc biệt dựa trên chính sách
-                if resource == 'employee':
-                    return check_employee_permission(user, action, resource_id, role)
-                elif resource == 'employee_salary':
-                    return check_salary_permission(user, resource_id, role)
-                elif resource == 'department':
-                    return check_department_permission(user, action, resource_id, role)
+    # Vai trò đầu tiên có quyền tương ứng quyết định chính sách áp dụng
+    role_type = next((role_type for role_type, permissions in snapshot.roles
+                      if (resource, action) in permissions), None)
     
-    return False
-
-def check_employee_permission(user, action, employee_id, role):
-    """Kiểm tra quyền đối với nhân viên dựa trên chính sách."""
-    # Lấy thông tin nhân viên cần kiểm tra
-    target_employee = Employee.query.get(employee_id)
-    if not target_employee:
-        return False
+    # Chính sách theo từng tài nguyên chỉ áp dụng cho nhân viên, lương và phòng ban
+    if role_type is None or resource not in ('employee', 'employee_salary', 'department'):
+        return {resource_id: False for resource_id in resource_ids}
     
-    # Lấy thông tin nhân viên của người dùng hiện tại
-    if not user.employee:
-        return False
+    # Người dùng phải gắn với một nhân viên
+    if snapshot.employee_id is None:
+        return {resource_id: False for resource_id in resource_ids}
     
-    current_employee = user.employee
+    if resource == 'department':
+        existing_ids = {department_id for department_id, in db.session.query(Department.id).filter(
+            Department.id.in_(resource_ids))}
+        return {
+            department_id: department_id in existing_ids
+            and check_department_permission(snapshot, action, department_id, role_type)
+            for department_id in resource_ids
+        }
     
+    # Lấy phòng ban của các nhân viên cần kiểm tra
+    if target_departments is None:
+        target_departments = dict(db.session.query(Employee.id, Employee.department_id).filter(
+            Employee.id.in_(resource_ids)))
+    
+    result = {}
+    for employee_id in resource_ids:
+        target_department_id = target_departments.get(employee_id)
+        if target_department_id is None:
+            result[employee_id] = False
+        elif resource == 'employee':
+            result[employee_id] = check_employee_permission(snapshot, action, target_department_id, role_type)
+        else:
+            result[employee_id] = check_salary_permission(snapshot, target_department_id, role_type)
+    return result
+
+def check_employee_permission(snapshot, action, target_department_id, role_type):
+    """Kiểm tra quyền đối với một nhân viên thuộc phòng ban target_department_id."""
     # Trường hợp 1: Nhân viên phòng nhân sự
-    if role.role_type == RoleType.HR_EMPLOYEE:
+    if role_type == RoleType.HR_EMPLOYEE:
         # Nhân viên HR có thể xem/sửa thông tin của tất cả nhân viên trừ nhân viên cùng phòng
-        if current_employee.department.name == 'HR':
+        if snapshot.department_name == 'HR':
             # Không được phép nếu nhân viên đích cũng thuộc phòng HR
-            if target_employee.department_id == current_employee.department_id:
+            if target_department_id == snapshot.department_id:
                 # Nhân viên HR chỉ được xem (không sửa) thông tin nhân viên cùng phòng
                 return action == 'read'
             # Được phép với nhân viên khác phòng
             return True
     
     # Trường hợp 2: Trưởng phòng nhân sự
-    elif role.role_type == RoleType.HR_MANAGER:
+    elif role_type == RoleType.HR_MANAGER:
         # Trưởng phòng HR có thể xem/sửa thông tin của tất cả nhân viên
-        if current_employee.department.name == 'HR':
+        if snapshot.department_name == 'HR':
             return True
     
     # Trường hợp 3: Nhân viên phòng kế toán
-    elif role.role_type == RoleType.ACCOUNTING:
+    elif role_type == RoleType.ACCOUNTING:
         # Nhân viên kế toán có thể xem mã số, lương và mã số thuế của tất cả nhân viên
-        if current_employee.department.name == 'Accounting':
+        if snapshot.department_name == 'Accounting':
             # Chỉ cho phép xem, không cho phép sửa
-            if action == 'read':
-                return True
-            return False
+            return action == 'read'
     
     # Trường hợp 4: Trưởng phòng (không phải HR)
-    elif role.role_type == RoleType.MANAGER:
+    elif role_type == RoleType.MANAGER:
         # Trưởng phòng có thể xem thông tin của nhân viên trong phòng mình
-        if current_employee.managed_departments:
-            for dept in current_employee.managed_departments:
-                if target_employee.department_id == dept.id:
-                    # Chỉ cho phép xem, không cho phép sửa
-                    return action == 'read'
+        if target_department_id in snapshot.managed_department_ids:
+            # Chỉ cho phép xem, không cho phép sửa
+            return action == 'read'
     
     # Trường hợp 5: Nhân viên thông thường
-    elif role.role_type == RoleType.EMPLOYEE:
+    elif role_type == RoleType.EMPLOYEE:
         # Nhân viên chỉ được xem thông tin của nhân viên cùng phòng
-        if current_employee.department_id == target_employee.department_id:
+        if snapshot.department_id == target_department_id:
             # Chỉ cho phép xem, không cho phép sửa
             return action == 'read'
     
     return False
 
-def check_salary_permission(user, employee_id, role):
-    """Kiểm tra quyền xem thông tin lương."""
-    # Lấy thông tin nhân viên cần kiểm tra
-    target_employee = Employee.query.get(employee_id)
-    if not target_employee:
-        return False
-    
-    # Lấy thông tin nhân viên của người dùng hiện tại
-    if not user.employee:
-        return False
-    
-    current_employee = user.employee
-    
+def check_salary_permission(snapshot, target_department_id, role_type):
+    """Kiểm tra quyền xem lương của một nhân viên thuộc phòng ban target_department_id."""
     # Trường hợp 1: Quản trị viên có thể xem tất cả
-    if role.role_type == RoleType.ADMIN:
+    if role_type == RoleType.ADMIN:
         return True
     
     # Trường hợp 2: Trưởng phòng nhân sự có thể xem tất cả
-    if role.role_type == RoleType.HR_MANAGER and current_employee.department.name == 'HR':
+    if role_type == RoleType.HR_MANAGER and snapshot.department_name == 'HR':
         return True
     
     # Trường hợp 3: Nhân viên phòng nhân sự có thể xem lương của nhân viên khác phòng
-    if role.role_type == RoleType.HR_EMPLOYEE and current_employee.department.name == 'HR':
+    if role_type == RoleType.HR_EMPLOYEE and snapshot.department_name == 'HR':
         # Không được xem lương của nhân viên cùng phòng
-        if target_employee.department_id != current_employee.department_id:
+        if target_department_id != snapshot.department_id:
             return True
     
     # Trường hợp 4: Nhân viên phòng kế toán có thể xem lương của tất cả nhân viên
-    if role.role_type == RoleType.ACCOUNTING and current_employee.department.name == 'Accounting':
+    if role_type == RoleType.ACCOUNTING and snapshot.department_name == 'Accounting':
         return True
     
     # Trường hợp 5: Trưởng phòng có thể xem lương của nhân viên trong phòng mình
-    if role.role_type == RoleType.MANAGER:
-        if current_employee.managed_departments:
-            for dept in current_employee.managed_departments:
-                if target_employee.department_id == dept.id:
-                    return True
+    if role_type == RoleType.MANAGER:
+        if target_department_id in snapshot.managed_department_ids:
+            return True
     
     return False
 
-def check_department_permission(user, action, department_id, role):
+def check_department_permission(snapshot, action, department_id, role_type):
     """Kiểm tra quyền đối với phòng ban."""
-    # Lấy thông tin phòng ban
-    department = Department.query.get(department_id)
-    if not department:
-        return False
-    
-    # Lấy thông tin nhân viên của người dùng hiện tại
-    if not user.employee:
-        return False
-    
-    current_employee = user.employee
-    
     # Quản trị viên có tất cả quyền
-    if role.role_type == RoleType.ADMIN:
+    if role_type == RoleType.ADMIN:
         return True
     
     # Trưởng phòng có quyền xem thông tin phòng ban của mình
-    if role.role_type == RoleType.MANAGER:
-        if current_employee.managed_departments:
-            for dept in current_employee.managed_departments:
-                if department_id == dept.id:
-                    return action == 'read'
+    if role_type == RoleType.MANAGER and department_id in snapshot.managed_department_ids:
+        return action == 'read'
     
     # Nhân viên có quyền xem thông tin phòng ban của mình
-    if current_employee.department_id == department_id:
+    if snapshot.department_id == department_id:
         return action == 'read'
     
     # Nhân viên HR có quyền xem thông tin tất cả phòng ban
-    if (role.role_type == RoleType.HR_EMPLOYEE or role.role_type == RoleType.HR_MANAGER) and current_employee.department.name == 'HR':
+    if role_type in (RoleType.HR_EMPLOYEE, RoleType.HR_MANAGER) and snapshot.department_name == 'HR':
         return action == 'read'
     
     return False
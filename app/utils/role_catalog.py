@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from sqlalchemy.orm import Session
+from app.models.database_schema import Permission, Role, db, role_permissions, user_roles
+from app.utils.cache_versions import bump_cache_version, ensure_cache_version, read_cache_version
+
+# Một vai trò trong danh mục:
+# - permission_ids: tuple ID các quyền của vai trò, theo thứ tự ID
+# - permissions: frozenset các cặp (resource, action) của vai trò
+RoleEntry = namedtuple('RoleEntry', ['id', 'name', 'description', 'role_type', 'permission_ids', 'permissions'])
+
+PermissionEntry = namedtuple('PermissionEntry', ['id', 'name', 'description', 'resource', 'action'])
+
+# Danh mục vai trò và quyền tại một phiên bản:
+# - roles, permissions: mapping chỉ đọc ID -> RoleEntry / PermissionEntry, theo thứ tự ID
+RoleCatalog = namedtuple('RoleCatalog', ['version', 'roles', 'permissions'])
+
+# Tên dòng phiên bản của danh mục trong bảng cache_versions
+CATALOG_VERSION_NAME = 'role_catalog'
+
+# Danh mục đã tải, dùng chung giữa các request của tiến trình
+_catalog = None
+_checked_at = 0.0
+_check_interval = 5
+_catalog_lock = threading.Lock()
+
+# Các hàm được gọi khi danh mục thay đổi (ví dụ hủy ảnh chụp quyền)
+_change_listeners = []
+
+def init_role_catalog(app):
+    """
+    Cấu hình danh mục vai trò và quyền.
+    
+    Args:
+        app: Flask app
+    """
+    global _catalog, _check_interval
+    
+    with _catalog_lock:
+        _catalog = None
+        _check_interval = app.config.get('ROLE_CATALOG_CHECK_INTERVAL', 5)
+
+def on_role_catalog_change(listener):
+    """
+    Đăng ký hàm được gọi (không tham số) mỗi khi danh mục thay đổi.
+    
+    Args:
+        listener: Hàm cần gọi
+    """
+    _change_listeners.append(listener)
+
+def load_role_catalog():
+    """
+    Tải phiên bản và toàn bộ vai trò, quyền của danh mục.
+    
+    Phiên bản được đọc trước dữ liệu: nếu dữ liệu thay đổi trong lúc tải, lần kiểm tra
+    sau sẽ thấy phiên bản mới và tải lại.
+    
+    Returns:
+        RoleCatalog
+    """
+    version = read_catalog_version()
+    
+    permissions = {
+        permission.id: PermissionEntry(*permission)
+        for permission in db.session.query(
+            Permission.id, Permission.name, Permission.description, Permission.resource, Permission.action
+        ).order_by(Permission.id)
+    }
+    
+    role_permission_ids = {}
+    rows = db.session.query(role_permissions.c.role_id, role_permissions.c.permission_id) \
+        .order_by(role_permissions.c.role_id, role_permissions.c.permission_id)
+    for role_id, permission_id in rows:
+        if permission_id in permissions:
+            role_permission_ids.setdefault(role_id, []).append(permission_id)
+    
+    roles = {}
+    for role in db.session.query(Role.id, Role.name, Role.description, Role.role_type).order_by(Role.id):
+        permission_ids = tuple(role_permission_ids.get(role.id, ()))
+        roles[role.id] = RoleEntry(
+            role.id, role.name, role.description, role.role_type, permission_ids,
+            frozenset((permissions[permission_id].resource, permissions[permission_id].action)
+                      for permission_id in permission_ids)
+        )
+    
+    return RoleCatalog(version, MappingProxyType(roles), MappingProxyType(permissions))
+
+def get_role_catalog():
+    """
+    Lấy danh mục vai trò và quyền đã tải.
+    
+    Phiên bản trong cơ sở dữ liệu được kiểm tra tối đa mỗi ROLE_CATALOG_CHECK_INTERVAL
+    giây (một truy vấn theo khóa chính); danh mục chỉ được tải lại khi phiên bản thay đổi,
+    tức là khi một tiến trình khác đã sửa vai trò hoặc quyền.
+    
+    Returns:
+        RoleCatalog
+    """
+    global _catalog, _checked_at
+    
+    now = time.monotonic()
+    with _catalog_lock:
+        catalog = _catalog
+        due = now - _checked_at >= _check_interval
+    
+    if catalog is not None and not due:
+        return catalog
+    
+    if catalog is not None and read_catalog_version() == catalog.version:
+        with _catalog_lock:
+            _checked_at = now
+        return catalog
+    
+    fresh = load_role_catalog()
+    with _catalog_lock:
+        _catalog, _checked_at = fresh, now
+    
+    if catalog is not None:
+        _notify_change()
+    return fresh
+
+def get_user_roles(user_id):
+    """
+    Lấy các vai trò của người dùng qua danh mục, chỉ truy vấn bảng user_roles.
+    
+    Args:
+        user_id: ID người dùng
+    
+    Returns:
+        Tuple các RoleEntry
+    """
+    roles = get_role_catalog().roles
+    role_ids = db.session.query(user_roles.c.role_id).filter(user_roles.c.user_id == user_id)
+    return tuple(roles[role_id] for role_id, in role_ids if role_id in roles)
+
+def read_catalog_version():
+    """Đọc phiên bản hiện tại của danh mục trong cơ sở dữ liệu (0 nếu chưa có)."""
+    return read_cache_version(CATALOG_VERSION_NAME)
+
+def ensure_catalog_version():
+    """Tạo dòng phiên bản của danh mục nếu chưa có (ví dụ cơ sở dữ liệu tạo bằng create_all)."""
+    ensure_cache_version(CATALOG_VERSION_NAME)
+
+def invalidate_role_catalog():
+    """Hủy danh mục đã tải trong tiến trình này; lần truy cập sau sẽ tải lại."""
+    global _catalog
+    
+    with _catalog_lock:
+        _catalog = None
+    _notify_change()
+
+def _notify_change():
+    for listener in _change_listeners:
+        listener()
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_changes(session, flush_context, instances):
+    # Thêm/bớt quyền của vai trò làm vai trò xuất hiện trong session.dirty
+    if any(isinstance(instance, (Role, Permission)) for instance in session.new) \
+            or any(isinstance(instance, (Role, Permission)) for instance in session.deleted) \
+            or any(isinstance(instance, (Role, Permission)) for instance in session.dirty):
+        session.info['role_catalog_stale'] = True
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_changes(orm_execute_state):
+    # Câu lệnh INSERT/UPDATE/DELETE hàng loạt không đi qua flush
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+            mapper.class_ in (Role, Permission) for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['role_catalog_stale'] = True
+
+@db.event.listens_for(Session, 'before_commit')
+def _bump_version_before_commit(session):
+    # Chỉ tăng phiên bản khi commit giao dịch ngoài cùng (before_commit cũng chạy khi RELEASE SAVEPOINT)
+    if session.in_nested_transaction():
+        return
+    
+    # Flush trước để ghi nhận các thay đổi còn chờ; phiên bản tăng trong cùng giao dịch
+    session.flush()
+    if session.info.get('role_catalog_stale'):
+        bump_cache_version(session, CATALOG_VERSION_NAME)
+
+@db.event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('role_catalog_stale', False):
+        invalidate_role_catalog()
+
+@db.event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_changes(session, previous_transaction):
+    session.info.pop('role_catalog_stale', None)
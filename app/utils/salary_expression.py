@@ -0,0 +1,79 @@
+import ast
+import math
+import operator
+
+# Các phép toán được phép trong biểu thức lương
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv
+}
+
+_MAX_EXPRESSION_LENGTH = 200
+
+# Số nguyên phải nằm trong phạm vi số nguyên 64 bit của cơ sở dữ liệu
+_MAX_INTEGER = 2 ** 63 - 1
+
+def compile_salary_expression(text, salary):
+    """
+    Biên dịch biểu thức điều chỉnh lương (ví dụ "salary * 1.05 + 200") thành biểu thức SQL.
+    
+    Chỉ cho phép số, biến salary, các phép + - * / và dấu ngoặc; biểu thức không
+    bao giờ được thực thi bằng Python.
+    
+    Args:
+        text: Chuỗi biểu thức
+        salary: Cột lương dùng thay cho biến salary
+    
+    Returns:
+        Biểu thức SQL (hoặc một số nếu biểu thức không dùng salary)
+    
+    Raises:
+        ValueError: Nếu biểu thức không hợp lệ
+    """
+    if not isinstance(text, str) or not text.strip() or len(text) > _MAX_EXPRESSION_LENGTH:
+        raise ValueError('Biểu thức lương không hợp lệ')
+    
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError('Biểu thức lương không hợp lệ')
+    
+    return _compile(tree.body, salary)
+
+def _compile(node, salary):
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left, right = _compile(node.left, salary), _compile(node.right, salary)
+        if isinstance(node.op, ast.Div) and _is_number(right) and right == 0:
+            raise ValueError('Biểu thức lương chia cho 0')
+        
+        # Hai hằng số được tính ngay bằng Python nên kết quả cũng phải được kiểm tra
+        if _is_number(left) and _is_number(right):
+            try:
+                return _checked_number(_BINARY_OPERATORS[type(node.op)](left, right))
+            except OverflowError:
+                raise ValueError('Biểu thức lương có giá trị quá lớn')
+        return _BINARY_OPERATORS[type(node.op)](left, right)
+    
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        operand = _compile(node.operand, salary)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return _checked_number(node.value)
+    
+    if isinstance(node, ast.Name) and node.id == 'salary':
+        return salary
+    
+    raise ValueError('Biểu thức lương chỉ được dùng số, biến salary và các phép + - * /')
+
+def _is_number(value):
+    return type(value) in (int, float)
+
+def _checked_number(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError('Biểu thức lương có giá trị quá lớn')
+    if isinstance(value, int) and abs(value) > _MAX_INTEGER:
+        raise ValueError('Biểu thức lương có giá trị quá lớn')
+    return value
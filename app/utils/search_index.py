@@ -0,0 +1,173 @@
+import re
+import unicodedata
+from app.models.database_schema import db
+
+# Các cơ sở dữ liệu đã có chỉ mục toàn văn, được đánh dấu sau khi kiểm tra/tạo chỉ mục
+_ready_engines = {}
+
+def fold_text(text):
+    """
+    Chuẩn hóa chuỗi để tìm kiếm: bỏ dấu tiếng Việt và chuyển thành chữ thường.
+    
+    Args:
+        text: Chuỗi cần chuẩn hóa
+        
+    Returns:
+        Chuỗi không dấu, chữ thường (ví dụ "Đỗ Văn" -> "do van")
+    """
+    text = unicodedata.normalize('NFD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.replace('đ', 'd').replace('Đ', 'D').lower()
+
+def search_terms(query):
+    """Tách từ khóa tìm kiếm thành các từ đã chuẩn hóa."""
+    return re.findall(r'[^\W_]+', fold_text(query))
+
+def ensure_search_index():
+    """
+    Tạo chỉ mục toàn văn cho bảng nhân viên nếu chưa có.
+    
+    SQLite dùng bảng ảo FTS5, PostgreSQL dùng cột tsvector với chỉ mục GIN.
+    Chỉ mục được đồng bộ bằng trigger nên mọi thao tác thêm/sửa/xóa
+    (kể cả cập nhật hàng loạt) đều được phản ánh.
+    """
+    dialect = db.engine.dialect.name
+    
+    if dialect == 'sqlite':
+        _ensure_sqlite_index()
+    elif dialect == 'postgresql':
+        _ensure_postgresql_index()
+    else:
+        return False
+    
+    _ready_engines[db.engine.url] = True
+    return True
+
+def search_index_available():
+    """
+    Kiểm tra chỉ mục toàn văn đã sẵn sàng trên cơ sở dữ liệu hiện tại chưa.
+    
+    Chỉ kết quả có chỉ mục được ghi nhớ: chỉ mục có thể được tạo sau khi tiến trình
+    khởi động (ví dụ bằng `flask db upgrade`).
+    """
+    url = db.engine.url
+    if _ready_engines.get(url):
+        return True
+    
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        available = _sqlite_index_exists()
+    elif dialect == 'postgresql':
+        available = db.session.execute(db.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'employees' AND column_name = 'search_vector'"
+        )).first() is not None
+    else:
+        available = False
+    
+    if available:
+        _ready_engines[url] = True
+    return available
+
+def match_subquery(terms):
+    """
+    Tạo subquery trả về (employee_id, rank) của các nhân viên khớp với từ khóa.
+    
+    Mỗi từ được so khớp theo tiền tố; rank càng nhỏ thì càng liên quan.
+    
+    Args:
+        terms: Danh sách từ đã chuẩn hóa (xem search_terms)
+        
+    Returns:
+        Subquery, hoặc None nếu cơ sở dữ liệu không có chỉ mục toàn văn
+    """
+    if not terms or not search_index_available():
+        return None
+    
+    dialect = db.engine.dialect.name
+    
+    if dialect == 'sqlite':
+        statement = db.text(
+            "SELECT rowid AS employee_id, bm25(employees_fts, 10.0, 5.0, 1.0) AS rank "
+            "FROM employees_fts WHERE employees_fts MATCH :match"
+        ).bindparams(match=' AND '.join(f'"{term}"*' for term in terms))
+    else:
+        statement = db.text(
+            "SELECT id AS employee_id, -ts_rank(search_vector, to_tsquery('simple', :match)) AS rank "
+            "FROM employees WHERE search_vector @@ to_tsquery('simple', :match)"
+        ).bindparams(match=' & '.join(f'{term}:*' for term in terms))
+    
+    return statement.columns(employee_id=db.Integer, rank=db.Float).subquery('employee_search')
+
+def _ensure_sqlite_index():
+    """Tạo bảng FTS5 và trigger đồng bộ cho SQLite."""
+    if _sqlite_index_exists():
+        return
+    
+    statements = [
+        "CREATE VIRTUAL TABLE employees_fts USING fts5("
+        "full_name, employee_code, email, tokenize = 'unicode61 remove_diacritics 2')",
+        
+        "CREATE TRIGGER employees_fts_insert AFTER INSERT ON employees BEGIN "
+        "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+        f"VALUES (new.id, {_sqlite_fts_values('new')}); END",
+        
+        "CREATE TRIGGER employees_fts_update AFTER UPDATE OF full_name, employee_code, email ON employees BEGIN "
+        "DELETE FROM employees_fts WHERE rowid = old.id; "
+        "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+        f"VALUES (new.id, {_sqlite_fts_values('new')}); END",
+        
+        "CREATE TRIGGER employees_fts_delete AFTER DELETE ON employees BEGIN "
+        "DELETE FROM employees_fts WHERE rowid = old.id; END",
+        
+        # Đưa dữ liệu hiện có vào chỉ mục
+        "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+        f"SELECT employees.id, {_sqlite_fts_values('employees')} FROM employees",
+    ]
+    
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+def _sqlite_index_exists():
+    """Kiểm tra bảng FTS5 của nhân viên đã tồn tại chưa."""
+    return db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'employees_fts'"
+    )).first() is not None
+
+def _sqlite_fts_values(alias):
+    """Các giá trị đưa vào FTS5; SQLite không bỏ được dấu của chữ đ/Đ nên thay thế thủ công."""
+    return (f"replace(replace({alias}.full_name, 'đ', 'd'), 'Đ', 'D'), "
+            f"{alias}.employee_code, {alias}.email")
+
+def _ensure_postgresql_index():
+    """Tạo cột tsvector, trigger đồng bộ và chỉ mục GIN cho PostgreSQL."""
+    statements = [
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        
+        "ALTER TABLE employees ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        
+        "CREATE OR REPLACE FUNCTION employees_search_vector_update() RETURNS trigger AS $$ "
+        "BEGIN "
+        "NEW.search_vector := "
+        "setweight(to_tsvector('simple', unaccent(coalesce(NEW.full_name, ''))), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(NEW.employee_code, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(NEW.email, '')), 'C'); "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql",
+        
+        "DROP TRIGGER IF EXISTS employees_search_vector_trigger ON employees",
+        
+        "CREATE TRIGGER employees_search_vector_trigger "
+        "BEFORE INSERT OR UPDATE OF full_name, employee_code, email ON employees "
+        "FOR EACH ROW EXECUTE FUNCTION employees_search_vector_update()",
+        
+        "CREATE INDEX IF NOT EXISTS ix_employees_search_vector ON employees USING GIN (search_vector)",
+        
+        # Đưa dữ liệu hiện có vào chỉ mục (trigger tự tính lại search_vector)
+        "UPDATE employees SET full_name = full_name WHERE search_vector IS NULL",
+    ]
+    
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
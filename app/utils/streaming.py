@@ -0,0 +1,140 @@
+import codecs
+import csv
+import io
+import json
+import zlib
+from flask import current_app
+
+def stream_json_array(items):
+    """
+    Sinh mảng JSON theo từng phần tử để dùng với Response streaming.
+    
+    Args:
+        items: Iterable các đối tượng có thể chuyển thành JSON
+        
+    Returns:
+        Generator các chuỗi JSON, ghép lại thành một mảng hợp lệ
+    """
+    yield '['
+    first = True
+    for item in items:
+        if not first:
+            yield ','
+        yield current_app.json.dumps(item)
+        first = False
+    yield ']'
+
+# Kích thước tối thiểu của mỗi phần được gửi đi, tránh gửi từng dòng nhỏ
+STREAM_BUFFER_SIZE = 64 * 1024
+
+def _buffered(lines):
+    """Gộp các dòng thành các phần khoảng STREAM_BUFFER_SIZE ký tự."""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_ndjson(items):
+    """
+    Sinh NDJSON (mỗi dòng một đối tượng JSON) để dùng với Response streaming.
+    
+    Args:
+        items: Iterable các đối tượng có thể chuyển thành JSON
+        
+    Returns:
+        Generator các phần chuỗi NDJSON
+    """
+    dumps = current_app.json.dumps
+    return _buffered(dumps(item) + '\n' for item in items)
+
+def stream_csv(rows, columns):
+    """
+    Sinh CSV có dòng tiêu đề để dùng với Response streaming.
+    
+    Args:
+        rows: Iterable các dict
+        columns: Danh sách tên cột theo thứ tự
+        
+    Returns:
+        Generator các phần chuỗi CSV
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    
+    def lines():
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        yield output.getvalue()
+    
+    return _buffered(lines())
+
+def gzip_stream(chunks):
+    """
+    Nén gzip từng phần của một luồng dữ liệu.
+    
+    Args:
+        chunks: Iterable các chuỗi
+        
+    Returns:
+        Generator các phần bytes của dữ liệu đã nén
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def iter_text_lines(stream, encoding='utf-8-sig'):
+    """
+    Đọc luồng byte (ví dụ request.stream) thành các dòng văn bản mà không đọc hết vào bộ nhớ.
+    
+    Args:
+        stream: Luồng byte có thể duyệt theo dòng
+        encoding: Bảng mã (mặc định UTF-8, bỏ qua BOM nếu có)
+        
+    Returns:
+        Generator các dòng văn bản
+    """
+    return codecs.iterdecode(stream, encoding)
+
+def read_csv(lines):
+    """
+    Đọc CSV có dòng tiêu đề theo từng bản ghi.
+    
+    Args:
+        lines: Iterable các dòng văn bản
+        
+    Returns:
+        Iterator các dict theo tên cột
+    """
+    return csv.DictReader(lines)
+
+def read_ndjson(lines):
+    """
+    Đọc NDJSON theo từng dòng, bỏ qua dòng trống.
+    
+    Args:
+        lines: Iterable các dòng văn bản
+        
+    Returns:
+        Generator các giá trị JSON; dòng không phải JSON hợp lệ được trả về là None
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
@@ -0,0 +1,67 @@
+from sqlalchemy.exc import IntegrityError
+from app.models.database_schema import db
+
+def check_unique(model, fields, values, exclude_id=None):
+    """
+    Kiểm tra các trường duy nhất của một bản ghi bằng một truy vấn duy nhất.
+    
+    Args:
+        model: Lớp model (ví dụ Employee)
+        fields: Danh sách cặp (tên trường, thông báo lỗi) theo thứ tự ưu tiên báo lỗi
+        values: Dict tên trường -> giá trị mới; chỉ các trường có trong dict được kiểm tra
+        exclude_id: ID của bản ghi đang được cập nhật (không tính là trùng)
+    
+    Returns:
+        Dict {'error': ...} của trường đầu tiên bị trùng, hoặc None nếu không trùng
+    """
+    values = {field: values[field] for field, _ in fields if values.get(field) is not None}
+    if not values:
+        return None
+    
+    query = db.session.query(*(getattr(model, field) for field in values)).filter(
+        db.or_(*(getattr(model, field) == value for field, value in values.items())))
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    
+    # Mỗi trường duy nhất chỉ khớp tối đa một bản ghi
+    conflicts = set()
+    for row in query.limit(len(values)):
+        conflicts.update(field for field, value in values.items() if getattr(row, field) == value)
+    
+    return next(({'error': message} for field, message in fields if field in conflicts), None)
+
+def commit_unique(fields, commit=True):
+    """
+    Commit (hoặc flush) phiên hiện tại, chuyển lỗi vi phạm ràng buộc thành dict lỗi.
+    
+    Dùng sau check_unique để xử lý trường hợp một request khác ghi cùng giá trị
+    giữa lúc kiểm tra và lúc ghi.
+    
+    Args:
+        fields: Danh sách cặp (tên trường, thông báo lỗi) như check_unique
+        commit: True để commit, False để chỉ flush
+    
+    Returns:
+        Dict {'error': ...} nếu vi phạm ràng buộc, ngược lại None
+    """
+    try:
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+    except IntegrityError as e:
+        db.session.rollback()
+        return {'error': _integrity_error_message(e, fields)}
+    return None
+
+def _integrity_error_message(error, fields):
+    # SQLite: "UNIQUE constraint failed: employees.email"
+    # PostgreSQL: 'Key (email)=(...) already exists' / 'employees_email_key'
+    detail = str(error.orig)
+    if 'unique' not in detail.lower():
+        return 'Dữ liệu vi phạm ràng buộc của cơ sở dữ liệu'
+    
+    for field, message in fields:
+        if f'.{field}' in detail or f'({field})' in detail or f'_{field}_key' in detail:
+            return message
+    return 'Dữ liệu vi phạm ràng buộc của cơ sở dữ liệu'
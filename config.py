@@ -15,15 +15,76 @@ class Config:
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Cấu hình pool kết nối (SQLALCHEMY_ENGINE_OPTIONS được tạo từ các giá trị này khi khởi động)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # giây chờ lấy kết nối
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # giây, không áp dụng cho SQLite
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))  # PostgreSQL, 0 = không giới hạn
+    
+    # PRAGMA áp dụng cho mỗi kết nối SQLite
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # byte
+    
+    # Tạo bảng và dữ liệu ban đầu mỗi khi khởi động; khi tắt, chạy `flask init-db` một lần
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'false').lower() in ('1', 'true', 'yes')
+    
     # Cấu hình JWT
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 giờ
+    JWT_REVOCATION_CHECK_INTERVAL = int(os.environ.get('JWT_REVOCATION_CHECK_INTERVAL', 5))  # giây, kiểm tra token bị thu hồi ở tiến trình khác
     
     # Cấu hình bảo mật mật khẩu
-    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'bcrypt')  # bcrypt, argon2 (cần argon2-cffi)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 3))
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 65536))  # KiB
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None  # mặc định bằng số lõi CPU
+    
+    # Cấu hình bộ nhớ đệm phân quyền (ảnh chụp quyền theo người dùng)
+    RBAC_SNAPSHOT_CACHE_SIZE = int(os.environ.get('RBAC_SNAPSHOT_CACHE_SIZE', 1024))
+    RBAC_SNAPSHOT_TTL = int(os.environ.get('RBAC_SNAPSHOT_TTL', 60))  # giây
+    RBAC_SNAPSHOT_CHECK_INTERVAL = int(os.environ.get('RBAC_SNAPSHOT_CHECK_INTERVAL', 5))  # giây, kiểm tra thay đổi vai trò/phòng ban ở tiến trình khác
+    ROLE_CATALOG_CHECK_INTERVAL = int(os.environ.get('ROLE_CATALOG_CHECK_INTERVAL', 5))  # giây, kiểm tra phiên bản danh mục vai trò và quyền
+    
+    # Thời gian sống của thống kê phòng ban trong bộ nhớ đệm (được hủy ngay khi dữ liệu thay đổi)
+    DEPARTMENT_STATS_TTL = int(os.environ.get('DEPARTMENT_STATS_TTL', 300))  # giây
+    DEPARTMENT_STATS_CHECK_INTERVAL = int(os.environ.get('DEPARTMENT_STATS_CHECK_INTERVAL', 5))  # giây, kiểm tra thay đổi ở tiến trình khác
     
     # Cấu hình ghi nhật ký
     AUDIT_LOG_ENABLED = True
+    AUDIT_WRITE_MODE = os.environ.get('AUDIT_WRITE_MODE', 'async')  # sync, async, async_fsync
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL_MS = int(os.environ.get('AUDIT_FLUSH_INTERVAL_MS', 200))
+    AUDIT_QUEUE_PUT_TIMEOUT_MS = 50  # hàng đợi đầy quá thời gian này thì ghi đồng bộ
+    AUDIT_SHUTDOWN_TIMEOUT = 10  # giây
+    AUDIT_PAGE_MAX_SIZE = 1000
+    AUDIT_EXPORT_CHUNK_SIZE = 1000  # số dòng đọc mỗi lần khi xuất nhật ký
+    
+    # Lưu trữ nhật ký cũ: giữ AUDIT_HOT_MONTHS tháng gần nhất trong bảng, các tháng cũ hơn
+    # được chuyển sang tệp JSONL nén gzip trong AUDIT_ARCHIVE_DIR (lệnh flask archive-audit-logs)
+    AUDIT_HOT_MONTHS = int(os.environ.get('AUDIT_HOT_MONTHS', 3))
+    AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'audit_archive')
+    
+    # Cấu hình phân trang danh sách nhân viên
+    EMPLOYEE_PAGE_SIZE = 100
+    EMPLOYEE_PAGE_MAX_SIZE = 1000
+    EMPLOYEE_STREAM_CHUNK_SIZE = 500
+    EMPLOYEE_SEARCH_LIMIT = 50
+    
+    # Cấu hình nhập nhân viên hàng loạt
+    EMPLOYEE_IMPORT_CHUNK_SIZE = 1000  # số dòng kiểm tra và thêm mỗi lần
+    EMPLOYEE_IMPORT_MAX_ERRORS = 1000  # số lỗi tối đa trả về trong báo cáo
+    EMPLOYEE_BULK_UPDATE_CHUNK_SIZE = 1000  # số ID trong mỗi câu lệnh UPDATE hàng loạt
+    
+    # Trả số truy vấn SQL của mỗi request trong header X-Query-Count
+    QUERY_COUNT_HEADER = False
     
     # Cấu hình phiên
     SESSION_TYPE = 'filesystem'
@@ -35,13 +96,19 @@ class DevelopmentConfig(Config):
     
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    AUTO_INIT_DB = True
+    QUERY_COUNT_HEADER = True
 
 class TestingConfig(Config):
     """Cấu hình cho môi trường kiểm thử."""
     
     TESTING = True
+    AUTO_INIT_DB = True
+    BCRYPT_LOG_ROUNDS = 4
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    QUERY_COUNT_HEADER = True
+    AUDIT_WRITE_MODE = 'sync'
 
 class ProductionConfig(Config):
     """Cấu hình cho môi trường sản xuất."""
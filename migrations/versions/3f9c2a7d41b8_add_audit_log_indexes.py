@@ -0,0 +1,34 @@
+"""Add indexes for audit log filters
+
+Revision ID: 3f9c2a7d41b8
+Revises: 
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng được tạo bởi db.create_all() cùng với các chỉ mục đã khai báo trên model
+    if not sa.inspect(op.get_bind()).has_table('audit_logs'):
+        return
+
+    op.create_index('ix_audit_logs_timestamp', 'audit_logs', ['timestamp'], unique=False, if_not_exists=True)
+    op.create_index('ix_audit_logs_user_id_timestamp', 'audit_logs', ['user_id', 'timestamp'], unique=False, if_not_exists=True)
+    op.create_index('ix_audit_logs_action_timestamp', 'audit_logs', ['action', 'timestamp'], unique=False, if_not_exists=True)
+    op.create_index('ix_audit_logs_resource_resource_id_timestamp', 'audit_logs', ['resource', 'resource_id', 'timestamp'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_audit_logs_resource_resource_id_timestamp', table_name='audit_logs', if_exists=True)
+    op.drop_index('ix_audit_logs_action_timestamp', table_name='audit_logs', if_exists=True)
+    op.drop_index('ix_audit_logs_user_id_timestamp', table_name='audit_logs', if_exists=True)
+    op.drop_index('ix_audit_logs_timestamp', table_name='audit_logs', if_exists=True)
@@ -0,0 +1,36 @@
+"""Add hourly audit log rollup table
+
+Revision ID: 8b1e5d0c6a92
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e5d0c6a92'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng được tạo bởi db.create_all(); dữ liệu được tính từ audit_logs bởi migration
+    # d2c6f8a4e1b9, `flask init-db` (ensure_audit_rollup) hoặc `flask rebuild-audit-rollup`
+    if sa.inspect(op.get_bind()).has_table('audit_log_rollups'):
+        return
+
+    op.create_table('audit_log_rollups',
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('action', sa.Enum('LOGIN', 'LOGOUT', 'CREATE', 'READ', 'UPDATE', 'DELETE', 'FAILED_LOGIN', name='actiontype', create_type=False), nullable=False),
+    sa.Column('resource', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'action', 'resource', 'user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('audit_log_rollups', if_exists=True)
@@ -0,0 +1,29 @@
+"""Add index on audit_logs (resource, timestamp)
+
+Revision ID: a9d2f4b6c8e1
+Revises: f7a3c9e1b2d4
+Create Date: 2026-10-19 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d2f4b6c8e1'
+down_revision = 'f7a3c9e1b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng được tạo bởi db.create_all() cùng với các chỉ mục đã khai báo trên model.
+    # Chỉ mục (resource, resource_id, timestamp) không sắp xếp được theo thời gian khi chỉ lọc theo resource
+    if not sa.inspect(op.get_bind()).has_table('audit_logs'):
+        return
+
+    op.create_index('ix_audit_logs_resource_timestamp', 'audit_logs', ['resource', 'timestamp'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_audit_logs_resource_timestamp', table_name='audit_logs', if_exists=True)
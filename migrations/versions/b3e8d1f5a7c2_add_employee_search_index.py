@@ -0,0 +1,97 @@
+"""Add full-text search index on employees
+
+Revision ID: b3e8d1f5a7c2
+Revises: a9d2f4b6c8e1
+Create Date: 2026-10-19 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d1f5a7c2'
+down_revision = 'a9d2f4b6c8e1'
+branch_labels = None
+depends_on = None
+
+
+# SQLite không bỏ được dấu của chữ đ/Đ nên thay thế thủ công
+def _sqlite_fts_values(alias):
+    return (f"replace(replace({alias}.full_name, 'đ', 'd'), 'Đ', 'D'), "
+            f"{alias}.employee_code, {alias}.email")
+
+
+def upgrade():
+    # Bảng và chỉ mục có thể đã được tạo bởi init_db() (db.create_all() và ensure_search_index())
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('employees'):
+        return
+
+    if bind.dialect.name == 'sqlite':
+        if inspector.has_table('employees_fts'):
+            return
+
+        op.execute(
+            "CREATE VIRTUAL TABLE employees_fts USING fts5("
+            "full_name, employee_code, email, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER employees_fts_insert AFTER INSERT ON employees BEGIN "
+            "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+            f"VALUES (new.id, {_sqlite_fts_values('new')}); END"
+        )
+        op.execute(
+            "CREATE TRIGGER employees_fts_update AFTER UPDATE OF full_name, employee_code, email ON employees BEGIN "
+            "DELETE FROM employees_fts WHERE rowid = old.id; "
+            "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+            f"VALUES (new.id, {_sqlite_fts_values('new')}); END"
+        )
+        op.execute(
+            "CREATE TRIGGER employees_fts_delete AFTER DELETE ON employees BEGIN "
+            "DELETE FROM employees_fts WHERE rowid = old.id; END"
+        )
+        # Đưa dữ liệu hiện có vào chỉ mục
+        op.execute(
+            "INSERT INTO employees_fts(rowid, full_name, employee_code, email) "
+            f"SELECT employees.id, {_sqlite_fts_values('employees')} FROM employees"
+        )
+
+    elif bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        op.execute("ALTER TABLE employees ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        op.execute(
+            "CREATE OR REPLACE FUNCTION employees_search_vector_update() RETURNS trigger AS $$ "
+            "BEGIN "
+            "NEW.search_vector := "
+            "setweight(to_tsvector('simple', unaccent(coalesce(NEW.full_name, ''))), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(NEW.employee_code, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(NEW.email, '')), 'C'); "
+            "RETURN NEW; "
+            "END $$ LANGUAGE plpgsql"
+        )
+        op.execute("DROP TRIGGER IF EXISTS employees_search_vector_trigger ON employees")
+        op.execute(
+            "CREATE TRIGGER employees_search_vector_trigger "
+            "BEFORE INSERT OR UPDATE OF full_name, employee_code, email ON employees "
+            "FOR EACH ROW EXECUTE FUNCTION employees_search_vector_update()"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_employees_search_vector ON employees USING GIN (search_vector)")
+        # Đưa dữ liệu hiện có vào chỉ mục (trigger tự tính lại search_vector)
+        op.execute("UPDATE employees SET full_name = full_name WHERE search_vector IS NULL")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS employees_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS employees_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS employees_fts_insert")
+        op.execute("DROP TABLE IF EXISTS employees_fts")
+
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_employees_search_vector")
+        op.execute("DROP TRIGGER IF EXISTS employees_search_vector_trigger ON employees")
+        op.execute("DROP FUNCTION IF EXISTS employees_search_vector_update()")
+        op.execute("ALTER TABLE employees DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,28 @@
+"""Add index on employees.department_id
+
+Revision ID: c4d7e2f1a3b5
+Revises: 8b1e5d0c6a92
+Create Date: 2026-10-18 22:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7e2f1a3b5'
+down_revision = '8b1e5d0c6a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng được tạo bởi db.create_all() cùng với các chỉ mục đã khai báo trên model
+    if not sa.inspect(op.get_bind()).has_table('employees'):
+        return
+
+    op.create_index('ix_employees_department_id', 'employees', ['department_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_employees_department_id', table_name='employees', if_exists=True)
@@ -0,0 +1,62 @@
+"""Backfill hourly audit log rollups
+
+Revision ID: d2c6f8a4e1b9
+Revises: b3e8d1f5a7c2
+Create Date: 2026-10-19 12:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c6f8a4e1b9'
+down_revision = 'b3e8d1f5a7c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ứng dụng không còn tính bảng thống kê khi khởi động: bảng vừa được tạo bởi
+    # 8b1e5d0c6a92 được tính từ audit_logs tại đây bằng một câu lệnh INSERT ... SELECT.
+    # Bảng đã có dữ liệu thì giữ nguyên (tính lại bằng `flask rebuild-audit-rollup`)
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('audit_logs') or not inspector.has_table('audit_log_rollups'):
+        return
+
+    audit_logs = sa.table('audit_logs',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('action', sa.String),
+        sa.column('resource', sa.String),
+        sa.column('timestamp', sa.DateTime)
+    )
+    audit_log_rollups = sa.table('audit_log_rollups',
+        sa.column('bucket', sa.DateTime),
+        sa.column('action', sa.String),
+        sa.column('resource', sa.String),
+        sa.column('user_id', sa.Integer),
+        sa.column('count', sa.Integer)
+    )
+
+    if bind.execute(sa.select(audit_log_rollups.c.bucket).limit(1)).first() is not None:
+        return
+
+    if bind.dialect.name == 'sqlite':
+        # Cùng định dạng lưu DateTime của SQLAlchemy để khóa chính khớp với các dòng được cộng dồn
+        bucket = sa.func.strftime('%Y-%m-%d %H:00:00.000000', audit_logs.c.timestamp)
+    else:
+        bucket = sa.func.date_trunc('hour', audit_logs.c.timestamp)
+
+    op.execute(audit_log_rollups.insert().from_select(
+        ['bucket', 'action', 'resource', 'user_id', 'count'],
+        sa.select(bucket, audit_logs.c.action, audit_logs.c.resource, audit_logs.c.user_id, sa.func.count(audit_logs.c.id))
+        .where(audit_logs.c.user_id.isnot(None))
+        .group_by(bucket, audit_logs.c.action, audit_logs.c.resource, audit_logs.c.user_id)
+    ))
+
+
+def downgrade():
+    # Dữ liệu thống kê được tính lại từ audit_logs, không cần xóa khi hạ phiên bản
+    pass
@@ -0,0 +1,39 @@
+"""Add cache version table
+
+Revision ID: e5b9a1c7d3f2
+Revises: c4d7e2f1a3b5
+Create Date: 2026-10-18 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9a1c7d3f2'
+down_revision = 'c4d7e2f1a3b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng có thể đã được tạo bởi db.create_all(); dòng phiên bản luôn được thêm nếu chưa có
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('cache_versions'):
+        cache_versions = sa.table('cache_versions', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    else:
+        cache_versions = op.create_table('cache_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    exists = bind.execute(
+        sa.select(cache_versions.c.name).where(cache_versions.c.name == 'role_catalog')
+    ).first()
+    if exists is None:
+        op.bulk_insert(cache_versions, [{'name': 'role_catalog', 'version': 1}])
+
+
+def downgrade():
+    op.drop_table('cache_versions', if_exists=True)
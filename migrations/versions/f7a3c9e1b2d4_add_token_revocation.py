@@ -0,0 +1,42 @@
+"""Add token revocation table and users.tokens_revoked_at
+
+Revision ID: f7a3c9e1b2d4
+Revises: e5b9a1c7d3f2
+Create Date: 2026-10-19 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a3c9e1b2d4'
+down_revision = 'e5b9a1c7d3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng có thể đã được tạo bởi db.create_all() cùng với cột và chỉ mục đã khai báo trên model
+    inspector = sa.inspect(op.get_bind())
+
+    if inspector.has_table('users') and \
+            'tokens_revoked_at' not in {column['name'] for column in inspector.get_columns('users')}:
+        with op.batch_alter_table('users') as batch_op:
+            batch_op.add_column(sa.Column('tokens_revoked_at', sa.DateTime(), nullable=True))
+
+    if not inspector.has_table('revoked_tokens'):
+        op.create_table('revoked_tokens',
+        sa.Column('jti', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+        )
+    op.create_index('ix_revoked_tokens_expires_at', 'revoked_tokens', ['expires_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_revoked_tokens_expires_at', table_name='revoked_tokens', if_exists=True)
+    op.drop_table('revoked_tokens', if_exists=True)
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('tokens_revoked_at')
@@ -0,0 +1,43 @@
+import os
+import pytest
+import config
+from app import create_app
+from app.models.database_schema import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Ứng dụng với cấu hình kiểm thử trên một tệp SQLite riêng cho mỗi test."""
+    class FileTestingConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+    
+    monkeypatch.setitem(config.config, 'file-testing', FileTestingConfig)
+    app = create_app('file-testing')
+    yield app
+    
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def login(app):
+    """Trả về hàm tạo test client đã đăng nhập với tên đăng nhập và mật khẩu cho trước."""
+    def login(username, password='password'):
+        client = app.test_client()
+        response = client.post('/auth/login', json={'username': username, 'password': password})
+        assert response.status_code == 200
+        return client
+    return login
+
+@pytest.fixture
+def upgrade_from(app):
+    """Trả về hàm đánh dấu cơ sở dữ liệu ở một phiên bản migration rồi chạy `flask db upgrade`."""
+    def upgrade_from(revision):
+        # Kết thúc giao dịch đọc của session để thấy thay đổi của migration (chạy trên kết nối khác)
+        db.session.remove()
+        runner = app.test_cli_runner()
+        for args in (['db', 'stamp', '-d', MIGRATIONS_DIR, revision], ['db', 'upgrade', '-d', MIGRATIONS_DIR]):
+            result = runner.invoke(args=args)
+            assert result.exit_code == 0, result.output
+    return upgrade_from
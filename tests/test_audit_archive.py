@@ -0,0 +1,44 @@
+import datetime
+from app.models.database_schema import ActionType, AuditLog, db
+from app.utils import audit_archive
+from app.utils.audit_archive import archive_audit_logs, iter_archived_logs
+
+def _add_logs(user_id, days):
+    for day in days:
+        db.session.add(AuditLog(
+            user_id=user_id, action=ActionType.UPDATE, resource='employee',
+            timestamp=datetime.datetime(2024, 1, day, 12)
+        ))
+    db.session.commit()
+
+def _archive_january_in_two_parts(app, tmp_path):
+    app.config['AUDIT_ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    _add_logs(1, [2, 10, 20, 28])
+    # Nhật ký mới hơn mốc lưu trữ còn lại trong bảng nên ID không bị dùng lại
+    db.session.add(AuditLog(user_id=1, action=ActionType.LOGIN, resource='auth'))
+    archive_audit_logs(datetime.datetime(2024, 2, 1))
+    _add_logs(1, [5, 15, 25])
+    segments = archive_audit_logs(datetime.datetime(2024, 2, 1))
+    assert [segment['file'] for segment in segments] == ['audit-2024-01-part2.jsonl.gz']
+
+def test_archived_month_parts_are_merged_newest_first(app, tmp_path):
+    with app.app_context():
+        _archive_january_in_two_parts(app, tmp_path)
+        
+        logs = list(iter_archived_logs())
+    
+    assert [log.timestamp.day for log in logs] == [28, 25, 20, 15, 10, 5, 2]
+
+def test_archived_logs_are_streamed(app, tmp_path, monkeypatch):
+    with app.app_context():
+        _archive_january_in_two_parts(app, tmp_path)
+        
+        decoded = []
+        archived_log = audit_archive.ArchivedAuditLog
+        monkeypatch.setattr(audit_archive, 'ArchivedAuditLog', lambda **row: decoded.append(row) or archived_log(**row))
+        
+        first = next(iter_archived_logs())
+    
+    # Chỉ đọc dòng đầu tiên của mỗi phần, không đọc cả tháng
+    assert first.timestamp.day == 28
+    assert len(decoded) == 2
@@ -0,0 +1,31 @@
+import pytest
+from app.cli import _AUDIT_FILTER_CASES, _explain, _plan_uses_index
+from app.models.database_schema import AuditLog, db
+from app.utils.audit_logger import filter_audit_logs
+
+@pytest.mark.parametrize('name,filters', _AUDIT_FILTER_CASES, ids=[name for name, _ in _AUDIT_FILTER_CASES])
+def test_audit_filters_use_index_for_filter_and_order(app, name, filters):
+    with app.app_context():
+        query = filter_audit_logs(db.session.query(AuditLog), filters)
+        plan = _explain(query.order_by(AuditLog.timestamp.desc()).limit(20).statement)
+    
+    assert _plan_uses_index(plan), plan
+
+@pytest.mark.parametrize('plan', [
+    ['SEARCH audit_logs USING INDEX ix_audit_logs_resource_resource_id_timestamp (resource=?)',
+     'USE TEMP B-TREE FOR ORDER BY'],
+    ['SCAN audit_logs'],
+    ['Limit  (cost=0.15..8.17 rows=1 width=4)',
+     '  ->  Sort  (cost=8.16..8.17 rows=1 width=4)',
+     '        ->  Index Scan using ix_audit_logs_resource_resource_id_timestamp on audit_logs'],
+    ['Seq Scan on audit_logs'],
+])
+def test_plan_with_table_scan_or_sort_fails(plan):
+    assert not _plan_uses_index(plan)
+
+def test_explain_audit_queries_command_passes(app):
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['explain-audit-queries'])
+    
+    assert result.exit_code == 0, result.output
+    assert '[FAIL]' not in result.output
@@ -0,0 +1,43 @@
+from app.models.database_schema import AuditLog, AuditLogRollup, db
+from app.utils.audit_rollup import ensure_audit_rollup
+
+def _totals():
+    counted = db.session.query(db.func.coalesce(db.func.sum(AuditLogRollup.count), 0)).scalar()
+    logged = AuditLog.query.filter(AuditLog.user_id.isnot(None)).count()
+    return counted, logged
+
+def _drop_some_rollups(app, login):
+    # Mỗi lần đăng nhập ghi một nhật ký
+    login('hr_manager')
+    login('admin', 'admin123')
+    
+    with app.app_context():
+        counted, logged = _totals()
+        assert counted == logged > 0
+        
+        AuditLogRollup.query.filter(AuditLogRollup.resource == 'auth').delete()
+        db.session.commit()
+        assert _totals()[0] < logged
+
+def test_ensure_audit_rollup_rebuilds_missing_counts(app, login):
+    _drop_some_rollups(app, login)
+    
+    with app.app_context():
+        assert ensure_audit_rollup()
+        counted, logged = _totals()
+        assert counted == logged
+        
+        # Đã khớp: không tính lại
+        assert not ensure_audit_rollup()
+
+def test_migration_backfills_empty_rollup_table(app, login, upgrade_from):
+    _drop_some_rollups(app, login)
+    
+    with app.app_context():
+        AuditLogRollup.query.delete()
+        db.session.commit()
+        
+        upgrade_from('b3e8d1f5a7c2')
+        
+        counted, logged = _totals()
+        assert counted == logged
@@ -0,0 +1,122 @@
+import datetime
+import threading
+import pytest
+from app.models.database_schema import ActionType, AuditLog, User, db
+from app.utils.audit_logger import AuditWriter
+
+@pytest.fixture
+def async_writer(app):
+    """Trả về hàm thay bộ ghi nhật ký của ứng dụng bằng một bộ ghi bất đồng bộ với cấu hình cho trước.
+    
+    Luồng nền chỉ bắt đầu lấy bản ghi khỏi hàng đợi sau khi gọi release(), để test biết
+    chính xác những bản ghi nào nằm chung một lô.
+    """
+    writers = []
+    
+    def async_writer(mode='async', **settings):
+        app.config.update(AUDIT_WRITE_MODE=mode, **settings)
+        writer = AuditWriter(app)
+        app.extensions['audit_writer'] = writer
+        writers.append(writer)
+        
+        gate = threading.Event()
+        collect_batch = writer._collect_batch
+        
+        def gated_collect_batch():
+            gate.wait()
+            return collect_batch()
+        
+        writer._collect_batch = gated_collect_batch
+        writer.release = gate.set
+        return writer
+    
+    yield async_writer
+    
+    for writer in writers:
+        writer.release()
+        writer.shutdown()
+
+def _rows(app, count, **overrides):
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').one().id
+    row = {
+        'user_id': user_id,
+        'action': ActionType.READ,
+        'resource': 'writer-test',
+        'resource_id': None,
+        'details': None,
+        'ip_address': '127.0.0.1',
+        'timestamp': datetime.datetime.utcnow()
+    }
+    return [dict(row, details=f'row {index}', **overrides) for index in range(count)]
+
+def _written_details(app):
+    with app.app_context():
+        return sorted(details for details, in db.session.query(AuditLog.details).filter_by(resource='writer-test'))
+
+def test_rows_are_written_in_batches(app, login, async_writer):
+    writer = async_writer(AUDIT_BATCH_SIZE=3)
+    client = login('admin', 'admin123')
+    for row in _rows(app, 7):
+        writer.write(row)
+    
+    # Bản ghi đăng nhập và 7 bản ghi trên được ghi thành các lô 3, 3 và 2
+    writer.release()
+    assert writer.flush(timeout=5)
+    
+    stats = client.get('/audit/writer-stats').get_json()
+    assert stats['mode'] == 'async'
+    assert stats['enqueued'] == 8
+    assert stats['written'] == 8
+    assert stats['batches'] == 3
+    assert stats['last_batch_size'] == 2
+    assert stats['max_queue_depth'] == 8
+    assert stats['queue_depth'] == 0
+    assert stats['sync_fallbacks'] == 0
+    assert _written_details(app) == [f'row {index}' for index in range(7)]
+
+def test_full_queue_falls_back_to_synchronous_write(app, login, async_writer):
+    writer = async_writer(AUDIT_QUEUE_SIZE=1, AUDIT_QUEUE_PUT_TIMEOUT_MS=10)
+    # Bản ghi đăng nhập chiếm chỗ duy nhất của hàng đợi và luồng nền chưa lấy nó ra
+    client = login('admin', 'admin123')
+    
+    with app.app_context():
+        writer.write(_rows(app, 1)[0])
+    assert _written_details(app) == ['row 0']
+    
+    writer.release()
+    assert writer.flush(timeout=5)
+    
+    stats = client.get('/audit/writer-stats').get_json()
+    assert stats['sync_fallbacks'] == 1
+    assert stats['enqueued'] == 1
+    assert stats['written'] == 2
+
+def test_failed_batch_is_retried_row_by_row(app, async_writer):
+    writer = async_writer()
+    rows = _rows(app, 3)
+    rows[1]['resource'] = None
+    for row in rows:
+        writer.write(row)
+    
+    writer.release()
+    assert writer.flush(timeout=5)
+    
+    stats = writer.stats()
+    assert stats['written'] == 2
+    assert stats['failed'] == 1
+    assert _written_details(app) == ['row 0', 'row 2']
+
+@pytest.mark.parametrize('mode', ['async', 'async_fsync'])
+def test_shutdown_drains_queue(app, async_writer, mode):
+    writer = async_writer(mode, AUDIT_BATCH_SIZE=2)
+    for row in _rows(app, 5):
+        writer.write(row)
+    
+    writer.release()
+    writer.shutdown()
+    
+    stats = writer.stats()
+    assert stats['written'] == 5
+    assert stats['queue_depth'] == 0
+    assert _written_details(app) == [f'row {index}' for index in range(5)]
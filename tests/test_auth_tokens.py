@@ -0,0 +1,149 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.auth import auth_utils
+from app.auth.auth_utils import REVOCATION_VERSION_NAME, decode_token, resolve_token_user
+from app.models.database_schema import Department, User, db
+from app.services.user_service import UserService
+from app.utils import rbac
+from app.utils.cache_versions import ensure_cache_version, read_cache_version
+from app.utils.rbac import SNAPSHOT_VERSION_NAME
+
+def _token(app, username='hr_manager', password='password'):
+    response = app.test_client().post('/auth/login', json={'username': username, 'password': password})
+    assert response.status_code == 200
+    return response.get_json()['token']
+
+def _profile(app, token):
+    return app.test_client().get('/auth/profile', headers={'Authorization': f'Bearer {token}'})
+
+def _resolve(app, token):
+    with app.test_request_context():
+        return resolve_token_user(decode_token(token))
+
+def _as_other_worker(app, statement, params, bump=True):
+    """Ghi thẳng vào cơ sở dữ liệu như một tiến trình khác, không qua session của tiến trình này."""
+    with app.app_context():
+        ensure_cache_version(REVOCATION_VERSION_NAME)
+        with db.engine.begin() as connection:
+            connection.execute(text(statement), params)
+            if bump:
+                connection.execute(
+                    text('UPDATE cache_versions SET version = version + 1 WHERE name = :name'),
+                    {'name': REVOCATION_VERSION_NAME}
+                )
+
+def _user_id(app, username='hr_manager'):
+    with app.app_context():
+        return User.query.filter_by(username=username).one().id
+
+def test_deactivation_on_other_worker_rejects_token(app, monkeypatch):
+    monkeypatch.setattr(auth_utils, '_check_interval', 0)
+    token = _token(app)
+    assert _profile(app, token).status_code == 200
+    
+    _as_other_worker(app, 'UPDATE users SET is_active = 0 WHERE id = :id', {'id': _user_id(app)})
+    
+    # Token bị từ chối: Flask-Login chuyển hướng tới trang đăng nhập
+    assert _profile(app, token).status_code == 302
+    assert _resolve(app, token) == (None, 'Tài khoản đã bị vô hiệu hóa')
+
+def test_logout_on_other_worker_rejects_token(app, monkeypatch):
+    monkeypatch.setattr(auth_utils, '_check_interval', 0)
+    token = _token(app)
+    assert _profile(app, token).status_code == 200
+    
+    with app.app_context():
+        payload = decode_token(token)
+    _as_other_worker(
+        app,
+        'INSERT INTO revoked_tokens (jti, user_id, expires_at) VALUES (:jti, :user_id, :expires_at)',
+        {'jti': payload['jti'], 'user_id': payload['user_id'], 'expires_at': datetime.utcnow() + timedelta(hours=1)}
+    )
+    
+    assert _profile(app, token).status_code == 302
+    assert _resolve(app, token) == (None, 'Token đã bị thu hồi')
+
+def test_logout_revokes_token(app):
+    token = _token(app)
+    client = app.test_client()
+    assert client.post('/auth/logout', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    
+    assert _profile(app, token).status_code == 302
+
+def test_deleted_user_with_cached_snapshot_is_unauthorized(app):
+    token = _token(app)
+    assert _profile(app, token).status_code == 200
+    
+    # Xóa trước khi tiến trình này kiểm tra lại phiên bản: ảnh chụp quyền vẫn còn trong bộ nhớ đệm
+    user_id = _user_id(app)
+    _as_other_worker(app, 'DELETE FROM user_roles WHERE user_id = :id', {'id': user_id}, bump=False)
+    _as_other_worker(app, 'DELETE FROM audit_logs WHERE user_id = :id', {'id': user_id}, bump=False)
+    _as_other_worker(app, 'DELETE FROM users WHERE id = :id', {'id': user_id}, bump=False)
+    
+    assert _profile(app, token).status_code == 401
+
+def test_password_change_revokes_older_tokens_only(app):
+    old_token = _token(app)
+    response = app.test_client().post(
+        '/auth/change-password',
+        json={'current_password': 'password', 'new_password': 'new-password'},
+        headers={'Authorization': f'Bearer {old_token}'}
+    )
+    assert response.status_code == 200
+    
+    # Đăng nhập lại ngay trong cùng giây với lúc thu hồi
+    new_token = _token(app, password='new-password')
+    assert _resolve(app, old_token) == (None, 'Token đã bị thu hồi')
+    assert _profile(app, new_token).status_code == 200
+
+def test_token_iat_has_sub_second_precision(app):
+    with app.app_context():
+        payload = decode_token(_token(app))
+    assert abs(payload['iat'] - time.time()) < 60
+    assert isinstance(payload['iat'], float)
+
+def test_admin_password_reset_revokes_older_tokens(app, login):
+    old_token = _token(app)
+    response = login('admin', 'admin123').put(f'/users/{_user_id(app)}', json={'password': 'reset-password'})
+    assert response.status_code == 200
+    
+    assert _resolve(app, old_token) == (None, 'Token đã bị thu hồi')
+    assert _profile(app, old_token).status_code == 302
+    assert _profile(app, _token(app, password='reset-password')).status_code == 200
+
+def _users(app, token):
+    return app.test_client().get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+def test_role_revoked_on_other_worker_applies_to_cached_snapshot(app, monkeypatch):
+    monkeypatch.setattr(rbac, '_snapshot_check_interval', 0)
+    token = _token(app, 'admin', 'admin123')
+    assert _users(app, token).status_code == 200
+    
+    with app.app_context():
+        ensure_cache_version(SNAPSHOT_VERSION_NAME)
+        with db.engine.begin() as connection:
+            connection.execute(text('DELETE FROM user_roles WHERE user_id = :id'), {'id': _user_id(app, 'admin')})
+            connection.execute(
+                text('UPDATE cache_versions SET version = version + 1 WHERE name = :name'),
+                {'name': SNAPSHOT_VERSION_NAME}
+            )
+    
+    assert _users(app, token).status_code == 403
+
+def test_role_and_department_changes_bump_snapshot_version(app):
+    with app.app_context():
+        user = User.query.filter_by(username='hr_manager').one()
+        before = read_cache_version(SNAPSHOT_VERSION_NAME)
+        
+        UserService().revoke_role(user.id, user.roles[0].id)
+        assert read_cache_version(SNAPSHOT_VERSION_NAME) == before + 1
+        
+        user.employee.department_id = Department.query.filter(Department.id != user.employee.department_id).first().id
+        db.session.commit()
+        assert read_cache_version(SNAPSHOT_VERSION_NAME) == before + 2
+        
+        # Thay đổi không ảnh hưởng tới ảnh chụp quyền thì không tăng phiên bản
+        user.employee.salary += 1000
+        db.session.commit()
+        assert read_cache_version(SNAPSHOT_VERSION_NAME) == before + 2
@@ -0,0 +1,25 @@
+from sqlalchemy import text
+from app.models.database_schema import Department, db
+from app.utils.db_engine import begin_write_transaction
+
+def test_read_then_write_after_other_writer_commits(app):
+    with app.app_context():
+        department = Department.query.first()
+        
+        # Tiến trình khác ghi sau khi session này đã đọc
+        with db.engine.begin() as connection:
+            connection.execute(text("UPDATE departments SET description = 'Khác' WHERE id != :id"), {'id': department.id})
+        
+        # Session không giữ giao dịch đọc từ trước nên ghi được ngay, không bị "database is locked"
+        department.description = 'Phòng mới'
+        db.session.commit()
+        assert db.session.get(Department, department.id).description == 'Phòng mới'
+
+def test_write_transaction_keeps_savepoints_nested(app):
+    with app.app_context():
+        begin_write_transaction(db.session)
+        with db.session.begin_nested():
+            db.session.execute(text("UPDATE departments SET description = 'Tạm'"))
+        
+        db.session.rollback()
+        assert Department.query.filter_by(description='Tạm').count() == 0
@@ -0,0 +1,44 @@
+from sqlalchemy import text
+from app.models.database_schema import Employee, db
+from app.utils import department_stats
+from app.utils.cache_versions import ensure_cache_version, read_cache_version
+from app.utils.department_stats import STATISTICS_VERSION_NAME
+
+def _total_salaries(client):
+    response = client.get('/departments/statistics')
+    assert response.status_code == 200
+    return {department['id']: department['total_salary'] for department in response.get_json()}
+
+def test_change_on_other_worker_refreshes_cached_statistics(app, login, monkeypatch):
+    monkeypatch.setattr(department_stats, '_statistics_check_interval', 0)
+    client = login('admin', 'admin123')
+    before = _total_salaries(client)
+    
+    # Ghi thẳng vào cơ sở dữ liệu như một tiến trình khác, không qua session của tiến trình này
+    with app.app_context():
+        ensure_cache_version(STATISTICS_VERSION_NAME)
+        employee = Employee.query.filter(Employee.department_id.isnot(None)).first()
+        department_id = employee.department_id
+        with db.engine.begin() as connection:
+            connection.execute(text('UPDATE employees SET salary = salary + 1000 WHERE id = :id'), {'id': employee.id})
+            connection.execute(
+                text('UPDATE cache_versions SET version = version + 1 WHERE name = :name'),
+                {'name': STATISTICS_VERSION_NAME}
+            )
+    
+    after = _total_salaries(client)
+    assert after[department_id] == before[department_id] + 1000
+
+def test_employee_changes_bump_statistics_version(app):
+    with app.app_context():
+        employee = Employee.query.first()
+        before = read_cache_version(STATISTICS_VERSION_NAME)
+        
+        employee.salary += 1000
+        db.session.commit()
+        assert read_cache_version(STATISTICS_VERSION_NAME) == before + 1
+        
+        # Thay đổi không ảnh hưởng tới thống kê thì không tăng phiên bản
+        employee.email = 'changed@company.com'
+        db.session.commit()
+        assert read_cache_version(STATISTICS_VERSION_NAME) == before + 1
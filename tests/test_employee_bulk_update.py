@@ -0,0 +1,73 @@
+import pytest
+from app.models.database_schema import Employee, db
+from app.utils.salary_expression import compile_salary_expression
+
+@pytest.mark.parametrize('expression', [
+    '1e308*10+salary',
+    '99999999999999999999999*salary',
+    '10**2',
+    'salary/0',
+    '__import__("os")'
+])
+def test_invalid_salary_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        compile_salary_expression(expression, Employee.salary)
+
+def _salaries(app):
+    with app.app_context():
+        return dict(db.session.query(Employee.id, Employee.salary))
+
+@pytest.mark.parametrize('changes', [
+    {'salary_expression': '1e308*10+salary'},
+    {'salary_expression': '99999999999999999999999*salary'},
+    {'salary_expression': 'salary*1e308*10'},
+    {'salary_expression': 'salary - 1e12'},
+    {'salary_percent': -250},
+    {'salary': -1},
+    {'department_id': True}
+])
+def test_invalid_bulk_changes_leave_salaries_unchanged(app, login, changes):
+    client = login('admin', 'admin123')
+    before = _salaries(app)
+    
+    response = client.patch('/employees/bulk', json={'ids': [1, 2, 3], 'changes': changes})
+    
+    assert response.status_code == 400
+    assert _salaries(app) == before
+
+def test_salary_expression_is_applied(app, login):
+    client = login('admin', 'admin123')
+    before = _salaries(app)
+    
+    response = client.patch('/employees/bulk', json={'ids': [1, 2], 'changes': {'salary_expression': 'salary * 2 + 10'}})
+    
+    assert response.status_code == 200
+    after = _salaries(app)
+    assert after[1] == before[1] * 2 + 10
+    assert after[2] == before[2] * 2 + 10
+    assert after[3] == before[3]
+
+def test_bulk_update_without_permission_is_forbidden_even_without_matches(app, login):
+    client = login('accounting_employee1')
+    
+    response = client.patch('/employees/bulk', json={'ids': [99999], 'changes': {'salary': 1}})
+    
+    assert response.status_code == 403
+
+def test_ids_excluded_by_department_filter_are_not_reported_missing(app, login):
+    with app.app_context():
+        hr_id, accounting_id = (Employee.query.filter_by(employee_code=code).one().id for code in ('HR001', 'ACC001'))
+        department_id = Employee.query.get(hr_id).department_id
+    client = login('admin', 'admin123')
+    before = _salaries(app)
+    
+    response = client.patch('/employees/bulk', json={
+        'ids': [hr_id, accounting_id, 99999],
+        'filter': {'department_id': department_id},
+        'changes': {'salary_percent': 10}
+    })
+    
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 1
+    assert response.get_json()['not_found'] == [99999]
+    assert _salaries(app)[accounting_id] == before[accounting_id]
@@ -0,0 +1,51 @@
+from app.models.database_schema import AuditLog, Employee, db
+from app.services.employee_service import EmployeeService
+
+def _records(count):
+    return [{
+        'employee_code': f'P{index}',
+        'full_name': 'Nhân viên mới',
+        'birth_date': '1990-01-01',
+        'email': f'p{index}@company.com',
+        'salary': '100',
+        'tax_code': f'TP{index}',
+        'department_id': '1'
+    } for index in range(count)]
+
+def _imported_codes():
+    return [code for code, in db.session.query(Employee.employee_code).filter(Employee.employee_code.like('P%'))]
+
+def test_import_without_commit_is_rolled_back(app):
+    with app.app_context():
+        report = EmployeeService().import_employees(_records(5), chunk_size=2, commit=False)
+        assert report['created'] == 5
+        
+        db.session.rollback()
+        assert _imported_codes() == []
+
+def test_unreadable_upload_leaves_no_rows(app, login):
+    app.config['EMPLOYEE_IMPORT_CHUNK_SIZE'] = 2
+    client = login('hr_manager')
+    body = b'employee_code,full_name,birth_date,email,salary,tax_code,department_id\n'
+    body += b''.join(b'P%d,New,1990-01-01,p%d@company.com,100,TP%d,1\n' % (i, i, i) for i in range(4))
+    body += b'\xff\xfe,bad\n'
+    
+    response = client.post('/employees/bulk', data=body, content_type='text/csv')
+    
+    assert response.status_code == 400
+    with app.app_context():
+        assert _imported_codes() == []
+        assert AuditLog.query.filter(AuditLog.details.like('Nhập hàng loạt%')).count() == 0
+
+def test_import_commits_rows_and_one_audit_entry(app, login):
+    client = login('hr_manager')
+    body = b'employee_code,full_name,birth_date,email,salary,tax_code,department_id\n'
+    body += b''.join(b'P%d,New,1990-01-01,p%d@company.com,100,TP%d,1\n' % (i, i, i) for i in range(3))
+    
+    response = client.post('/employees/bulk', data=body, content_type='text/csv')
+    
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 3
+    with app.app_context():
+        assert sorted(_imported_codes()) == ['P0', 'P1', 'P2']
+        assert AuditLog.query.filter(AuditLog.details.like('Nhập hàng loạt%')).count() == 1
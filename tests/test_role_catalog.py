@@ -0,0 +1,30 @@
+from app.models.database_schema import CacheVersion, db
+from app.utils.role_catalog import CATALOG_VERSION_NAME, read_catalog_version
+
+def test_init_db_seeds_catalog_version(app):
+    with app.app_context():
+        assert db.session.get(CacheVersion, CATALOG_VERSION_NAME) is not None
+
+def test_role_change_bumps_catalog_version(app, login):
+    client = login('admin', 'admin123')
+    with app.app_context():
+        before = read_catalog_version()
+    
+    response = client.put('/roles/3', json={'permission_ids': [1, 2]})
+    
+    assert response.status_code == 200
+    with app.app_context():
+        assert read_catalog_version() == before + 1
+    assert [permission['id'] for permission in client.get('/roles/3/permissions').get_json()] == [1, 2]
+
+def test_role_change_creates_missing_version_row(app, login):
+    client = login('admin', 'admin123')
+    with app.app_context():
+        db.session.delete(db.session.get(CacheVersion, CATALOG_VERSION_NAME))
+        db.session.commit()
+    
+    response = client.put('/roles/3', json={'description': 'Mô tả mới'})
+    
+    assert response.status_code == 200
+    with app.app_context():
+        assert read_catalog_version() == 1
@@ -0,0 +1,36 @@
+from app.models.database_schema import Employee, db
+from app.utils import search_index
+from app.utils.search_index import search_index_available
+
+def _drop_sqlite_index():
+    for statement in ("DROP TRIGGER employees_fts_insert", "DROP TRIGGER employees_fts_update",
+                      "DROP TRIGGER employees_fts_delete", "DROP TABLE employees_fts"):
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    # Chỉ mục đã được ghi nhớ khi init_db tạo ra lúc khởi động
+    search_index._ready_engines.clear()
+
+def test_migration_creates_and_backfills_search_index(app, upgrade_from):
+    with app.app_context():
+        _drop_sqlite_index()
+        assert not search_index_available()
+        
+        # Cơ sở dữ liệu ở phiên bản trước khi có migration của chỉ mục toàn văn
+        upgrade_from('a9d2f4b6c8e1')
+        
+        # Kết quả "chưa có chỉ mục" trước đó không được ghi nhớ
+        assert search_index_available()
+        indexed = db.session.execute(db.text("SELECT count(*) FROM employees_fts")).scalar()
+        assert indexed == Employee.query.count() > 0
+
+def test_search_uses_index_created_after_startup(app, login, upgrade_from):
+    with app.app_context():
+        _drop_sqlite_index()
+        assert not search_index_available()
+        upgrade_from('a9d2f4b6c8e1')
+    
+    # Chỉ chỉ mục toàn văn khớp được từ khóa không dấu theo tiền tố
+    response = login('hr_manager').get('/employees/search', query_string={'query': 'nguyen quan ly'})
+    
+    assert response.status_code == 200
+    assert 'Nguyễn Văn Quản Lý HR' in [employee['full_name'] for employee in response.get_json()]